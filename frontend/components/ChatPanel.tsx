@@ -37,16 +37,55 @@ export default function ChatPanel({ sessionId }: ChatPanelProps) {
 
         try {
             const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
-            const response = await fetch(`${backendUrl}/chat`, {
+            const response = await fetch(`${backendUrl}/chat/stream`, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ message: userMessage, session_id: sessionId })
             });
 
-            if (!response.ok) throw new Error("Error en el servidor");
+            if (!response.ok || !response.body) throw new Error("Error en el servidor");
 
-            const data = await response.json();
-            setMessages((prev) => [...prev, { role: "bot", content: data.reply }]);
+            // Server-Sent Events: cada "token" se agrega al último mensaje del bot apenas llega
+            let started = false;
+            const appendToBot = (text: string, replace = false) => {
+                if (!started) {
+                    // Primer fragmento: reemplaza el indicador de "escribiendo"
+                    started = true;
+                    setLoading(false);
+                    setMessages((prev) => [...prev, { role: "bot", content: text }]);
+                    return;
+                }
+                setMessages((prev) => {
+                    const next = [...prev];
+                    const last = next[next.length - 1];
+                    next[next.length - 1] = { ...last, content: replace ? text : last.content + text };
+                    return next;
+                });
+            };
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const events = buffer.split("\n\n");
+                buffer = events.pop() ?? "";
+
+                for (const rawEvent of events) {
+                    const eventName = rawEvent.match(/^event: (.*)$/m)?.[1];
+                    const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1];
+                    if (!eventName || !dataLine) continue;
+                    const data = JSON.parse(dataLine);
+
+                    if (eventName === "token") appendToBot(data.token);
+                    else if (eventName === "done") appendToBot(data.reply, true);
+                    else if (eventName === "error") appendToBot(data.detail, true);
+                }
+            }
         } catch (err) {
             setMessages((prev) => [...prev, { role: "bot", content: "Disculpa, hubo un problema al contactar el servidor." }]);
             console.error(err);
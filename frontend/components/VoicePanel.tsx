@@ -110,18 +110,19 @@ export default function VoicePanel({ sessionId }: VoicePanelProps) {
                         setLiveTranscript("Buscando información de Civetta...");
 
                         try {
-                            // Consultar al backend original (LangGraph)
-                            const chatRes = await fetch(`${backendUrl}/chat`, {
+                            // Herramienta de voz: datos del catálogo sin pasar por el LLM del grafo
+                            const toolRes = await fetch(`${backendUrl}/api/voice/tool`, {
                                 method: "POST",
                                 headers: { "Content-Type": "application/json" },
                                 body: JSON.stringify({
-                                    message: args.user_query,
+                                    user_query: args.user_query,
                                     session_id: sessionId || "voz-web-session"
                                 })
                             });
 
-                            const chatData = await chatRes.json();
-                            const answer = chatData.reply;
+                            // 503 (servidor saturado) u otro error: el catch avisa al modelo
+                            if (!toolRes.ok) throw new Error(`Herramienta de voz respondió ${toolRes.status}`);
+                            const facts = await toolRes.json();
 
                             // Notificar a OpenAI del resultado de la función
                             const funcResultEvent = {
@@ -129,7 +130,7 @@ export default function VoicePanel({ sessionId }: VoicePanelProps) {
                                 item: {
                                     type: "function_call_output",
                                     call_id: callId,
-                                    output: JSON.stringify({ success: true, answer: answer })
+                                    output: JSON.stringify(facts)
                                 }
                             };
                             dc.send(JSON.stringify(funcResultEvent));
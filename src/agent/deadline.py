@@ -0,0 +1,25 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Momento (time.monotonic) en que vence el request en curso; None = sin plazo
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Fija el plazo del request en curso; los nodos del grafo lo heredan por contextvars."""
+    previous = _deadline.get()
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        # set y no reset(token): dentro de un generador el cierre puede correr en otro contexto
+        _deadline.set(previous)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Segundos que le quedan al request en curso (negativo si ya venció, None si no tiene plazo)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
@@ -1,18 +1,271 @@
-from typing import TypedDict, Annotated, Literal
-import operator
+from typing import TypedDict, Annotated, Literal, Optional
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from collections import Counter
 from langgraph.graph import StateGraph, START, END
+from langgraph.config import get_stream_writer
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 
-from src.rag.query_engine import rag_search
+from src.config.settings import settings
+from src.database.pool import pool_manager
+from src.rag.query_engine import rag_search, product_index
+from src.rag.product_index import ProductIndex, ATTRIBUTE_PATTERNS, parse_product_block
+from src.rag.filters import SearchFilters
+from src.rag.generation_cache import GenerationCache, prompt_version
+from src.agent.prompt_builder import build_prompt, truncate_tokens, count_tokens
+from src.config.metrics import stage_timer, STAGE_SECONDS, LLM_TOKENS, TURN_ROUTES
+from src.config.tracing import span, annotate
+from src.agent.deadline import remaining_seconds
+from src.agent.memory import ConversationMemory, compact_messages, compact, memory_note
 
 # 1. Definir el estado (Memoria Contextual y de Hilo)
 class AgentState(TypedDict, total=False):
-    messages: Annotated[list[BaseMessage], operator.add]
+    # Ventana acotada: compact_conversation vuelca lo viejo a `memory` (ver src/agent/memory.py)
+    messages: Annotated[list[BaseMessage], compact_messages]
     company_id: str
     lopdp_consent: bool
     current_product_context: dict  # Campo obligatorio para evitar Amnesia Conversacional
+    memory: ConversationMemory  # Resumen estructurado de lo que salió de la ventana
+
+# Prompt del generador de respuestas. Su hash forma parte de la clave de la cache de generación.
+SYSTEM_PROMPT = (
+    "Eres Sofía, asesora experta de la boutique Civetta. Tu estilo es minimalista, elegante y altamente eficiente. "
+    "REGLAS DE COMUNICACIÓN:\n"
+    "- SALUDO: Preséntate solo en el primer mensaje. En adelante, ve directo al punto.\n"
+    "- BREVEDAD: Máximo 2 o 3 oraciones. Elimina introducciones como 'He encontrado esto...' o disculpas como 'Lamento la espera'.\n"
+    "- FLUJO CONVERSACIONAL: Prohibido usar listas técnicas o formatos tipo base de datos (ej. PRODUCTO:, PRECIO:). "
+    "Si hay varios artículos, agrúpalos en un párrafo fluido resaltando el nombre y el precio de forma natural, si el cliente pide mas detalles, le das esos detalles que pidio.\n"
+    "- CIERRE: No uses frases de cierre robóticas. Si la respuesta está completa, no preguntes '¿algo más?' en cada mensaje.\n"
+    "- VERACIDAD: Usa exclusivamente el contexto proporcionado. Si algo no está en el catálogo, indica amablemente que no cuentas con esa información.\n"
+    "Tu objetivo es que el cliente sienta que habla con una vendedora real de una boutique de lujo, no con un buscador."
+)
+
+# Respuestas del LLM ya generadas (temperature=0: misma entrada -> misma salida)
+generation_cache = GenerationCache(
+    maxsize=settings.generation_cache_size,
+    ttl_seconds=settings.generation_cache_ttl_seconds
+)
+
+# Referencias, pronombres y continuaciones: la respuesta depende del historial y no se cachea
+HISTORY_DEPENDENT_RE = re.compile(
+    r"\b(ese|esa|esos|esas|este|esta|estos|estas|eso|esto|aquel|aquella|anterior|mismo|misma|"
+    r"tambi[eé]n|entonces|y si|cu[aá]l de)\b"
+)
+
+# Referencias a escrituras en segundo plano para que no las recolecte el GC
+_background_tasks: set = set()
+
+logger = logging.getLogger("agent_graph")
+
+class IntentRule(TypedDict, total=False):
+    name: str
+    pattern: str  # regex sobre el texto en minúsculas
+    template: str  # respuesta fija cuando el turno sólo contiene esta intención
+
+# Tabla de reglas del router de intención (ampliable con intent_router.register)
+INTENT_RULES: list[IntentRule] = [
+    {"name": "consent", "pattern": r"\bacepto\b",
+     "template": "Gracias por su confirmación. ¿En qué le puedo ayudar hoy?"},
+    {"name": "greeting", "pattern": r"^\s*(?:hola|hello|buen[oa]s(?:\s+(?:d[ií]as|tardes|noches))?|qu[eé] tal)\b",
+     "template": "¡Hola! Qué gusto saludarte, soy Sofía de Civetta. ¿En qué puedo ayudarte hoy?"},
+    # Drop the Anchor: el cliente pide otra cosa y se suelta el producto anclado
+    {"name": "theme_change", "pattern": r"\b(?:otr[oa]|diferente|qu[eé] m[aá]s|aparte|tienes pijama|tienes lencer[ií]a|quiero ver)"},
+    # Preguntas abiertas: siempre van al LLM aunque mencionen precio o talla
+    {"name": "open_ended", "pattern": r"\b(?:recomi[ée]nd|suger|diferencia|compar|mejor|por qu[eé]|c[oó]mo (?:se|lo|la)|combina|m[aá]s (?:barat|econ[oó]mic|car[oa])|menor precio|mayor precio)"},
+    *[{"name": attr, "pattern": pattern.pattern} for attr, pattern in ATTRIBUTE_PATTERNS.items()],
+    # Referencias al producto de la conversación (slot filling)
+    {"name": "reference", "pattern": r"\b(?:talle|descripci[oó]n|es[ea]|este|tienes|batas|medias)\b"},
+]
+
+ATTRIBUTE_INTENTS = frozenset(ATTRIBUTE_PATTERNS)
+
+class IntentRouter:
+    """
+    Router determinista: cada regla se compila una vez y se evalúa por separado, así las
+    reglas que se solapan en el texto ("hola, acepto", "¿cuánto vale esa?") se detectan todas.
+    """
+
+    def __init__(self, rules: list[IntentRule]):
+        self.rules: list[IntentRule] = []
+        self.templates: dict[str, str] = {}
+        self._patterns: list[tuple[str, re.Pattern]] = []
+        for rule in rules:
+            self.register(rule)
+
+    def register(self, rule: IntentRule) -> None:
+        """Agrega (o reemplaza) una regla y recompila los patrones."""
+        self.rules = [r for r in self.rules if r["name"] != rule["name"]] + [rule]
+        self.templates = {r["name"]: r["template"] for r in self.rules if r.get("template")}
+        self._patterns = [(r["name"], re.compile(r["pattern"])) for r in self.rules]
+
+    def route(self, text: str) -> set[str]:
+        lowered = text.lower()
+        return {name for name, pattern in self._patterns if pattern.search(lowered)}
+
+    def template_for(self, intents: set[str], text: str) -> Optional[tuple[str, str]]:
+        """(intención, respuesta) si el turno es sólo una intención con plantilla (saludo, consentimiento)."""
+        if len(intents) != 1 or len(text.split()) > 3:
+            return None
+        name = next(iter(intents))
+        template = self.templates.get(name)
+        return (name, template) if template else None
+
+intent_router = IntentRouter(INTENT_RULES)
+
+# Cuántos turnos tomó cada ruta (plantilla, índice, cache, LLM)
+route_counts: Counter = Counter()
+
+def _log_route(path: str, intents: set[str]) -> None:
+    route_counts[path] += 1
+    TURN_ROUTES.labels(path).inc()
+    annotate(route=path, intents=sorted(intents))
+    logger.info(f"🧭 Ruta del turno: {path} (intenciones: {', '.join(sorted(intents)) or '-'})")
+
+def _template_from_context(raw_context: str, query: str, product_name: Optional[str]) -> Optional[dict]:
+    """
+    Precio/talla/color/tela a partir de los bloques recuperados, sólo si no hay ambigüedad:
+    el producto se nombra en la consulta, está anclado en la conversación o es el único recuperado.
+    """
+    records = [r for r in (parse_product_block(block) for block in raw_context.split("\n\n")) if r]
+    if not records:
+        return None
+    retrieved = ProductIndex(min_score=settings.product_index_min_score)
+    retrieved.build(records)
+    anchor = product_name or (records[0]["name"] if len(records) == 1 else None)
+    return retrieved.answer(query, anchor)
+
+def _retrieval_answer(raw_context: str, query: str, product_name: Optional[str]) -> str:
+    """Respuesta sin LLM con lo recuperado, para cuando no queda plazo para generar."""
+    templated = _template_from_context(raw_context, query, product_name)
+    if templated is not None:
+        return templated["answer"]
+    records = [r for r in (parse_product_block(block) for block in raw_context.split("\n\n")) if r]
+    if not records:
+        return truncate_tokens(raw_context, settings.prompt_memory_max_tokens)
+    summaries = []
+    for record in records[:3]:
+        details = [record.get("price", "")]
+        if record.get("sizes"):
+            details.append("tallas " + ", ".join(record["sizes"]))
+        if record.get("color"):
+            details.append(f"color {record['color']}")
+        detail = ", ".join(d for d in details if d)
+        summaries.append(f"{record['name']} ({detail})" if detail else record["name"])
+    return "Esto es lo que encontré en el catálogo: " + "; ".join(summaries) + "."
+
+# Categorías del catálogo si el índice de productos todavía no está cargado
+DEFAULT_CATEGORIES = ["Pijama", "Lencería", "Bata", "Medias"]
+
+_NUMBER = r"\$?\s*(\d+(?:[.,]\d+)?)"
+PRICE_RANGE_RE = re.compile(r"\bentre\s*" + _NUMBER + r"\s*y\s*" + _NUMBER)
+PRICE_MAX_RE = re.compile(r"\b(?:menos de|hasta|por debajo de|m[aá]ximo|no m[aá]s de|menor a)\s*" + _NUMBER)
+PRICE_MIN_RE = re.compile(r"\b(?:m[aá]s de|desde|m[ií]nimo|arriba de|por encima de|mayor a)\s*" + _NUMBER)
+# Sólo hay rango de precio si la consulta habla de dinero ("¿llegan hasta 3 días?" no filtra)
+PRICE_CONTEXT_RE = re.compile(r"\$|\b(?:precios?|cuestan?|valen?|cobran|d[oó]lares|usd|presupuesto|barat[oa]s?|econ[oó]mic[oa]s?)\b")
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def _singular(word: str) -> str:
+    return word[:-1] if word.endswith("s") else word
+
+def extract_search_filters(query: str) -> SearchFilters:
+    """
+    Detecta categoría ("batas", "medias", "pijama", "lencería") y rango de precio en la consulta.
+    Con dos o más categorías no filtra por categoría (el WHERE dejaría fuera a una de ellas).
+    """
+    filters: SearchFilters = {}
+    lowered = query.lower()
+
+    words = {_singular(w) for w in re.findall(r"[a-z]+", _fold(query))}
+    mentioned = [c for c in product_index.categories() or DEFAULT_CATEGORIES if _singular(_fold(c)) in words]
+    if len(mentioned) == 1:
+        filters["category"] = mentioned[0]
+
+    if not PRICE_CONTEXT_RE.search(lowered):
+        return filters
+
+    def _amount(value: str) -> float:
+        return float(value.replace(",", "."))
+
+    range_match = PRICE_RANGE_RE.search(lowered)
+    if range_match:
+        low, high = sorted([_amount(range_match.group(1)), _amount(range_match.group(2))])
+        filters["min_price"], filters["max_price"] = low, high
+    else:
+        max_match = PRICE_MAX_RE.search(lowered)
+        min_match = PRICE_MIN_RE.search(lowered)
+        if max_match:
+            filters["max_price"] = _amount(max_match.group(1))
+        if min_match:
+            filters["min_price"] = _amount(min_match.group(1))
+
+    return filters
+
+def _generation_cache_key(query: str, search_query: str, raw_context: str, recent_msgs: list, version: str):
+    """
+    Clave de la cache de generación, o None si la respuesta depende del historial:
+    la consulta se ancló a un producto anterior o usa referencias ("ese", "también", ...).
+    """
+    if not settings.generation_cache_enabled:
+        return None
+    if search_query != query or HISTORY_DEPENDENT_RE.search(query.lower()):
+        generation_cache.skipped += 1
+        return None
+    # El prompt pide presentarse sólo en el primer mensaje: primer turno y siguientes no comparten entrada
+    first_turn = not any(isinstance(m, AIMessage) for m in recent_msgs)
+    return GenerationCache.make_key(query, raw_context, version, first_turn)
+
+async def _cached_answer(key: str):
+    answer = generation_cache.get(key)
+    if answer is None and settings.generation_cache_persistent:
+        try:
+            answer = await generation_cache.pg_get(pool_manager, key)
+        except Exception as e:
+            print(f"Error leyendo cache persistente de respuestas: {e}")
+    return answer
+
+async def _persist_answer(key: str, version: str, query: str, answer: str):
+    try:
+        await generation_cache.pg_put(pool_manager, key, version, query, answer)
+    except Exception as e:
+        print(f"Error guardando respuesta en cache persistente: {e}")
+
+def _store_answer(key: str, version: str, query: str, answer: str):
+    generation_cache.put(key, answer)
+    if settings.generation_cache_persistent:
+        # Escritura fuera del camino de respuesta
+        task = asyncio.create_task(_persist_answer(key, version, query, answer))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
 
 # 2. Nodos
+def _matched_product_name(text: str) -> Optional[str]:
+    product = product_index.match(text)
+    return product["name"] if product else None
+
+def compact_conversation(state: AgentState):
+    """
+    Mantiene el estado de tamaño constante: si hay más de CONVERSATION_WINDOW_MESSAGES mensajes,
+    los más viejos se resumen en `memory` (productos, preferencias, temas) y se descartan.
+    """
+    result = compact(
+        state.get("messages", []),
+        state.get("memory"),
+        window=settings.conversation_window_messages,
+        extract_filters=extract_search_filters,
+        match_product=_matched_product_name,
+    )
+    if result is None:
+        return {}
+    messages, memory = result
+    logger.info(f"🗜️ Conversación compactada: {memory['compacted']} mensajes resumidos en memoria")
+    return {"messages": messages, "memory": memory}
+
 def check_consent(state: AgentState):
     """Verifica si el consentimiento fue otorgado. Si no, lo solicita."""
     if state.get("lopdp_consent"):
@@ -20,10 +273,11 @@ def check_consent(state: AgentState):
     
     last_message = state["messages"][-1] if state.get("messages") else None
     
-    if last_message and isinstance(last_message, HumanMessage) and "acepto" in last_message.content.lower():
+    if last_message and isinstance(last_message, HumanMessage) and "consent" in intent_router.route(last_message.content):
+        _log_route("template:consent", {"consent"})
         return {
             "lopdp_consent": True,
-            "messages": [AIMessage(content="Gracias por su confirmación. ¿En qué le puedo ayudar hoy?")]
+            "messages": [AIMessage(content=intent_router.templates["consent"])]
         }
     
     return {
@@ -45,20 +299,23 @@ async def consult_knowledge(state: AgentState):
             current_context = {}
 
         # --- Limpieza del input (Websocket manda historial acumulado) ---
-        import re
         parts = [p.strip() for p in re.split(r'[.?!]', raw_query) if p.strip()]
         query = parts[-1] if parts else raw_query
 
-        greetings = ["hola", "buenos días", "buenas tardes", "buenas", "qué tal", "hello"]
-        if query.lower().strip() in greetings or len(query.split()) <= 2 and "hola" in query.lower():
+        # --- Router de intención ---
+        # El consentimiento ya se otorgó (check_consent): "sí, acepto" no vuelve a la plantilla
+        intents = intent_router.route(query) - {"consent"}
+        templated = intent_router.template_for(intents, query)
+        if templated:
+            intent, reply = templated
+            _log_route(f"template:{intent}", intents)
             return {
-                "messages": [AIMessage(content="¡Hola! Qué gusto saludarte, soy Sofía de Civetta. ¿En qué puedo ayudarte hoy?")],
+                "messages": [AIMessage(content=reply)],
                 "current_product_context": current_context # Mantenemos el contexto por si acaso
             }
 
         # --- Detección de Cambio de Tema (Drop the Anchor) ---
-        release_keywords = ["otro", "otra", "diferente", "qué más", "aparte", "tienes pijama", "tienes lencería", "quiero ver"]
-        is_theme_change = any(word in query.lower() for word in release_keywords)
+        is_theme_change = "theme_change" in intents
 
         if is_theme_change:
             # Lógica de reseteo
@@ -68,8 +325,8 @@ async def consult_knowledge(state: AgentState):
             product_name = current_context.get("product_name")
 
         # --- FASE 1: Resolución de Pronombres y Slot Filling ---
-        implicit_keywords = ["precio", "cuesta", "vale", "talle", "talla", "color", "tela", "material", "descripción", "ese", "esa", "este", "este", "tienes", "batas", "medias"]
-        is_implicit = any(word in query.lower() for word in implicit_keywords)
+        attribute_intents = intents & ATTRIBUTE_INTENTS
+        is_implicit = bool(attribute_intents) or "reference" in intents
         
         search_query = query
 
@@ -77,9 +334,13 @@ async def consult_knowledge(state: AgentState):
             # Simplificamos la query para que el buscador encuentre el producto exacto
             search_query = f"{query} (producto: {product_name})"
 
+        # Filtros de metadatos (categoría / precio) que se empujan al WHERE de la búsqueda
+        search_filters = extract_search_filters(query)
+
         # --- FASE 2: Búsqueda RAG ASÍNCRONA (LATENCIA < 100MS) ---
         # Enviamos SOLO la intención de búsqueda pura a la base de datos de manera asíncrona.
-        rag_result = await rag_search(search_query, current_product=product_name)       
+        with stage_timer("retrieval"):
+            rag_result = await rag_search(search_query, current_product=product_name, filters=search_filters or None, intents=intents)
         
         # Manejo seguro por si el RAG devuelve string o diccionario
         if isinstance(rag_result, dict):
@@ -89,45 +350,98 @@ async def consult_knowledge(state: AgentState):
             raw_context = str(rag_result)
             new_context = {}
 
+        # Respuesta directa del índice de productos: ya es una oración final, no pasa por el LLM
+        direct_path = "index" if isinstance(rag_result, dict) and rag_result.get("direct") else None
+
+        # Consulta puntual de atributo con datos recuperados sin ambigüedad: plantilla en vez de LLM
+        if direct_path is None and attribute_intents and "open_ended" not in intents:
+            templated_result = _template_from_context(raw_context, query, product_name)
+            if templated_result is not None:
+                raw_context = templated_result["answer"]
+                new_context = templated_result["context"]
+                direct_path = "template:retrieval"
+
+        if direct_path:
+            _log_route(direct_path, intents)
+            final_context = current_context.copy()
+            final_context.update(new_context)
+            return {
+                "messages": [AIMessage(content=raw_context)],
+                "current_product_context": final_context
+            }
+
         # --- FASE 2.5: Generación de Respuesta con LLM (Para que "Sofía" no entregue fragmentos crudos) ---
         from src.config.llm_factory import LLMFactory
-        from llama_index.core.llms import ChatMessage, MessageRole
         
-        system_prompt = (
-            "Eres Sofía, asesora experta de la boutique Civetta. Tu estilo es minimalista, elegante y altamente eficiente. "
-            "REGLAS DE COMUNICACIÓN:\n"
-            "- SALUDO: Preséntate solo en el primer mensaje. En adelante, ve directo al punto.\n"
-            "- BREVEDAD: Máximo 2 o 3 oraciones. Elimina introducciones como 'He encontrado esto...' o disculpas como 'Lamento la espera'.\n"
-            "- FLUJO CONVERSACIONAL: Prohibido usar listas técnicas o formatos tipo base de datos (ej. PRODUCTO:, PRECIO:). "
-            "Si hay varios artículos, agrúpalos en un párrafo fluido resaltando el nombre y el precio de forma natural, si el cliente pide mas detalles, le das esos detalles que pidio.\n"
-            "- CIERRE: No uses frases de cierre robóticas. Si la respuesta está completa, no preguntes '¿algo más?' en cada mensaje.\n"
-            "- VERACIDAD: Usa exclusivamente el contexto proporcionado. Si algo no está en el catálogo, indica amablemente que no cuentas con esa información.\n"
-            "Tu objetivo es que el cliente sienta que habla con una vendedora real de una boutique de lujo, no con un buscador."
-        )
-        
-        user_prompt = f"Pregunta del usuario: {query}\n\n[CONTEXTO:\n{raw_context}\n]"
+        # Mensajes previos (excluyendo el actual): el presupuesto de tokens decide cuántos entran
+        history = messages[:-1] if isinstance(messages, list) else []
         
         try:
             llm = LLMFactory.get_llm()
-            chat_messages = [
-                ChatMessage(role=MessageRole.SYSTEM, content=system_prompt)
-            ]
-            
-            # Incorporar el historial de chat para que Sofía tenga contexto
-            # Tomamos los últimos mensajes relevantes (excluyendo el actual)
-            recent_msgs = messages[-5:-1] if isinstance(messages, list) else []
-            for msg in recent_msgs:
-                if isinstance(msg, HumanMessage):
-                    chat_messages.append(ChatMessage(role=MessageRole.USER, content=msg.content)) # type: ignore
-                elif isinstance(msg, AIMessage):
-                    chat_messages.append(ChatMessage(role=MessageRole.ASSISTANT, content=msg.content)) # type: ignore
-                    
-            chat_messages.append(ChatMessage(role=MessageRole.USER, content=user_prompt))
-            
-            response = await llm.achat(chat_messages)
-            answer = str(response.message.content)
+            model = getattr(llm, "model", "")
+            # Streaming token a token: con graph.astream(stream_mode="custom") cada delta llega
+            # al cliente apenas se genera; con ainvoke el writer no hace nada.
+            writer = get_stream_writer()
+
+            # Contexto rankeado y reducido a los campos de la intención + historial recortado por tokens
+            # Lo que salió de la ventana llega como memoria estructurada
+            conversation_memory = memory_note(state.get("memory"))
+            with stage_timer("prompt_build"):
+                chat_messages, prompt_context, prompt_stats = build_prompt(
+                    SYSTEM_PROMPT, query, raw_context, history, intents,
+                    product_name=product_name, model=model, memory=conversation_memory
+                )
+
+            version = prompt_version(SYSTEM_PROMPT, model)
+            cache_key = _generation_cache_key(query, search_query, prompt_context + conversation_memory, history[-4:], version)
+            cached = await _cached_answer(cache_key) if cache_key else None
+
+            # Plazo del request (/chat, /ws/chat): si no alcanza para generar, sólo lo recuperado
+            remaining = remaining_seconds()
+
+            if cached is not None:
+                _log_route("generation_cache", intents)
+                answer = cached
+                writer({"token": answer})
+            elif remaining is not None and remaining < settings.generation_min_seconds:
+                _log_route("deadline", intents)
+                answer = _retrieval_answer(raw_context, query, product_name)
+                writer({"token": answer})
+            else:
+                answer = ""
+                started = time.perf_counter()
+                first_token = None
+                with span("llm", model=model) as llm_span:
+                    try:
+                        async with asyncio.timeout(remaining):
+                            async for chunk in await llm.astream_chat(chat_messages):
+                                if chunk.delta:
+                                    if first_token is None:
+                                        first_token = time.perf_counter() - started
+                                        STAGE_SECONDS.labels("llm_first_token").observe(first_token)
+                                    answer += chunk.delta
+                                    writer({"token": chunk.delta})
+                    except TimeoutError:
+                        # Lo ya emitido se conserva; si no llegó nada, respuesta con lo recuperado
+                        _log_route("deadline", intents)
+                        if not answer.strip():
+                            answer = _retrieval_answer(raw_context, query, product_name)
+                            writer({"token": answer})
+                    else:
+                        _log_route("llm", intents)
+                        if cache_key and answer.strip():
+                            _store_answer(cache_key, version, query, answer)
+                    finally:
+                        completion_tokens = count_tokens(answer, model)
+                        STAGE_SECONDS.labels("llm").observe(time.perf_counter() - started)
+                        LLM_TOKENS.labels("prompt").observe(prompt_stats["total"])
+                        LLM_TOKENS.labels("completion").observe(completion_tokens)
+                        annotate(prompt_tokens=prompt_stats["total"], completion_tokens=completion_tokens)
+                        if llm_span is not None and first_token is not None:
+                            llm_span.set(first_token_ms=round(first_token * 1000, 2))
         except Exception as e:
             print(f"Error en LLM generador de respuesta: {e}")
+            _log_route("llm_error", intents)
             answer = "Permíteme un momento, estoy verificando esa información para ti..."
 
         # --- FASE 3: Lógica de Persistencia (Anti-Amnesia) ---
@@ -155,10 +469,12 @@ def should_continue(state: AgentState) -> Literal["consult_knowledge", "wait_for
 # 4. Construcción del grafo
 builder = StateGraph(AgentState)
 
+builder.add_node("compact_conversation", compact_conversation)
 builder.add_node("check_consent", check_consent)
 builder.add_node("consult_knowledge", consult_knowledge)
 
-builder.add_edge(START, "check_consent")
+builder.add_edge(START, "compact_conversation")
+builder.add_edge("compact_conversation", "check_consent")
 
 builder.add_conditional_edges(
     "check_consent",
@@ -173,3 +489,7 @@ builder.add_edge("consult_knowledge", END)
 
 graph = builder.compile()
 
+def compile_graph(checkpointer=None):
+    """Mismo grafo con checkpointer (estado persistido por thread_id)."""
+    return builder.compile(checkpointer=checkpointer)
+
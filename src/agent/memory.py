@@ -0,0 +1,114 @@
+import re
+from typing import Callable, Optional, TypedDict
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from src.config.settings import settings
+
+SIZE_RE = re.compile(r"\btall[ae]\s+(xxl|xl|xs|s|m|l)\b", re.IGNORECASE)
+COLOR_RE = re.compile(r"\b(?:en|color)\s+(blanco|negro|marfil|champagne|rosa|rojo|nude|perla|azul|beige|dorado|plateado)\b", re.IGNORECASE)
+
+# Máximo de elementos que se guardan en cada lista de la memoria
+MEMORY_LIST_LIMIT = 5
+
+
+class ConversationMemory(TypedDict, total=False):
+    products: list[str]  # productos consultados, del más viejo al más reciente
+    preferences: dict  # talla, color, categoría, rango de precio declarados por el cliente
+    topics: list[str]  # preguntas anteriores (recortadas) que ya salieron de la ventana
+    compacted: int  # mensajes resumidos hasta ahora
+
+
+class CompactedMessages(list):
+    """Lista de mensajes ya compactada: el reducer la usa como reemplazo en lugar de concatenarla."""
+
+
+def compact_messages(left: list[BaseMessage], right: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Reducer de AgentState.messages. Concatena como operator.add, salvo que `right` sea
+    CompactedMessages (reemplazo). Como red de seguridad nunca guarda más de
+    CONVERSATION_MAX_MESSAGES, sin contar los SystemMessage iniciales.
+    """
+    merged = list(right) if isinstance(right, CompactedMessages) else list(left or []) + list(right or [])
+    pinned, rest = split_pinned(merged)
+    limit = settings.conversation_max_messages
+    if limit and len(rest) > limit:
+        rest = rest[-limit:]
+    return pinned + rest
+
+
+def split_pinned(messages: list[BaseMessage]) -> tuple[list[BaseMessage], list[BaseMessage]]:
+    """SystemMessage del inicio (prompt de la sesión) y el resto de la conversación."""
+    index = 0
+    while index < len(messages) and isinstance(messages[index], SystemMessage):
+        index += 1
+    return messages[:index], messages[index:]
+
+
+def _append_unique(items: list[str], value: str) -> list[str]:
+    items = [item for item in items if item != value] + [value]
+    return items[-MEMORY_LIST_LIMIT:]
+
+
+def update_memory(
+    memory: Optional[ConversationMemory],
+    overflow: list[BaseMessage],
+    extract_filters: Callable[[str], dict],
+    match_product: Callable[[str], Optional[str]],
+) -> ConversationMemory:
+    """Resume en datos estructurados los mensajes que salen de la ventana."""
+    updated: ConversationMemory = {
+        "products": list((memory or {}).get("products", [])),
+        "preferences": dict((memory or {}).get("preferences", {})),
+        "topics": list((memory or {}).get("topics", [])),
+        "compacted": (memory or {}).get("compacted", 0) + len(overflow),
+    }
+
+    for msg in overflow:
+        text = str(msg.content)
+        if isinstance(msg, (HumanMessage, AIMessage)):
+            product = match_product(text)
+            if product:
+                updated["products"] = _append_unique(updated["products"], product)
+        if not isinstance(msg, HumanMessage):
+            continue
+
+        preferences = updated["preferences"]
+        preferences.update(extract_filters(text))
+        size = SIZE_RE.search(text)
+        if size:
+            preferences["size"] = size.group(1).upper()
+        color = COLOR_RE.search(text)
+        if color:
+            preferences["color"] = color.group(1).lower()
+
+        topic = re.sub(r"\s+", " ", text).strip()
+        if topic:
+            updated["topics"] = _append_unique(updated["topics"], topic[:80])
+
+    return updated
+
+
+def memory_note(memory: Optional[ConversationMemory]) -> str:
+    """Texto breve de la memoria para el prompt (vacío si todavía no se compactó nada)."""
+    if not memory:
+        return ""
+    parts = []
+    if memory.get("products"):
+        parts.append("productos consultados antes: " + ", ".join(memory["products"]))
+    preferences = memory.get("preferences") or {}
+    if preferences:
+        parts.append("preferencias: " + ", ".join(f"{k}={v}" for k, v in sorted(preferences.items())))
+    if memory.get("topics"):
+        parts.append("temas anteriores: " + " | ".join(memory["topics"]))
+    return "; ".join(parts)
+
+
+def compact(messages: list[BaseMessage], memory: Optional[ConversationMemory], window: int, **extractors) -> Optional[tuple[CompactedMessages, ConversationMemory]]:
+    """
+    Si la conversación supera `window` mensajes, deja los SystemMessage iniciales + los últimos
+    `window` y vuelca el resto en la memoria. Devuelve None si no hace falta compactar.
+    """
+    pinned, rest = split_pinned(messages)
+    if len(rest) <= window:
+        return None
+    overflow, recent = rest[:-window], rest[-window:]
+    return CompactedMessages(pinned + recent), update_memory(memory, overflow, **extractors)
@@ -0,0 +1,229 @@
+import logging
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, TypedDict
+import tiktoken
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from llama_index.core.llms import ChatMessage, MessageRole
+from src.config.settings import settings
+from src.rag.product_index import ProductRecord, parse_product_block
+
+logger = logging.getLogger("prompt_builder")
+
+# Tokens de entrada acumulados por sección (para métricas)
+token_totals: Counter = Counter()
+
+# Tokens extra que agrega el formato de chat por cada mensaje (rol + separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Campos del bloque de catálogo que necesita cada intención de atributo
+INTENT_FIELDS = {
+    "price": ["price"],
+    "sizes": ["sizes"],
+    "color": ["color"],
+    "fabric": ["fabric"],
+}
+
+FIELD_LABELS = {
+    "name": "PRODUCTO",
+    "category": "CATEGORÍA",
+    "fabric": "TELA",
+    "color": "COLOR",
+    "price": "PRECIO",
+    "sizes": "TALLAS",
+    "description": "DESCRIPCIÓN",
+}
+
+
+class PromptStats(TypedDict):
+    system: int
+    query: int
+    context: int
+    history: int
+    total: int
+    blocks_kept: int
+    blocks_dropped: int
+    history_messages: int
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class _ApproxEncoding:
+    """Aproximación (~4 caracteres por token) si tiktoken no puede cargar su tabla (p.ej. sin red)."""
+
+    def encode(self, text: str) -> list[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el tokenizador de {model or 'cl100k_base'}, se usa una aproximación: {e}")
+        return _ApproxEncoding()
+
+
+def warm_up_tokenizer(model: str = "") -> None:
+    """Carga la tabla BPE al iniciar (tiktoken la descarga la primera vez) para no pagarlo en un turno."""
+    _encoding(model)
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    return len(_encoding(model).encode(text or ""))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "", keep: str = "head") -> str:
+    """Recorta `text` a `max_tokens` conservando el principio (head) o el final (tail)."""
+    encoding = _encoding(model)
+    tokens = encoding.encode(text or "")
+    if len(tokens) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    kept = tokens[-max_tokens:] if keep == "tail" else tokens[:max_tokens]
+    return ("…" + encoding.decode(kept)) if keep == "tail" else (encoding.decode(kept) + "…")
+
+
+def _render_record(record: ProductRecord, fields: Optional[list[str]]) -> str:
+    """Bloque de catálogo reducido a los campos pedidos (siempre con nombre y categoría)."""
+    if fields is None:
+        return record.get("content", "")
+    lines = []
+    for field in ["name", "category", *fields]:
+        value = record.get(field)
+        if not value:
+            continue
+        if isinstance(value, list):
+            value = ", ".join(value)
+        lines.append(f"{FIELD_LABELS[field]}: {value}")
+    return "\n".join(lines)
+
+
+def select_context(raw_context: str, query: str, intents: set[str], product_name: Optional[str], max_tokens: int, model: str = "") -> tuple[str, int, int]:
+    """
+    Ordena los bloques recuperados (el producto nombrado o anclado primero, luego el orden de la búsqueda),
+    los reduce a los campos de la intención y agrega bloques hasta llenar `max_tokens`.
+    Devuelve (contexto, bloques usados, bloques descartados).
+    """
+    blocks = [b.strip() for b in raw_context.split("\n\n") if b.strip()]
+    if not blocks:
+        return "", 0, 0
+
+    # Sólo campos puntuales si la pregunta es de atributo (precio/talla/...) y no abierta
+    fields: Optional[list[str]] = None
+    attribute_intents = [i for i in INTENT_FIELDS if i in intents]
+    if attribute_intents and "open_ended" not in intents:
+        fields = [f for i in attribute_intents for f in INTENT_FIELDS[i]]
+
+    folded_query = _fold(query)
+    folded_anchor = _fold(product_name) if product_name else ""
+
+    ranked = []
+    for position, block in enumerate(blocks):
+        record = parse_product_block(block)
+        if record is None:
+            # Texto libre (no es un bloque de producto): se conserva completo
+            ranked.append((0, position, block))
+            continue
+        name = _fold(record["name"])
+        named = name in folded_query or (folded_anchor and name == folded_anchor)
+        ranked.append((0 if named else 1, position, _render_record(record, fields)))
+    ranked.sort()
+
+    kept, used = [], 0
+    for _, _, text in ranked:
+        cost = count_tokens(text, model) + 2
+        if used + cost > max_tokens:
+            if not kept:
+                # Al menos el mejor bloque, recortado
+                kept.append(truncate_tokens(text, max_tokens, model))
+            break
+        kept.append(text)
+        used += cost
+    return "\n\n".join(kept), len(kept), len(blocks) - len(kept)
+
+
+def select_history(messages: list[BaseMessage], max_tokens: int, model: str = "") -> list[ChatMessage]:
+    """
+    Historial más reciente que entra en `max_tokens`, del más nuevo al más viejo.
+    Un mensaje muy largo (el websocket manda el historial acumulado) se recorta por el final.
+    """
+    per_message = max(settings.prompt_history_message_max_tokens, 1)
+    selected: list[ChatMessage] = []
+    used = 0
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            role = MessageRole.USER
+        elif isinstance(msg, AIMessage):
+            role = MessageRole.ASSISTANT
+        else:
+            continue
+        content = truncate_tokens(str(msg.content), per_message, model, keep="tail")
+        cost = count_tokens(content, model) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > max_tokens:
+            break
+        selected.append(ChatMessage(role=role, content=content))
+        used += cost
+    selected.reverse()
+    return selected
+
+
+def build_prompt(system_prompt: str, query: str, raw_context: str, history: list[BaseMessage], intents: set[str], product_name: Optional[str] = None, model: str = "", memory: str = "") -> tuple[list[ChatMessage], str, PromptStats]:
+    """
+    Arma los mensajes del LLM dentro de PROMPT_MAX_INPUT_TOKENS.
+    Prioridad: system prompt, pregunta y memoria compactada (fijos) > contexto del catálogo > historial.
+    Devuelve (mensajes, contexto usado, estadísticas de tokens).
+    """
+    budget = settings.prompt_max_input_tokens
+    system_tokens = count_tokens(system_prompt, model) + MESSAGE_OVERHEAD_TOKENS
+    query = truncate_tokens(query, settings.prompt_query_max_tokens, model, keep="tail")
+    memory_block = f"\n\n[MEMORIA DE LA CONVERSACIÓN: {truncate_tokens(memory, settings.prompt_memory_max_tokens, model)}]" if memory else ""
+    frame = f"Pregunta del usuario: {query}{memory_block}\n\n[CONTEXTO:\n\n]"
+    query_tokens = count_tokens(frame, model) + MESSAGE_OVERHEAD_TOKENS
+
+    available = max(budget - system_tokens - query_tokens, 0)
+    context, kept, dropped = select_context(
+        raw_context, query, intents, product_name,
+        max_tokens=min(available, settings.prompt_context_max_tokens), model=model
+    )
+    context_tokens = count_tokens(context, model)
+
+    history_budget = min(max(available - context_tokens, 0), settings.prompt_history_max_tokens)
+    history_messages = select_history(history, history_budget, model)
+    history_tokens = sum(count_tokens(m.content or "", model) + MESSAGE_OVERHEAD_TOKENS for m in history_messages)
+
+    user_prompt = f"Pregunta del usuario: {query}{memory_block}\n\n[CONTEXTO:\n{context}\n]"
+    chat_messages = [
+        ChatMessage(role=MessageRole.SYSTEM, content=system_prompt),
+        *history_messages,
+        ChatMessage(role=MessageRole.USER, content=user_prompt),
+    ]
+
+    stats: PromptStats = {
+        "system": system_tokens,
+        "query": query_tokens,
+        "context": context_tokens,
+        "history": history_tokens,
+        "total": system_tokens + query_tokens + context_tokens + history_tokens,
+        "blocks_kept": kept,
+        "blocks_dropped": dropped,
+        "history_messages": len(history_messages),
+    }
+    token_totals.update({key: stats[key] for key in ("system", "query", "context", "history", "total")})
+    token_totals["turns"] += 1
+    logger.info(
+        f"🧮 Prompt: {stats['total']} tokens (contexto {context_tokens}, historial {history_tokens}, "
+        f"bloques {kept}/{kept + dropped}, mensajes previos {len(history_messages)})"
+    )
+    return chat_messages, context, stats
@@ -1,31 +1,43 @@
-from typing import Any
+from typing import Any, Dict, Optional, Tuple
 from llama_index.embeddings.openai import OpenAIEmbedding
 from src.config.settings import settings
+from src.config.http_client import get_async_http_client, get_http_client
 
 class EmbeddingsFactory:
-    
-    @staticmethod
-    def get_eval_embed_model() -> Any:
+    # Un cliente por (proveedor, modelo) compartido por consultas e ingesta
+    _instances: Dict[Tuple[str, str], Any] = {}
+
+    @classmethod
+    def get_eval_embed_model(cls, model: Optional[str] = None) -> Any:
         """
-        Returns the embedding model.
+        Returns the embedding model (long-lived singleton per provider and model).
         """
         provider = settings.embeddings_provider.upper()
-        
-        if provider == "OPENAI":
-            if not settings.openai_api_key:
-                raise ValueError("OPENAI_API_KEY is not set for embeddings.")
-            return OpenAIEmbedding(
-                model="text-embedding-3-small",
-                api_key=settings.openai_api_key
-            )
-            
+        model = model or settings.embeddings_model
+
+        key = (provider, model)
+        embed_model = cls._instances.get(key)
+        if embed_model is None:
+            embed_model = cls._create(provider, model)
+            cls._instances[key] = embed_model
+        return embed_model
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._instances.clear()
+
+    @staticmethod
+    def _create(provider: str, model: str) -> Any:
         # Add other providers here (e.g. HuggingFace, Cohere)
-        
-        else:
+        if provider != "OPENAI":
             print(f"Warning: Unknown Embeddings provider '{provider}'. Defaulting to OpenAI.")
-            if not settings.openai_api_key:
-                raise ValueError("OPENAI_API_KEY is not set for embeddings.")
-            return OpenAIEmbedding(
-                model="text-embedding-3-small",
-                api_key=settings.openai_api_key
-            )
\ No newline at end of file
+
+        if not settings.openai_api_key:
+            raise ValueError("OPENAI_API_KEY is not set for embeddings.")
+        return OpenAIEmbedding(
+            model=model,
+            api_key=settings.openai_api_key,
+            api_base=settings.openai_api_base,
+            http_client=get_http_client(),
+            async_http_client=get_async_http_client()
+        )
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Optional
+import httpx
+from src.config.settings import settings
+
+# Clientes HTTP de larga vida compartidos por los proveedores (OpenAI / Anthropic LLM, embeddings, Realtime).
+# Mantienen conexiones keep-alive para no pagar TLS en cada turno.
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_seconds,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return _async_client
+
+
+def get_http_client() -> httpx.Client:
+    """Versión síncrona (ingesta y llamadas síncronas de llama-index)."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _sync_client
+
+
+async def warm_up(url: str, headers: Optional[dict] = None, connections: int = 1) -> int:
+    """
+    Abre `connections` conexiones en paralelo contra `url` para que queden en el pool keep-alive.
+    Devuelve cuántas respondieron (cualquier status HTTP cuenta: lo que importa es el handshake).
+    """
+    client = get_async_http_client()
+
+    async def _touch() -> bool:
+        try:
+            await client.get(url, headers=headers)
+            return True
+        except httpx.HTTPError as e:
+            print(f"Warm-up de {url} falló: {e}")
+            return False
+
+    results = await asyncio.gather(*(_touch() for _ in range(max(connections, 1))))
+    return sum(results)
+
+
+async def warm_up_providers() -> None:
+    """Crea los clientes de LLM y embeddings y precalienta sus conexiones antes de aceptar tráfico."""
+    from src.config.llm_factory import LLMFactory
+    from src.config.embeddings_factory import EmbeddingsFactory
+
+    try:
+        LLMFactory.get_llm()
+        EmbeddingsFactory.get_eval_embed_model()
+    except Exception as e:
+        print(f"No se pudieron crear los clientes de los proveedores: {e}")
+        return
+
+    if settings.openai_api_key and "OPENAI" in (settings.llm_provider.upper(), settings.embeddings_provider.upper()):
+        warmed = await warm_up(
+            f"{settings.openai_api_base.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+            connections=settings.http_warmup_connections,
+        )
+        print(f"🔌 Conexiones a OpenAI precalentadas: {warmed}/{settings.http_warmup_connections}")
+
+    if settings.anthropic_api_key and settings.llm_provider.upper() == "ANTHROPIC":
+        warmed = await warm_up(
+            f"{settings.anthropic_api_base.rstrip('/')}/v1/models",
+            headers={"x-api-key": settings.anthropic_api_key, "anthropic-version": "2023-06-01"},
+            connections=settings.http_warmup_connections,
+        )
+        print(f"🔌 Conexiones a Anthropic precalentadas: {warmed}/{settings.http_warmup_connections}")
+
+
+async def close_http_clients() -> None:
+    global _async_client, _sync_client
+    from src.config.llm_factory import LLMFactory
+    from src.config.embeddings_factory import EmbeddingsFactory
+
+    # Los singletons guardan referencias a estos clientes: se descartan junto con ellos
+    LLMFactory.reset()
+    EmbeddingsFactory.reset()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
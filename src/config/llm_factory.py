@@ -1,50 +1,81 @@
-from typing import Any
+from typing import Any, Dict, Optional, Tuple
 from llama_index.llms.openai import OpenAI
 # from llama_index.llms.anthropic import Anthropic
 # from llama_index.llms.ollama import Ollama
 from src.config.settings import settings
+from src.config.http_client import get_async_http_client, get_http_client
+
+DEFAULT_MODELS = {
+    "OPENAI": "gpt-3.5-turbo",
+    "ANTHROPIC": "claude-3-opus-20240229",
+    "OLLAMA": "llama3",
+}
 
 class LLMFactory:
-    _instance = None
+    # Un cliente por (proveedor, modelo), creado la primera vez que se pide y reutilizado en cada turno
+    _instances: Dict[Tuple[str, str], Any] = {}
 
-    @staticmethod
-    def get_llm() -> Any:
+    @classmethod
+    def get_llm(cls, model: Optional[str] = None) -> Any:
         provider = settings.llm_provider.upper()
-        
+        if provider not in DEFAULT_MODELS:
+            print(f"Warning: Unknown LLM provider '{provider}'. Defaulting to OpenAI.")
+            provider = "OPENAI"
+        model = model or settings.llm_model or DEFAULT_MODELS[provider]
+
+        key = (provider, model)
+        llm = cls._instances.get(key)
+        if llm is None:
+            llm = cls._create(provider, model)
+            cls._instances[key] = llm
+        return llm
+
+    @classmethod
+    def reset(cls) -> None:
+        cls._instances.clear()
+
+    @staticmethod
+    def _create(provider: str, model: str) -> Any:
         if provider == "OPENAI":
             if not settings.openai_api_key:
                 raise ValueError("OPENAI_API_KEY is not set.")
             return OpenAI(
-                model="gpt-3.5-turbo",
+                model=model,
                 temperature=0,
-                api_key=settings.openai_api_key
+                api_key=settings.openai_api_key,
+                api_base=settings.openai_api_base,
+                http_client=get_http_client(),
+                async_http_client=get_async_http_client()
             )
-            
+
         elif provider == "ANTHROPIC":
             if not settings.anthropic_api_key:
                 raise ValueError("ANTHROPIC_API_KEY is not set.")
-                
+
             try:
                 from llama_index.llms.anthropic import Anthropic
             except ImportError:
                  raise ImportError("Please install `llama-index-llms-anthropic` to use Anthropic.")
-            
-            return Anthropic(model="claude-3-opus-20240229")
 
-        elif provider == "OLLAMA":
+            llm = Anthropic(model=model, api_key=settings.anthropic_api_key, base_url=settings.anthropic_api_base)
+            # La integración de llama-index no recibe http_client: se reemplazan sus clientes del SDK
+            # por unos que usan los clientes keep-alive compartidos (los que precalienta el arranque)
+            import anthropic
+            if hasattr(llm, "_client") and hasattr(llm, "_aclient"):
+                llm._client = anthropic.Anthropic(
+                    api_key=settings.anthropic_api_key, base_url=settings.anthropic_api_base, http_client=get_http_client()
+                )
+                llm._aclient = anthropic.AsyncAnthropic(
+                    api_key=settings.anthropic_api_key, base_url=settings.anthropic_api_base, http_client=get_async_http_client()
+                )
+            return llm
+
+        else:
             try:
                 from llama_index.llms.ollama import Ollama
             except ImportError:
                 raise ImportError("Please install `llama-index-llms-ollama` to use Ollama.")
-            
-            return Ollama(model="llama3", request_timeout=60.0)
 
-        else:
-            print(f"Warning: Unknown LLM provider '{provider}'. Defaulting to OpenAI.")
-            if not settings.openai_api_key:
-                raise ValueError("OPENAI_API_KEY is not set.")
-            return OpenAI(
-                model="gpt-3.5-turbo",
-                temperature=0,
-                api_key=settings.openai_api_key
-            )
\ No newline at end of file
+            # El cliente de `ollama` crea su propio httpx (sin parámetro para inyectarlo); el servidor es
+            # local y sin TLS, así que no hay handshake que ahorrar con el pool compartido
+            return Ollama(model=model, request_timeout=60.0)
@@ -0,0 +1,109 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from prometheus_client import Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from src.config.tracing import span
+
+# Buckets en segundos: desde aciertos de cache (~1 ms) hasta respuestas completas del LLM
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+
+def _registered(name: str, create: Callable[[], Any]) -> Any:
+    """
+    La métrica ya registrada con ese nombre o una nueva. Si el módulo se importa otra vez
+    (reload, tests, otra ruta de import) no se registra de nuevo: prometheus_client lanzaría
+    "Duplicated timeseries in CollectorRegistry".
+    """
+    existing = REGISTRY._names_to_collectors.get(name)  # type: ignore[attr-defined]
+    return existing if existing is not None else create()
+
+
+STAGE_SECONDS = _registered("gespro_stage_seconds", lambda: Histogram(
+    "gespro_stage_seconds",
+    "Latencia por etapa (embedding, sql_search, retrieval, llm, graph, checkpoint_flush, turn...)",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+))
+POOL_WAIT_SECONDS = _registered("gespro_db_pool_wait_seconds", lambda: Histogram(
+    "gespro_db_pool_wait_seconds",
+    "Espera para obtener una conexión del pool de Postgres",
+    buckets=LATENCY_BUCKETS,
+))
+LLM_TOKENS = _registered("gespro_llm_tokens", lambda: Histogram(
+    "gespro_llm_tokens",
+    "Tokens por llamada al LLM (prompt / completion)",
+    ["kind"],
+    buckets=TOKEN_BUCKETS,
+))
+TURN_ROUTES = _registered("gespro_turn_route", lambda: Counter(
+    "gespro_turn_route",
+    "Rama que tomó cada turno (template:greeting, index, generation_cache, llm, deadline...)",
+    ["route"],
+))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    `with stage_timer("embedding"): ...` observa la duración en gespro_stage_seconds y, si el
+    turno está muestreado, la registra como span de su traza (devuelve el span o None).
+    """
+    start = time.perf_counter()
+    with span(stage) as current:
+        try:
+            yield current
+        finally:
+            STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def register_stats(component: str, source: Callable[[], dict]) -> None:
+    _stats_collector.sources[component] = source
+
+
+def _flatten(prefix: str, data: dict) -> Iterator[tuple[str, float]]:
+    for key, value in data.items():
+        name = f"{prefix}_{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+class _StatsCollector:
+    """Expone los stats() registrados como gespro_component{component, stat}."""
+
+    def __init__(self):
+        # Componentes con stats() propios (caches, pool, sesiones...): se leen recién al hacer scrape
+        self.sources: dict[str, Callable[[], dict]] = {}
+
+    def collect(self):
+        family = GaugeMetricFamily(
+            "gespro_component",
+            "Contadores y tamaños de los componentes (hits, misses, evictions, pendientes...)",
+            labels=["component", "stat"],
+        )
+        for component, source in list(self.sources.items()):
+            try:
+                data = source()
+            except Exception:
+                continue
+            for stat, value in _flatten("", data or {}):
+                family.add_metric([component, stat], value)
+        yield family
+
+
+def _new_stats_collector() -> _StatsCollector:
+    collector = _StatsCollector()
+    REGISTRY.register(collector)
+    return collector
+
+
+# Una sola instancia por registry: re-importar el módulo conserva los componentes registrados
+_stats_collector: _StatsCollector = _registered("gespro_component", _new_stats_collector)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """(cuerpo, content-type) en formato de exposición de Prometheus."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -11,9 +11,147 @@ class Settings(BaseSettings):
     
     retell_api_key: Optional[str] = None
     
+    # Pool de Postgres compartido (RAG + checkpointer)
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 10
+    db_pool_timeout_seconds: float = 10.0
+    db_pool_max_waiting: int = 0  # 0 = sin límite de espera en cola
+    # Desactivar si hay un pooler en modo transacción delante (p.ej. Supabase :6543)
+    db_prepared_statements: bool = True
+
+    # Clientes HTTP compartidos por los proveedores (keep-alive)
+    openai_api_base: str = "https://api.openai.com/v1"
+    anthropic_api_base: str = "https://api.anthropic.com"
+    http_max_connections: int = 50
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry_seconds: float = 120
+    http_timeout_seconds: float = 60
+    http_connect_timeout_seconds: float = 5
+    http_warmup_connections: int = 2
+
+    # Pool de sesiones efímeras de OpenAI Realtime (/api/realtime-token)
+    realtime_pool_size: int = 2
+    realtime_refresh_margin_seconds: float = 15  # se descartan las que vencen antes de este margen
+    realtime_session_ttl_seconds: float = 60  # si la respuesta no trae expires_at
+    realtime_pool_idle_seconds: float = 300  # sin llamadas de voz en este lapso el pool baja a realtime_pool_idle_size
+    realtime_pool_idle_size: int = 0
+
     # Providers
     llm_provider: str = "OPENAI"
+    llm_model: Optional[str] = None  # None = modelo por defecto del proveedor
     embeddings_provider: str = "OPENAI"
+    embeddings_model: str = "text-embedding-3-small"
+
+    # Cache de embeddings de consultas (LRU/TTL en memoria + tier opcional en Postgres)
+    embedding_cache_size: int = 2048
+    embedding_cache_ttl_seconds: int = 3600
+    embedding_cache_persistent: bool = False
+
+    # Cache semántica de respuestas de rag_search
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.92
+    semantic_cache_size: int = 512
+    catalog_version_ttl_seconds: float = 30
+    # Sin knowledge_base_version la versión es un md5 de toda la tabla: se recalcula con menos frecuencia
+    catalog_hash_ttl_seconds: float = 300
+
+    # Presupuesto de tokens de entrada del LLM de consult_knowledge
+    prompt_max_input_tokens: int = 1200
+    prompt_context_max_tokens: int = 700
+    prompt_history_max_tokens: int = 300
+    prompt_history_message_max_tokens: int = 120
+    prompt_query_max_tokens: int = 150
+    prompt_memory_max_tokens: int = 120
+
+    # Sesiones de /chat: "postgres" (checkpointer de LangGraph, thread_id = session_id) o "memory"
+    chat_session_backend: str = "postgres"
+    # Cada lectura compara la copia local con el último checkpoint_id en Postgres (otro worker pudo
+    # escribir el hilo). Con false sólo vale el TTL: requiere sticky routing por session_id.
+    checkpoint_verify_hot: bool = True
+    checkpoint_hot_ttl_seconds: float = 300  # cuán vieja puede ser la copia local sin verificación
+    checkpoint_flush_interval_seconds: float = 0.5
+    checkpoint_batch_size: int = 100
+
+    # Sesiones de /chat en memoria (LRU + TTL por inactividad + tope aproximado en bytes).
+    # Con el backend postgres, max_sessions acota también la cache caliente de checkpoints.
+    chat_session_max_sessions: int = 10000
+    chat_session_ttl_seconds: float = 3600
+    chat_session_max_bytes: int = 64_000_000
+
+    # Herramienta de la llamada de voz (sólo recuperación, con presupuesto de latencia)
+    voice_tool_timeout_seconds: float = 1.2
+    voice_tool_max_products: int = 3
+    voice_tool_description_chars: int = 160
+    voice_tool_note_chars: int = 300
+
+    # Control de admisión por endpoint: requests en curso, en cola y espera máxima en la cola.
+    # Por encima se responde 503 con Retry-After en vez de acumular llamadas al LLM.
+    admission_chat_max_concurrent: int = 32
+    admission_chat_max_queue: int = 64
+    admission_chat_queue_timeout_seconds: float = 2.0
+    admission_voice_tool_max_concurrent: int = 64
+    admission_voice_tool_max_queue: int = 32
+    admission_voice_tool_queue_timeout_seconds: float = 0.3
+    admission_token_max_concurrent: int = 8
+    admission_token_max_queue: int = 32
+    admission_token_queue_timeout_seconds: float = 2.0
+    admission_retry_after_seconds: int = 2
+
+    # Plazo por turno de chat; si queda menos que generation_min_seconds se responde
+    # sólo con lo recuperado (sin LLM)
+    chat_deadline_seconds: float = 25
+    generation_min_seconds: float = 3
+
+    # Probes de /health/ready: resultado cacheado, timeout por dependencia y ping a los proveedores
+    health_cache_ttl_seconds: float = 10
+    health_check_timeout_seconds: float = 2
+    health_ping_providers: bool = True  # False = sólo se verifica que el cliente se pueda crear
+
+    # Flight recorder de turnos lentos: fracción de turnos trazados, cuántos de los más lentos
+    # se guardan (y por cuánto tiempo), JSONL opcional y token de /admin/traces
+    trace_sample_rate: float = 0.1
+    trace_buffer_size: int = 50
+    trace_window_seconds: float = 3600
+    trace_jsonl_path: Optional[str] = None
+    trace_jsonl_min_ms: float = 1000
+    admin_token: Optional[str] = None  # sin token /admin/* responde 404
+
+    # WebSocket /ws/chat: tope de conexiones por worker, cola de salida por conexión y heartbeats
+    ws_max_connections: int = 500
+    ws_send_queue_size: int = 64  # mensajes pendientes de enviar antes de frenar al productor
+    ws_send_timeout_seconds: float = 10  # cliente que no drena su cola en este tiempo se desconecta
+    ws_heartbeat_seconds: float = 20
+    ws_idle_timeout_seconds: float = 300
+
+    # Estado de conversación acotado: ventana de mensajes recientes + memoria compactada
+    conversation_window_messages: int = 12
+    conversation_max_messages: int = 40  # tope duro del reducer
+
+    # Cache de respuestas generadas por el LLM (consulta + contexto recuperado + versión del prompt)
+    generation_cache_enabled: bool = True
+    generation_cache_size: int = 1024
+    generation_cache_ttl_seconds: int = 86400
+    generation_cache_persistent: bool = False
+
+    # Índice estructurado de productos en memoria (ruta rápida de precio/talla/color)
+    product_index_enabled: bool = True
+    product_index_source: str = "knowledge_base"  # "knowledge_base" o "file"
+    product_index_path: str = "data/catalogo.txt"
+    product_index_min_score: float = 0.5
+
+    # Recuperación: "vector" (solo pgvector) o "hybrid" (léxica + vectorial con RRF)
+    retrieval_mode: str = "vector"
+    hybrid_rrf_k: int = 60
+    hybrid_candidates: int = 20
+
+    # Backend de recuperación vectorial: "pgvector" o "mirror" (matriz NumPy en memoria + LISTEN/NOTIFY)
+    retrieval_backend: str = "pgvector"
+    vector_mirror_snapshot_path: str = "data/vector_mirror"
+    vector_mirror_max_staleness_seconds: float = 30
+
+    # Parámetros de búsqueda del índice ANN (se aplican por conexión del pool)
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
     
     # Optional LangSmith logic handled by environment variables directly usually, 
     # but we can add them if we want to explicitly access them.
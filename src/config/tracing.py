@@ -0,0 +1,178 @@
+import json
+import time
+import random
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+from src.config.settings import settings
+
+logger = logging.getLogger("tracing")
+
+
+class Span:
+    """Etapa medida dentro de un turno; los hijos se agregan desde cualquier task que herede el contexto."""
+
+    __slots__ = ("name", "start", "end", "attrs", "children")
+
+    def __init__(self, name: str, attrs: Optional[dict] = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs: dict[str, Any] = dict(attrs or {})
+        self.children: list["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: Optional[float] = None) -> dict:
+        origin = self.start if origin is None else origin
+        data: dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+# Raíz del turno muestreado y span abierto más interno (None = turno no muestreado)
+_root: ContextVar[Optional[Span]] = ContextVar("trace_root", default=None)
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+@contextmanager
+def _activate(root: Optional[Span], current: Optional[Span]):
+    # set y no reset(token): en generadores el cierre puede correr en otro contexto
+    previous = (_root.get(), _current.get())
+    _root.set(root)
+    _current.set(current)
+    try:
+        yield
+    finally:
+        _root.set(previous[0])
+        _current.set(previous[1])
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Span hijo del actual; no hace nada (y devuelve None) si el turno no está muestreado."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    try:
+        with _activate(_root.get(), child):
+            yield child
+    finally:
+        child.end = time.perf_counter()
+
+
+def annotate(**attrs) -> None:
+    """Datos del turno (consulta, filas recuperadas, tokens, ruta) en la raíz de la traza."""
+    root = _root.get()
+    if root is not None:
+        root.attrs.update(attrs)
+
+
+class FlightRecorder:
+    """
+    Guarda los `capacity` turnos más lentos de la última `window_seconds` con su árbol de spans.
+    Un turno nuevo entra si hay lugar o si es más lento que el más rápido guardado.
+    Opcionalmente agrega a un JSONL los turnos que superan `jsonl_min_ms`.
+    """
+
+    def __init__(self, capacity: int = 50, window_seconds: float = 3600, jsonl_path: Optional[str] = None, jsonl_min_ms: float = 1000):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.jsonl_path = jsonl_path
+        self.jsonl_min_ms = jsonl_min_ms
+        # (momento de registro, duración, traza serializada)
+        self._entries: list[tuple[float, float, dict]] = []
+        self.recorded = 0
+        self.sampled = 0
+
+    def _expire(self, now: float) -> None:
+        if self.window_seconds:
+            self._entries = [e for e in self._entries if now - e[0] <= self.window_seconds]
+
+    def record(self, root: Span) -> None:
+        self.sampled += 1
+        now = time.monotonic()
+        duration = root.duration_ms
+        self._expire(now)
+        if len(self._entries) >= self.capacity:
+            fastest = min(range(len(self._entries)), key=lambda i: self._entries[i][1])
+            if self._entries[fastest][1] >= duration:
+                return
+            del self._entries[fastest]
+
+        trace = root.to_dict()
+        trace["recorded_at"] = round(time.time(), 3)
+        self._entries.append((now, duration, trace))
+        self.recorded += 1
+        if self.jsonl_path and duration >= self.jsonl_min_ms:
+            self._write_jsonl(trace)
+
+    def _write_jsonl(self, trace: dict) -> None:
+        line = json.dumps(trace, ensure_ascii=False, default=str) + "\n"
+
+        def _append() -> None:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:  # type: ignore[arg-type]
+                f.write(line)
+
+        try:
+            # Fuera del event loop: el turno no espera al disco
+            asyncio.get_running_loop().run_in_executor(None, _append)
+        except RuntimeError:
+            _append()
+
+    def slowest(self, limit: Optional[int] = None) -> list[dict]:
+        self._expire(time.monotonic())
+        traces = [trace for _, _, trace in sorted(self._entries, key=lambda e: e[1], reverse=True)]
+        return traces[:limit] if limit else traces
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"kept": len(self._entries), "capacity": self.capacity, "sampled": self.sampled, "recorded": self.recorded}
+
+
+flight_recorder = FlightRecorder(
+    capacity=settings.trace_buffer_size,
+    window_seconds=settings.trace_window_seconds,
+    jsonl_path=settings.trace_jsonl_path,
+    jsonl_min_ms=settings.trace_jsonl_min_ms
+)
+
+
+@contextmanager
+def start_trace(name: str, **attrs):
+    """
+    Raíz de la traza de un turno. Con probabilidad `trace_sample_rate` se registran los spans
+    de las etapas (stage_timer / span) y al terminar el turno pasa por el flight recorder.
+    """
+    if _root.get() is not None or random.random() >= settings.trace_sample_rate:
+        yield None
+        return
+    root = Span(name, attrs)
+    try:
+        with _activate(root, root):
+            yield root
+    finally:
+        root.end = time.perf_counter()
+        try:
+            flight_recorder.record(root)
+        except Exception as e:
+            logger.warning(f"No se pudo registrar la traza: {e}")
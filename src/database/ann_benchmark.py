@@ -0,0 +1,134 @@
+"""
+Benchmark de índices ANN (pgvector) sobre un catálogo sintético.
+
+Mide recall@k contra la búsqueda exacta y la latencia p50/p99 para distintos
+valores de hnsw.ef_search / ivfflat.probes.
+
+Uso:
+    python -m src.database.ann_benchmark --rows 10000 --method hnsw --ef-search 20,40,80,160
+    python -m src.database.ann_benchmark --rows 1000000 --method ivfflat --lists 1000 --probes 1,10,40
+"""
+import argparse
+import time
+import numpy as np
+import psycopg
+from psycopg import sql
+from pgvector.psycopg import register_vector
+from src.config.settings import settings
+from src.database.indexes import ANN_METHODS, create_ann_index
+
+SEARCH_SQL = "SELECT id FROM {} ORDER BY embedding <#> %s LIMIT %s;"
+
+
+def _unit_rows(rng: np.random.Generator, centers: np.ndarray, n: int, noise: float) -> np.ndarray:
+    """Filas alrededor de centros aleatorios (parecido a un catálogo con categorías), normalizadas."""
+    picks = rng.integers(0, len(centers), size=n)
+    rows = centers[picks] + rng.normal(0, noise, size=(n, centers.shape[1])).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def load_synthetic_catalog(conn: psycopg.Connection, table: str, rows: int, dim: int, clusters: int, noise: float, seed: int, batch: int = 10000) -> np.ndarray:
+    """Crea la tabla de benchmark y la llena con COPY binario. Devuelve los centros usados."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, size=(clusters, dim)).astype(np.float32)
+
+    conn.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(table)))
+    conn.execute(sql.SQL("CREATE TABLE {} (id bigint PRIMARY KEY, embedding vector({}));").format(
+        sql.Identifier(table), sql.Literal(dim)
+    ))
+
+    with conn.cursor() as cur:
+        with cur.copy(sql.SQL("COPY {} (id, embedding) FROM STDIN WITH (FORMAT BINARY)").format(sql.Identifier(table))) as copy:
+            copy.set_types(["int8", "vector"])
+            for start in range(0, rows, batch):
+                chunk = _unit_rows(rng, centers, min(batch, rows - start), noise=noise)
+                for offset, vector in enumerate(chunk):
+                    copy.write_row((start + offset, vector))
+
+    conn.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(table)))
+    return centers
+
+
+def run_queries(conn: psycopg.Connection, table: str, queries: np.ndarray, k: int) -> tuple[list[set[int]], list[float]]:
+    ids, latencies = [], []
+    statement = sql.SQL(SEARCH_SQL).format(sql.Identifier(table))
+    with conn.cursor() as cur:
+        for query in queries:
+            start = time.perf_counter()
+            cur.execute(statement, (query, k))
+            found = {row[0] for row in cur.fetchall()}
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids.append(found)
+    return ids, latencies
+
+
+def _report(label: str, latencies: list[float], recall: float) -> None:
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label:<24} recall@k={recall:6.3f}   p50={p50:8.2f} ms   p99={p99:8.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark recall/latencia de índices ANN de pgvector")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=1.0, help="Dispersión alrededor de cada centro (más alto = más difícil)")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--lists", type=int, default=100)
+    parser.add_argument("--ef-search", default="20,40,80,160", help="Valores de hnsw.ef_search separados por coma")
+    parser.add_argument("--probes", default="1,5,10,20", help="Valores de ivfflat.probes separados por coma")
+    parser.add_argument("--table", default="knowledge_base_bench")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="No borrar la tabla de benchmark al terminar")
+    parser.add_argument("--dsn", default=None, help="Conexión (por defecto DB_CONNECTION_STRING)")
+    args = parser.parse_args(argv)
+
+    with psycopg.connect(args.dsn or settings.db_connection_string, autocommit=True) as conn:
+        conn.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        register_vector(conn)
+
+        print(f"📦 Cargando {args.rows} filas sintéticas de dimensión {args.dim} en {args.table}...")
+        start = time.perf_counter()
+        centers = load_synthetic_catalog(conn, args.table, args.rows, args.dim, args.clusters, args.noise, args.seed)
+        print(f"   carga: {time.perf_counter() - start:.1f} s")
+
+        rng = np.random.default_rng(args.seed + 1)
+        queries = _unit_rows(rng, centers, args.queries, noise=args.noise)
+
+        # Verdad de referencia: búsqueda exacta (todavía no existe índice ANN)
+        exact_ids, exact_latencies = run_queries(conn, args.table, queries, args.k)
+        _report("exacta (seq scan)", exact_latencies, 1.0)
+
+        start = time.perf_counter()
+        create_ann_index(
+            conn,
+            method=args.method,
+            table=args.table,
+            m=args.m,
+            ef_construction=args.ef_construction,
+            lists=args.lists,
+            concurrently=False,
+        )
+        print(f"🔧 Índice {args.method} construido en {time.perf_counter() - start:.1f} s")
+
+        if args.method == "hnsw":
+            parameter, values = "hnsw.ef_search", args.ef_search
+        else:
+            parameter, values = "ivfflat.probes", args.probes
+
+        for value in [int(v) for v in values.split(",") if v.strip()]:
+            conn.execute(sql.SQL("SET {} = {};").format(sql.SQL(parameter), sql.Literal(value)))
+            approx_ids, latencies = run_queries(conn, args.table, queries, args.k)
+            recall = float(np.mean([len(a & e) / args.k for a, e in zip(approx_ids, exact_ids)]))
+            _report(f"{parameter}={value}", latencies, recall)
+
+        if not args.keep:
+            conn.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(args.table)))
+
+
+if __name__ == "__main__":
+    main()
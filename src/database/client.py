@@ -1,31 +1,44 @@
-import psycopg
-from psycopg_pool import AsyncConnectionPool
 from contextlib import asynccontextmanager
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from src.config.settings import settings
+from src.database.pool import pool_manager
+from src.database.write_behind import WriteBehindCheckpointer
 
 @asynccontextmanager
 async def get_checkpointer():
     """
     Configura y entrega el checkpointer para LangGraph.
+    Usa el pool compartido (src/database/pool.py); su ciclo de vida lo maneja el pool_manager.
     """
-    conn_kwargs = {
-        "prepare_threshold": None,
-        "autocommit": True
-    }
+    pool = await pool_manager.get_pool()
 
-    # Creamos el pool de conexiones
-    async with AsyncConnectionPool(
-        conninfo=settings.db_connection_string,
-        kwargs=conn_kwargs,
-        min_size=1,
-        max_size=1
-    ) as pool:
-        # En versiones nuevas, simplemente instanciamos el objeto.
-        # El pool se encarga de la conexión.
-        checkpointer = AsyncPostgresSaver(pool)
-        
-        # Opcional: Esto asegura que las tablas existan
-        await checkpointer.setup()
-        
-        yield checkpointer
\ No newline at end of file
+    # En versiones nuevas, simplemente instanciamos el objeto.
+    # El pool se encarga de la conexión.
+    checkpointer = AsyncPostgresSaver(pool)  # type: ignore[arg-type]
+
+    # Opcional: Esto asegura que las tablas existan
+    await checkpointer.setup()
+
+    yield checkpointer
+
+@asynccontextmanager
+async def get_chat_checkpointer():
+    """
+    Checkpointer de las sesiones de /chat: AsyncPostgresSaver detrás de una cache caliente
+    local con escritura diferida por lotes (ver src/database/write_behind.py).
+    Al salir vacía la cola antes de que se cierre el pool.
+    """
+    async with get_checkpointer() as saver:
+        checkpointer = WriteBehindCheckpointer(
+            saver,
+            max_threads=settings.chat_session_max_sessions,
+            hot_ttl_seconds=settings.checkpoint_hot_ttl_seconds,
+            flush_interval_seconds=settings.checkpoint_flush_interval_seconds,
+            batch_size=settings.checkpoint_batch_size,
+            pool=pool_manager if settings.checkpoint_verify_hot else None
+        )
+        checkpointer.start()
+        try:
+            yield checkpointer
+        finally:
+            await checkpointer.stop()
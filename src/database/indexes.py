@@ -0,0 +1,219 @@
+"""
+Administración de columnas generadas e índices de knowledge_base.
+
+Uso:
+    python -m src.database.indexes hybrid     # columnas tsvector + índices GIN para búsqueda híbrida
+    python -m src.database.indexes ann --method hnsw --m 16 --ef-construction 64 [--rebuild]
+    python -m src.database.indexes ann --method ivfflat --lists 100 [--rebuild]
+    python -m src.database.indexes notify     # trigger LISTEN/NOTIFY para el espejo vectorial en memoria
+    python -m src.database.indexes filters    # price_value generado + índices para filtrar por categoría/precio
+    python -m src.database.indexes version    # contador de versión del catálogo mantenido por trigger
+"""
+import argparse
+from typing import Optional
+import psycopg
+from psycopg import sql
+from src.config.settings import settings
+
+# Métodos ANN de pgvector. vector_ip_ops corresponde al operador <#> que usa el query engine.
+ANN_METHODS = ("hnsw", "ivfflat")
+
+# Búsqueda léxica en español: tsvector generado (nombre con más peso que el contenido)
+# + trigramas sobre product_name para tolerar errores de tipeo.
+HYBRID_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    """
+    ALTER TABLE knowledge_base
+    ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(product_name, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(content, '')), 'B')
+    ) STORED;
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_search_tsv_idx ON knowledge_base USING gin (search_tsv);",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_product_name_trgm_idx ON knowledge_base USING gin (product_name gin_trgm_ops);",
+]
+
+
+# Filtros de metadatos que se empujan al WHERE de la búsqueda (src/rag/filters.py).
+# price_value se extrae del bloque 'PRECIO: $34.99' del contenido.
+FILTER_DDL = [
+    r"""
+    ALTER TABLE knowledge_base
+    ADD COLUMN IF NOT EXISTS price_value numeric
+    GENERATED ALWAYS AS (
+        substring(content from '(?i)(?:precio|valor|costo):\s*\$?\s*([0-9]+(?:\.[0-9]+)?)')::numeric
+    ) STORED;
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_category_idx ON knowledge_base (lower(category));",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS knowledge_base_price_value_idx ON knowledge_base (price_value);",
+]
+
+
+def ensure_filter_columns(conn: psycopg.Connection) -> None:
+    """Crea (idempotente) la columna price_value y los índices de categoría y precio."""
+    for statement in FILTER_DDL:
+        conn.execute(statement)  # type: ignore[arg-type]
+
+
+# Notifica cada insert/update/delete de knowledge_base al espejo vectorial (src/rag/vector_mirror.py)
+NOTIFY_TRIGGER_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION knowledge_base_notify_change() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify(
+            'knowledge_base_changes',
+            json_build_object('op', TG_OP, 'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END)::text
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS knowledge_base_notify_change ON knowledge_base;",
+    """
+    CREATE TRIGGER knowledge_base_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON knowledge_base
+    FOR EACH ROW EXECUTE FUNCTION knowledge_base_notify_change();
+    """,
+]
+
+
+def ensure_notify_trigger(conn: psycopg.Connection) -> None:
+    """Crea (idempotente) el trigger que publica los cambios de knowledge_base por NOTIFY."""
+    for statement in NOTIFY_TRIGGER_DDL:
+        conn.execute(statement)  # type: ignore[arg-type]
+
+
+# Versión del catálogo para invalidar caches (src/rag/semantic_cache.py): un contador que
+# incrementa un trigger por sentencia, en lugar de hashear knowledge_base completa.
+CATALOG_VERSION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS knowledge_base_version (
+        id int PRIMARY KEY CHECK (id = 1),
+        version bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+    """,
+    "INSERT INTO knowledge_base_version (id) VALUES (1) ON CONFLICT (id) DO NOTHING;",
+    """
+    CREATE OR REPLACE FUNCTION knowledge_base_bump_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE knowledge_base_version SET version = version + 1, updated_at = now() WHERE id = 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS knowledge_base_bump_version ON knowledge_base;",
+    """
+    CREATE TRIGGER knowledge_base_bump_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON knowledge_base
+    FOR EACH STATEMENT EXECUTE FUNCTION knowledge_base_bump_version();
+    """,
+]
+
+
+def ensure_catalog_version(conn: psycopg.Connection) -> None:
+    """Crea (idempotente) la tabla knowledge_base_version y su trigger por sentencia."""
+    for statement in CATALOG_VERSION_DDL:
+        conn.execute(statement)  # type: ignore[arg-type]
+
+
+def ensure_hybrid_search(conn: psycopg.Connection) -> None:
+    """Crea (idempotente) la columna tsvector y los índices GIN de la búsqueda híbrida."""
+    for statement in HYBRID_SEARCH_DDL:
+        conn.execute(statement)  # type: ignore[arg-type]
+
+
+def ann_index_name(method: str, table: str = "knowledge_base") -> str:
+    return f"{table}_embedding_{method}_idx"
+
+
+def create_ann_index(
+    conn: psycopg.Connection,
+    method: str = "hnsw",
+    table: str = "knowledge_base",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = 100,
+    rebuild: bool = False,
+    concurrently: bool = True,
+    maintenance_work_mem: Optional[str] = None,
+) -> str:
+    """
+    Crea el índice ANN sobre `embedding`. Con rebuild=True borra primero los índices
+    ANN existentes (de cualquier método) para reconstruirlo con los nuevos parámetros.
+    """
+    method = method.lower()
+    if method not in ANN_METHODS:
+        raise ValueError(f"Método ANN desconocido '{method}'. Opciones: {', '.join(ANN_METHODS)}")
+
+    concurrent = sql.SQL("CONCURRENTLY ") if concurrently else sql.SQL("")
+
+    if rebuild:
+        # Incluye el nombre automático del índice creado a mano con el schema.sql original
+        names = [ann_index_name(existing, table) for existing in ANN_METHODS] + [f"{table}_embedding_idx"]
+        for existing in names:
+            conn.execute(sql.SQL("DROP INDEX {}IF EXISTS {};").format(concurrent, sql.Identifier(existing)))
+
+    if maintenance_work_mem:
+        conn.execute(sql.SQL("SET maintenance_work_mem = {};").format(sql.Literal(maintenance_work_mem)))
+
+    if method == "hnsw":
+        options = sql.SQL("m = {}, ef_construction = {}").format(sql.Literal(int(m)), sql.Literal(int(ef_construction)))
+    else:
+        options = sql.SQL("lists = {}").format(sql.Literal(int(lists)))
+
+    name = ann_index_name(method, table)
+    conn.execute(sql.SQL(
+        "CREATE INDEX {}IF NOT EXISTS {} ON {} USING {} (embedding vector_ip_ops) WITH ({});"
+    ).format(concurrent, sql.Identifier(name), sql.Identifier(table), sql.SQL(method), options))
+    return name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índices de knowledge_base")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("hybrid", help="Columna tsvector generada e índices GIN (tsvector + trigramas)")
+
+    ann = subparsers.add_parser("ann", help="Índice ANN (HNSW o IVFFlat) sobre knowledge_base.embedding")
+    ann.add_argument("--method", choices=ANN_METHODS, default="hnsw")
+    ann.add_argument("--m", type=int, default=16, help="HNSW: conexiones por nodo")
+    ann.add_argument("--ef-construction", type=int, default=64, help="HNSW: tamaño de la lista de candidatos al construir")
+    ann.add_argument("--lists", type=int, default=100, help="IVFFlat: número de listas (≈ filas/1000 hasta 1M filas)")
+    ann.add_argument("--rebuild", action="store_true", help="Borra los índices ANN existentes antes de crear")
+    ann.add_argument("--maintenance-work-mem", default=None, help="Ej. '1GB' para acelerar la construcción")
+
+    subparsers.add_parser("notify", help="Trigger LISTEN/NOTIFY para el espejo vectorial en memoria")
+    subparsers.add_parser("filters", help="Columna price_value generada e índices de categoría/precio")
+    subparsers.add_parser("version", help="Contador de versión del catálogo mantenido por trigger")
+    args = parser.parse_args(argv)
+
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    with psycopg.connect(settings.db_connection_string, autocommit=True) as conn:
+        if args.command == "hybrid":
+            ensure_hybrid_search(conn)
+            print("✅ Búsqueda híbrida lista: search_tsv + índices GIN creados.")
+        elif args.command == "ann":
+            name = create_ann_index(
+                conn,
+                method=args.method,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                lists=args.lists,
+                rebuild=args.rebuild,
+                maintenance_work_mem=args.maintenance_work_mem,
+            )
+            print(f"✅ Índice ANN listo: {name}")
+        elif args.command == "notify":
+            ensure_notify_trigger(conn)
+            print("✅ Trigger knowledge_base_notify_change creado.")
+        elif args.command == "filters":
+            ensure_filter_columns(conn)
+            print("✅ Filtros listos: price_value + índices de categoría y precio.")
+        elif args.command == "version":
+            ensure_catalog_version(conn)
+            print("✅ Versión del catálogo lista: knowledge_base_version + trigger.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from src.config.settings import settings
+from src.config.metrics import POOL_WAIT_SECONDS
+
+
+async def configure_connection(conn):
+    """
+    Se ejecuta una sola vez por conexión física (no en cada checkout):
+    registra el tipo `vector` y aplica los ajustes de sesión del índice ANN.
+    """
+    try:
+        from pgvector.psycopg import register_vector_async  # type: ignore
+        await register_vector_async(conn)
+    except Exception as e:
+        print(f"No se pudo registrar el tipo vector en la conexión: {e}")
+
+    if settings.hnsw_ef_search:
+        await conn.execute(f"SET hnsw.ef_search = {int(settings.hnsw_ef_search)};")
+    if settings.ivfflat_probes:
+        await conn.execute(f"SET ivfflat.probes = {int(settings.ivfflat_probes)};")
+
+
+class PoolManager:
+    """
+    Pool único de Postgres compartido por el RAG y el checkpointer de LangGraph.
+    Mide el tiempo de espera y la cantidad de checkouts hechos a través de `connection()`.
+    """
+
+    def __init__(self):
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._lock = asyncio.Lock()
+        self.checkouts = 0
+        self.errors = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    async def get_pool(self) -> AsyncConnectionPool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    pool = AsyncConnectionPool(
+                        conninfo=settings.db_connection_string,
+                        min_size=settings.db_pool_min_size,
+                        max_size=settings.db_pool_max_size,
+                        timeout=settings.db_pool_timeout_seconds,
+                        max_waiting=settings.db_pool_max_waiting,
+                        # autocommit + dict_row: lo que necesita AsyncPostgresSaver y sirve igual para lecturas RAG.
+                        # Sin prepared statements si hay un pooler en modo transacción delante (DB_PREPARED_STATEMENTS=false).
+                        kwargs={
+                            "autocommit": True,
+                            "row_factory": dict_row,
+                            "prepare_threshold": 5 if settings.db_prepared_statements else None,
+                        },
+                        configure=configure_connection,
+                        name="gespro",
+                        open=False
+                    )
+                    await pool.open()
+                    self._pool = pool
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self.get_pool()
+        start = time.perf_counter()
+        try:
+            async with pool.connection() as conn:
+                waited = (time.perf_counter() - start) * 1000
+                self.checkouts += 1
+                self.wait_ms_total += waited
+                self.wait_ms_max = max(self.wait_ms_max, waited)
+                POOL_WAIT_SECONDS.observe(waited / 1000)
+                yield conn
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def stats(self) -> dict:
+        data = {
+            "checkouts": self.checkouts,
+            "errors": self.errors,
+            "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+        }
+        if self._pool is not None:
+            # Estadísticas propias de psycopg_pool (incluye los checkouts del checkpointer)
+            data["pool"] = self._pool.get_stats()
+        return data
+
+
+pool_manager = PoolManager()
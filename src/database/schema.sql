@@ -23,8 +23,57 @@ create table if not exists event_store (
     created_at timestamp with time zone default timezone('utc'::text, now())
 );
 
+-- Cache persistente de embeddings de consultas (segundo nivel, compartido entre workers)
+-- También se crea automáticamente si EMBEDDING_CACHE_PERSISTENT=true.
+create table if not exists embedding_cache (
+    cache_key text primary key, -- sha256(modelo + consulta normalizada)
+    model text not null,
+    query text not null,
+    embedding real[] not null,
+    created_at timestamp with time zone default now()
+);
+
+-- Cache persistente de respuestas generadas (segundo nivel, GENERATION_CACHE_PERSISTENT=true)
+create table if not exists generation_cache (
+    cache_key text primary key, -- sha256(versión del prompt + consulta normalizada + hash del contexto)
+    prompt_version text not null,
+    query text not null,
+    answer text not null,
+    created_at timestamp with time zone default now()
+);
+
 -- OPTIMIZACIÓN ULTRA-BAJA LATENCIA RAG (Producto Interno / HNSW)
 -- Ejecutar en Supabase SQL Editor para crear el índice.
 -- Asegúrate de que la columna embedding tenga la dimensión correcta (ej: 1536 para OpenAI text-embedding-3-small)
- CREATE INDEX ON knowledge_base USING hnsw (embedding vector_ip_ops);
+-- Para crear/reconstruir con otros parámetros (HNSW o IVFFlat): python -m src.database.indexes ann --help
+-- En consulta se ajusta con HNSW_EF_SEARCH / IVFFLAT_PROBES.
+create index if not exists knowledge_base_embedding_hnsw_idx on knowledge_base using hnsw (embedding vector_ip_ops) with (m = 16, ef_construction = 64);
+
+-- BÚSQUEDA HÍBRIDA (léxica en español + trigramas + pgvector, fusionadas con RRF)
+-- Se aplica con: python -m src.database.indexes hybrid
+-- create extension if not exists pg_trgm;
+-- alter table knowledge_base add column if not exists search_tsv tsvector generated always as (
+--     setweight(to_tsvector('spanish', coalesce(product_name, '')), 'A') ||
+--     setweight(to_tsvector('spanish', coalesce(content, '')), 'B')
+-- ) stored;
+-- create index if not exists knowledge_base_search_tsv_idx on knowledge_base using gin (search_tsv);
+-- create index if not exists knowledge_base_product_name_trgm_idx on knowledge_base using gin (product_name gin_trgm_ops);
+
+-- ESPEJO VECTORIAL EN MEMORIA (RETRIEVAL_BACKEND=mirror)
+-- Trigger que publica cada cambio de knowledge_base en el canal 'knowledge_base_changes'.
+-- Se aplica con: python -m src.database.indexes notify
+
+-- FILTROS DE METADATOS (categoría / rango de precio) empujados al WHERE de la búsqueda
+-- Se aplica con: python -m src.database.indexes filters
+-- alter table knowledge_base add column if not exists price_value numeric generated always as (
+--     substring(content from '(?i)(?:precio|valor|costo):\s*\$?\s*([0-9]+(?:\.[0-9]+)?)')::numeric
+-- ) stored;
+-- create index if not exists knowledge_base_category_idx on knowledge_base (lower(category));
+-- create index if not exists knowledge_base_price_value_idx on knowledge_base (price_value);
 
+-- VERSIÓN DEL CATÁLOGO (invalida la cache semántica y el índice de productos)
+-- Contador incrementado por un trigger por sentencia; se lee con una sola fila.
+-- Se aplica con: python -m src.database.indexes version
+-- create table if not exists knowledge_base_version (id int primary key check (id = 1), version bigint not null default 0, updated_at timestamptz not null default now());
+-- create trigger knowledge_base_bump_version after insert or update or delete or truncate on knowledge_base
+--     for each statement execute function knowledge_base_bump_version();
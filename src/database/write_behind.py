@@ -0,0 +1,270 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from src.config.metrics import stage_timer
+
+# Último checkpoint de un hilo en Postgres (PK thread_id, checkpoint_ns, checkpoint_id; ids uuid6
+# ordenables). Sólo lee el id: verifica la copia caliente sin traer blobs ni writes.
+LATEST_CHECKPOINT_SQL = """
+    SELECT checkpoint_id FROM checkpoints
+    WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(checkpoint_ns)s
+    ORDER BY checkpoint_id DESC
+    LIMIT 1;
+"""
+
+
+class _PendingCheckpoint:
+    """
+    Último checkpoint de un hilo todavía no escrito en Postgres (+ sus writes).
+    `config` es el del primer checkpoint coalescido: su checkpoint_id es el último que sí
+    se escribió, así el que se guarda nunca apunta a un padre descartado.
+    """
+
+    __slots__ = ("config", "checkpoint", "metadata", "new_versions", "writes")
+
+    def __init__(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions):
+        self.config = config
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.new_versions = dict(new_versions)
+        self.writes: list[tuple[RunnableConfig, Sequence[tuple[str, Any]], str, str]] = []
+
+
+class WriteBehindCheckpointer(BaseCheckpointSaver):
+    """
+    Checkpointer de LangGraph con cache caliente en memoria y escritura diferida.
+
+    - Lecturas: el último checkpoint de cada hilo se sirve desde un LRU local. Con `pool`,
+      cada lectura compara su checkpoint_id con el último de Postgres (una fila por PK) y
+      recarga si otro worker escribió el hilo; sin `pool` la copia vale `hot_ttl_seconds`.
+    - Escrituras: `aput` responde de inmediato; un task de fondo vuelca a Postgres por lotes.
+      Varios turnos del mismo hilo entre dos vaciados se coalescen en una sola escritura
+      (el último checkpoint con la unión de canales modificados, colgado del último padre
+      escrito).
+
+    Mientras un hilo tiene escrituras pendientes, la copia local es más nueva que Postgres y
+    no se verifica: dos workers que atienden el mismo hilo dentro de `flush_interval_seconds`
+    necesitan sticky routing por session_id delante.
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        max_threads: int = 10000,
+        hot_ttl_seconds: float = 300,
+        flush_interval_seconds: float = 0.5,
+        batch_size: int = 100,
+        pool=None,
+    ):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.pool = pool  # pool_manager (o equivalente con connection()) para verificar la cache
+        self.max_threads = max_threads
+        self.hot_ttl_seconds = hot_ttl_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.batch_size = batch_size
+        # thread_id -> (momento de carga, último checkpoint)
+        self._hot: "OrderedDict[str, tuple[float, CheckpointTuple]]" = OrderedDict()
+        self._pending: "OrderedDict[str, _PendingCheckpoint]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.flushed = 0
+        self.coalesced = 0
+        self.flush_errors = 0
+
+    def get_next_version(self, current, channel=None):
+        return self.saver.get_next_version(current, channel)
+
+    # --- Cache caliente ---
+    def _remember(self, thread_id: str, checkpoint_tuple: CheckpointTuple) -> None:
+        self._hot[thread_id] = (time.monotonic(), checkpoint_tuple)
+        self._hot.move_to_end(thread_id)
+        while len(self._hot) > self.max_threads:
+            # No se desaloja lo que todavía no llegó a Postgres
+            victim = next((t for t in self._hot if t not in self._pending), None)
+            if victim is None:
+                break
+            del self._hot[victim]
+
+    async def _latest_checkpoint_id(self, thread_id: str, checkpoint_ns: str) -> Optional[str]:
+        with stage_timer("checkpoint_verify"):
+            async with self.pool.connection() as conn:
+                cur = await conn.execute(LATEST_CHECKPOINT_SQL, {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns})
+                row = await cur.fetchone()
+        return row["checkpoint_id"] if row else None
+
+    async def _is_current(self, thread_id: str, config: RunnableConfig, loaded_at: float, cached_id: str) -> bool:
+        """Si la copia caliente sigue siendo el último checkpoint del hilo."""
+        if thread_id in self._pending:
+            return True
+        if self.pool is None:
+            return time.monotonic() - loaded_at < self.hot_ttl_seconds
+        latest = await self._latest_checkpoint_id(thread_id, config["configurable"].get("checkpoint_ns", ""))
+        if latest != cached_id:
+            # Otro worker escribió el hilo: seguir desde la copia local lo bifurcaría
+            self.stale += 1
+            return False
+        return True
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_id = get_checkpoint_id(config)
+        entry = self._hot.get(thread_id)
+        if entry is not None:
+            loaded_at, checkpoint_tuple = entry
+            cached_id = checkpoint_tuple.checkpoint["id"]
+            # Un checkpoint pedido por id no cambia; el "último" se verifica contra Postgres
+            if checkpoint_id == cached_id or (checkpoint_id is None and await self._is_current(thread_id, config, loaded_at, cached_id)):
+                self._hot.move_to_end(thread_id)
+                self.hits += 1
+                return checkpoint_tuple
+
+        self.misses += 1
+        # Un checkpoint específico puede seguir en la cola: se escribe antes de leerlo
+        if thread_id in self._pending:
+            await self.flush([thread_id])
+        with stage_timer("checkpoint_load"):
+            checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is not None and checkpoint_id is None:
+            self._remember(thread_id, checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        await self.flush()
+        async for item in self.saver.alist(config, **kwargs):
+            yield item
+
+    # --- Escritura diferida ---
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        next_config: RunnableConfig = {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+        pending = self._pending.get(thread_id)
+        if pending is None:
+            self._pending[thread_id] = _PendingCheckpoint(config, checkpoint, metadata, new_versions)
+        else:
+            # Coalescencia: sólo importa el último checkpoint, pero con todos los canales que
+            # cambiaron desde la última escritura (sus valores actuales están en el checkpoint nuevo)
+            changed = set(pending.new_versions) | set(new_versions)
+            pending.new_versions = {k: checkpoint["channel_versions"][k] for k in changed if k in checkpoint["channel_versions"]}
+            # pending.config se conserva: el padre es el último checkpoint escrito, no el
+            # intermedio que se descarta
+            pending.checkpoint, pending.metadata = checkpoint, metadata
+            pending.writes = []  # los writes de checkpoints intermedios ya no se necesitan
+            self.coalesced += 1
+
+        parent_id = self._pending[thread_id].config["configurable"].get("checkpoint_id")
+        parent_config: Optional[RunnableConfig] = (
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+            if parent_id else None
+        )
+        self._remember(thread_id, CheckpointTuple(next_config, checkpoint, metadata, parent_config, []))
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return next_config
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        pending = self._pending.get(thread_id)
+        if pending is not None and pending.checkpoint["id"] == config["configurable"].get("checkpoint_id"):
+            pending.writes.append((config, writes, task_id, task_path))
+        else:
+            # Writes de un checkpoint que ya está en Postgres
+            await self.saver.aput_writes(config, writes, task_id, task_path)
+
+        entry = self._hot.get(thread_id)
+        if entry is not None and entry[1].checkpoint["id"] == config["configurable"].get("checkpoint_id"):
+            entry[1].pending_writes.extend((task_id, channel, value) for channel, value in writes)  # type: ignore[union-attr]
+
+    async def flush(self, thread_ids: Optional[list[str]] = None) -> int:
+        """Escribe en Postgres los checkpoints pendientes (todos o los de `thread_ids`)."""
+        async with self._flush_lock:
+            with stage_timer("checkpoint_flush"):
+                return await self._flush(thread_ids)
+
+    async def _flush(self, thread_ids: Optional[list[str]]) -> int:
+        keys = list(self._pending) if thread_ids is None else [t for t in thread_ids if t in self._pending]
+        written = 0
+        for start in range(0, len(keys), self.batch_size):
+            batch = [(key, self._pending.pop(key)) for key in keys[start:start + self.batch_size] if key in self._pending]
+            for thread_id, pending in batch:
+                try:
+                    await self.saver.aput(pending.config, pending.checkpoint, pending.metadata, pending.new_versions)
+                    for config, writes, task_id, task_path in pending.writes:
+                        await self.saver.aput_writes(config, writes, task_id, task_path)
+                    written += 1
+                except Exception as e:
+                    self.flush_errors += 1
+                    print(f"Error escribiendo checkpoint de {thread_id}, se reintenta en el próximo vaciado: {e}")
+                    newer = self._pending.get(thread_id)
+                    if newer is None:
+                        self._pending[thread_id] = pending
+                    else:
+                        # El más nuevo ya trae los valores actuales; sólo le faltan los canales de
+                        # este, y su padre pasa a ser el de este (que no llegó a escribirse)
+                        versions = newer.checkpoint["channel_versions"]
+                        newer.new_versions.update({k: versions[k] for k in pending.new_versions if k in versions})
+                        newer.config = pending.config
+        self.flushed += written
+        return written
+
+    async def _flush_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self.flush()
+
+    def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        # Lo que quede en la cola se escribe antes de cerrar el pool
+        await self.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hot_threads": len(self._hot),
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "flushed": self.flushed,
+            "coalesced": self.coalesced,
+            "flush_errors": self.flush_errors,
+        }
@@ -0,0 +1,124 @@
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+# Tabla del segundo nivel (compartida entre workers y persistente entre reinicios).
+# Se guarda como real[] para no depender del registro del tipo `vector` en la conexión.
+CREATE_EMBEDDING_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS embedding_cache (
+        cache_key text PRIMARY KEY,
+        model text NOT NULL,
+        query text NOT NULL,
+        embedding real[] NOT NULL,
+        created_at timestamp with time zone DEFAULT now()
+    );
+"""
+
+
+def normalize_query(text: str) -> str:
+    """Normaliza la consulta para que variantes triviales compartan la misma entrada de cache."""
+    text = text.lower().strip()
+    text = re.sub(r"[¿?¡!.,;:]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class EmbeddingCache:
+    """
+    Cache LRU con expiración (TTL) para embeddings de consultas.
+    La clave es el texto normalizado + el nombre del modelo.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl_seconds: float = 3600):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, list[float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.pg_hits = 0
+        self._pg_ready = False
+
+    @staticmethod
+    def make_key(query: str, model: str) -> str:
+        return f"{model}::{normalize_query(query)}"
+
+    def get(self, key: str) -> Optional[list[float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, embedding = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return embedding
+
+    def put(self, key: str, embedding: list[float]) -> None:
+        self._entries[key] = (time.monotonic(), embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pg_hits": self.pg_hits,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # --- Segundo nivel en Postgres ---
+    @staticmethod
+    def _pg_key(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    async def _ensure_table(self, pool) -> None:
+        if self._pg_ready:
+            return
+        async with pool.connection() as conn:
+            await conn.execute(CREATE_EMBEDDING_CACHE_SQL)
+        self._pg_ready = True
+
+    async def pg_get(self, pool, key: str) -> Optional[list[float]]:
+        """Busca el embedding en Postgres y, si existe, lo promueve al nivel en memoria."""
+        await self._ensure_table(pool)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT embedding FROM embedding_cache WHERE cache_key = %s;",
+                    (self._pg_key(key),)
+                )
+                row = await cur.fetchone()
+
+        if not row:
+            return None
+
+        embedding = row["embedding"] if isinstance(row, dict) else row[0]
+        embedding = [float(x) for x in embedding]
+        self.pg_hits += 1
+        self.put(key, embedding)
+        return embedding
+
+    async def pg_put(self, pool, key: str, model: str, query: str, embedding: list[float]) -> None:
+        await self._ensure_table(pool)
+        async with pool.connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO embedding_cache (cache_key, model, query, embedding)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO NOTHING;
+                """,
+                (self._pg_key(key), model, normalize_query(query), embedding)
+            )
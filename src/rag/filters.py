@@ -0,0 +1,79 @@
+import re
+from typing import TypedDict, Optional
+
+
+class SearchFilters(TypedDict, total=False):
+    category: str
+    min_price: float
+    max_price: float
+
+
+PRICE_RE = re.compile(r"(?:PRECIO|VALOR|COSTO):\s*\$?\s*([0-9]+(?:\.[0-9]+)?)", re.IGNORECASE)
+
+# Fila de producto: bloque 'PRODUCTO: ...' del catálogo. Las demás (envíos, cambios, políticas)
+# no tienen precio y no deben caer por un filtro de precio.
+PRODUCT_BLOCK_RE = re.compile(r"PRODUCTO:", re.IGNORECASE)
+
+
+def price_from_content(text: str) -> Optional[float]:
+    """Precio numérico del bloque de catálogo (misma regla que la columna generada price_value)."""
+    match = PRICE_RE.search(text or "")
+    return float(match.group(1)) if match else None
+
+
+def is_product_content(text: str) -> bool:
+    """Misma regla que el SQL de sql_filter_clause: el contenido tiene 'PRODUCTO:'."""
+    return bool(PRODUCT_BLOCK_RE.search(text or ""))
+
+
+def sql_filter_clause(filters: Optional[SearchFilters], alias: str = "") -> tuple[str, dict]:
+    """
+    Condiciones para el WHERE (sin la palabra WHERE) y sus parámetros.
+    Usa lower(category) y price_value, ambos indexados (python -m src.database.indexes filters).
+    """
+    if not filters:
+        return "", {}
+
+    prefix = f"{alias}." if alias else ""
+    conditions, params = [], {}
+    if filters.get("category"):
+        conditions.append(f"lower({prefix}category) = %(filter_category)s")
+        params["filter_category"] = filters["category"].lower()
+    price_conditions = []
+    if filters.get("min_price") is not None:
+        price_conditions.append(f"{prefix}price_value >= %(filter_min_price)s")
+        params["filter_min_price"] = filters["min_price"]
+    if filters.get("max_price") is not None:
+        price_conditions.append(f"{prefix}price_value <= %(filter_max_price)s")
+        params["filter_max_price"] = filters["max_price"]
+    if price_conditions:
+        # El rango de precio sólo descarta productos; las filas que no son producto pasan
+        conditions.append(
+            f"({' AND '.join(price_conditions)} OR strpos(upper({prefix}content), 'PRODUCTO:') = 0)"
+        )
+    return " AND ".join(conditions), params
+
+
+def row_matches(row: dict, filters: Optional[SearchFilters]) -> bool:
+    """Mismo filtro que sql_filter_clause, para el espejo vectorial en memoria."""
+    if not filters:
+        return True
+    if filters.get("category") and (row.get("category") or "").lower() != filters["category"].lower():
+        return False
+    if filters.get("min_price") is None and filters.get("max_price") is None:
+        return True
+    if not is_product_content(row.get("content", "")):
+        return True
+    price = row.get("price_value")
+    if filters.get("min_price") is not None and (price is None or price < filters["min_price"]):
+        return False
+    if filters.get("max_price") is not None and (price is None or price > filters["max_price"]):
+        return False
+    return True
+
+
+def filters_scope(filters: Optional[SearchFilters]) -> str:
+    """Parte de la clave de cache semántica: la misma consulta con otro filtro es otra respuesta."""
+    if not filters:
+        return ""
+    return "|".join(f"{key}={filters[key]}" for key in sorted(filters))  # type: ignore[literal-required]
@@ -0,0 +1,125 @@
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+from src.rag.embedding_cache import normalize_query
+
+# Segundo nivel opcional: respuestas compartidas entre workers y entre reinicios
+CREATE_GENERATION_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS generation_cache (
+        cache_key text PRIMARY KEY,
+        prompt_version text NOT NULL,
+        query text NOT NULL,
+        answer text NOT NULL,
+        created_at timestamp with time zone DEFAULT now()
+    );
+"""
+
+
+def prompt_version(system_prompt: str, model: str = "") -> str:
+    """Versión corta del prompt + modelo: cualquier cambio en el prompt invalida las respuestas guardadas."""
+    digest = hashlib.sha256(f"{model}\n{system_prompt}".encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+class GenerationCache:
+    """
+    Cache LRU con TTL de respuestas generadas por el LLM (temperature=0).
+    La clave combina la consulta normalizada, el hash del contexto recuperado y la versión del prompt,
+    así que un cambio en el catálogo o en el prompt produce claves nuevas sin invalidar nada a mano.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: float = 86400):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.pg_hits = 0
+        self.skipped = 0  # turnos no cacheables (la respuesta depende del historial)
+        self._pg_ready = False
+
+    @staticmethod
+    def make_key(query: str, context: str, version: str, first_turn: bool = False) -> str:
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        raw = f"{version}|{int(first_turn)}|{normalize_query(query)}|{context_hash}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, answer = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return answer
+
+    def put(self, key: str, answer: str) -> None:
+        self._entries[key] = (time.monotonic(), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "pg_hits": self.pg_hits,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    # --- Segundo nivel en Postgres ---
+    async def _ensure_table(self, pool) -> None:
+        if self._pg_ready:
+            return
+        async with pool.connection() as conn:
+            await conn.execute(CREATE_GENERATION_CACHE_SQL)
+        self._pg_ready = True
+
+    async def pg_get(self, pool, key: str) -> Optional[str]:
+        """Busca la respuesta en Postgres y, si existe, la promueve al nivel en memoria."""
+        await self._ensure_table(pool)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT answer FROM generation_cache
+                    WHERE cache_key = %s AND created_at > now() - make_interval(secs => %s);
+                    """,
+                    (key, self.ttl_seconds or 10 ** 9)
+                )
+                row = await cur.fetchone()
+
+        if not row:
+            return None
+
+        answer = row["answer"] if isinstance(row, dict) else row[0]
+        self.pg_hits += 1
+        self.put(key, answer)
+        return answer
+
+    async def pg_put(self, pool, key: str, version: str, query: str, answer: str) -> None:
+        await self._ensure_table(pool)
+        async with pool.connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO generation_cache (cache_key, prompt_version, query, answer)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO UPDATE SET answer = EXCLUDED.answer, created_at = now();
+                """,
+                (key, version, normalize_query(query), answer)
+            )
@@ -0,0 +1,248 @@
+import re
+import unicodedata
+from typing import TypedDict, Optional, Iterable
+
+# Campos del bloque de catálogo (ver data/catalogo.txt) -> nombre del campo tipado
+FIELD_LABELS = {
+    "PRODUCTO": "name",
+    "CATEGORÍA": "category",
+    "CATEGORIA": "category",
+    "TELA": "fabric",
+    "COLOR": "color",
+    "PRECIO": "price",
+    "TALLAS": "sizes",
+    "DESCRIPCIÓN": "description",
+    "DESCRIPCION": "description",
+}
+
+FIELD_RE = re.compile(r"^\s*([A-ZÁÉÍÓÚÑ]+)\s*:\s*(.+?)\s*$", re.MULTILINE)
+
+# Intenciones de atributo que se pueden responder sin LLM ni base de datos
+ATTRIBUTE_PATTERNS = {
+    # "vale" suelto es asentimiento ("vale, gracias"); sólo cuenta en "cuánto vale"
+    "price": re.compile(r"\b(precio|cu[aá]nto\s+(?:cuesta|vale|sale)|valor|costo|cuesta)\b"),
+    "sizes": re.compile(r"\b(tallas?|talles?|medidas?)\b"),
+    "color": re.compile(r"\b(colou?r|colores)\b"),
+    "fabric": re.compile(r"\b(tela|material|tejido)\b"),
+}
+
+# Valores de atributo que una consulta puede nombrar ("algo en blanco", "de seda"), además de
+# los que aparecen en el catálogo. Sin acentos, como los deja _fold.
+ATTRIBUTE_VALUE_WORDS = {
+    "color": {
+        "blanco", "blanca", "negro", "negra", "rojo", "roja", "rosa", "rosado", "rosada", "azul",
+        "celeste", "verde", "gris", "beige", "nude", "crema", "marfil", "champagne", "dorado",
+        "dorada", "plateado", "plateada", "lila", "morado", "morada", "vino", "fucsia", "coral",
+        "amarillo", "amarilla", "naranja", "cafe", "marron",
+    },
+    "fabric": {
+        "seda", "saten", "satin", "algodon", "encaje", "tul", "modal", "lino", "gasa", "terciopelo",
+        "microfibra", "franela", "nylon", "licra", "lycra", "chiffon",
+    },
+}
+
+SIZE_MENTION_RE = re.compile(r"\btallas?\s+(x{0,3}s|m|x{0,3}l|\d{1,2}|unica)\b")
+
+STOPWORDS = {"de", "del", "la", "el", "los", "las", "y", "en", "con", "para", "un", "una"}
+
+
+class ProductRecord(TypedDict, total=False):
+    name: str
+    category: str
+    fabric: str
+    color: str
+    price: str
+    sizes: list[str]
+    description: str
+    content: str
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin acentos, para comparar nombres de producto."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _tokens(text: str) -> list[str]:
+    return [t for t in re.findall(r"[a-z0-9ñ]+", _fold(text)) if t not in STOPWORDS]
+
+
+def _trigrams(token: str) -> set[str]:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _token_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    # Plurales y abreviaturas ("batas" / "bata")
+    if min(len(a), len(b)) >= 4 and (a.startswith(b) or b.startswith(a)):
+        return 0.9
+    ta, tb = _trigrams(a), _trigrams(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def parse_product_block(block: str) -> Optional[ProductRecord]:
+    """Convierte un bloque 'PRODUCTO: ... / PRECIO: ...' en un registro tipado."""
+    record: ProductRecord = {"content": block.strip()}
+    for label, value in FIELD_RE.findall(block):
+        field = FIELD_LABELS.get(label.upper())
+        if not field or field in record:
+            continue
+        if field == "sizes":
+            record["sizes"] = [s.strip() for s in re.split(r"[,/]| y ", value) if s.strip()]
+        else:
+            record[field] = value  # type: ignore[literal-required]
+    return record if record.get("name") else None
+
+
+def _join_es(items: list[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " y " + items[-1]
+
+
+class ProductIndex:
+    """
+    Índice en memoria de los productos del catálogo con búsqueda difusa por nombre.
+    Usa un índice invertido de trigramas para obtener candidatos y puntúa por
+    cobertura de los tokens del nombre del producto.
+    """
+
+    def __init__(self, min_score: float = 0.5):
+        self.min_score = min_score
+        self.version: Optional[str] = None
+        self.products: list[ProductRecord] = []
+        self._name_tokens: list[list[str]] = []
+        self._by_name: dict[str, int] = {}
+        self._trigram_index: dict[str, set[int]] = {}
+        self._value_words: dict[str, set[str]] = {attr: set(words) for attr, words in ATTRIBUTE_VALUE_WORDS.items()}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def build(self, records: Iterable[ProductRecord], version: Optional[str] = None) -> None:
+        products: list[ProductRecord] = []
+        name_tokens: list[list[str]] = []
+        by_name: dict[str, int] = {}
+        trigram_index: dict[str, set[int]] = {}
+        value_words: dict[str, set[str]] = {attr: set(words) for attr, words in ATTRIBUTE_VALUE_WORDS.items()}
+
+        for record in records:
+            idx = len(products)
+            products.append(record)
+            tokens = _tokens(record["name"])
+            name_tokens.append(tokens)
+            by_name[_fold(record["name"]).strip()] = idx
+            for token in tokens:
+                for gram in _trigrams(token):
+                    trigram_index.setdefault(gram, set()).add(idx)
+            for attr, words in value_words.items():
+                words.update(_tokens(record.get(attr, "")))  # type: ignore[arg-type]
+
+        # Reemplazo atómico para lectores concurrentes
+        self.products, self._name_tokens, self._by_name, self._trigram_index = products, name_tokens, by_name, trigram_index
+        self._value_words = value_words
+        self.version = version
+
+    def build_from_text(self, raw_text: str, version: Optional[str] = None) -> None:
+        records = [parse_product_block(block) for block in raw_text.split("---")]
+        self.build([r for r in records if r], version=version)
+
+    def match(self, text: str) -> Optional[ProductRecord]:
+        """Devuelve el producto nombrado en `text`, o None si no hay uno claro."""
+        exact = self._by_name.get(_fold(text).strip())
+        if exact is not None:
+            return self.products[exact]
+
+        query_tokens = _tokens(text)
+        candidates: set[int] = set()
+        for token in query_tokens:
+            for gram in _trigrams(token):
+                candidates |= self._trigram_index.get(gram, set())
+
+        scored = []
+        for idx in candidates:
+            name_tokens = self._name_tokens[idx]
+            if not name_tokens:
+                continue
+            covered = sum(
+                max((_token_similarity(nt, qt) for qt in query_tokens), default=0.0) >= 0.75
+                for nt in name_tokens
+            )
+            scored.append((covered / len(name_tokens), idx))
+
+        if not scored:
+            return None
+
+        scored.sort(reverse=True)
+        best_score, best_idx = scored[0]
+        if best_score < self.min_score:
+            return None
+        # Ambigüedad: dos productos igual de probables -> que decida el flujo completo
+        if len(scored) > 1 and scored[1][0] == best_score:
+            return None
+        return self.products[best_idx]
+
+    def _names_other_value(self, query: str, product: ProductRecord) -> bool:
+        """True si la consulta nombra un color, tela o talla que no es el del producto."""
+        query_tokens = set(_tokens(query))
+        for attr, words in self._value_words.items():
+            named = query_tokens & words
+            if named and not named <= set(_tokens(product.get(attr, ""))):  # type: ignore[arg-type]
+                return True
+        sizes = {_fold(size) for size in product.get("sizes", [])}
+        return any(size not in sizes for size in SIZE_MENTION_RE.findall(_fold(query)))
+
+    def answer(self, query: str, current_product: Optional[str] = None) -> Optional[dict]:
+        """
+        Responde preguntas de precio/talla/color/tela sobre un producto reconocido en la
+        consulta o anclado en la conversación. Devuelve None si no aplica.
+        Con el producto sólo anclado, una consulta que nombra otro valor ("¿tienen algo en
+        blanco?") busca en el catálogo en lugar de responder el color del anclado.
+        """
+        if not self.products:
+            return None
+
+        folded = query.lower()
+        attributes = [attr for attr, pattern in ATTRIBUTE_PATTERNS.items() if pattern.search(folded)]
+        if not attributes:
+            return None
+
+        product = self.match(query)
+        if product is None and current_product:
+            product = self.match(current_product)
+            if product is not None and self._names_other_value(query, product):
+                self.misses += 1
+                return None
+        if product is None or any(not product.get(attr) for attr in attributes):
+            self.misses += 1
+            return None
+
+        name = product["name"]
+        sentences = []
+        for attr in attributes:
+            if attr == "price":
+                sentences.append(f"El precio de {name} es {product['price']}.")
+            elif attr == "sizes":
+                sentences.append(f"{name} está disponible en tallas {_join_es(product['sizes'])}.")
+            elif attr == "color":
+                sentences.append(f"{name} viene en color {product['color']}.")
+            elif attr == "fabric":
+                sentences.append(f"{name} está confeccionado en {product['fabric']}.")
+
+        context = {"product_name": name, "category": product.get("category", "")}
+        if product.get("price"):
+            context["price"] = product["price"]
+
+        self.hits += 1
+        return {"answer": " ".join(sentences), "context": context, "direct": True}
+
+    def categories(self) -> list[str]:
+        """Categorías distintas del catálogo, en orden de aparición."""
+        return list(dict.fromkeys(p["category"] for p in self.products if p.get("category")))
+
+    def stats(self) -> dict:
+        return {"products": len(self.products), "version": self.version, "hits": self.hits, "misses": self.misses}
@@ -1,111 +1,404 @@
 import os
 import re
+import time
 import asyncio
 from typing import Dict, Optional
+import psycopg
+import numpy as np
 from psycopg_pool import AsyncConnectionPool
-from psycopg.rows import dict_row
 from src.config.settings import settings
+from src.database.pool import pool_manager
 from src.config.embeddings_factory import EmbeddingsFactory
+from src.rag.embedding_cache import EmbeddingCache
+from src.rag.semantic_cache import SemanticCache, fetch_catalog_version
+from src.rag.product_index import ProductIndex, parse_product_block
+from src.rag.vector_mirror import VectorMirror
+from src.rag.filters import SearchFilters, sql_filter_clause, filters_scope
+from src.config.metrics import stage_timer
+from src.config.tracing import annotate
 
-# Connection pool global
-pool = None
-
-async def init_pool():
-    global pool
-    if pool is None:
-        pool = AsyncConnectionPool(
-            conninfo=settings.db_connection_string,
-            min_size=1,
-            max_size=5,
-            kwargs={"row_factory": dict_row},
-            open=False
-        )
-        await pool.open()
+# Cache de embeddings de consultas compartido por todo el proceso
+embedding_cache = EmbeddingCache(
+    maxsize=settings.embedding_cache_size,
+    ttl_seconds=settings.embedding_cache_ttl_seconds
+)
+
+# Cache semántica de respuestas (invalidada por versión del catálogo)
+semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    maxsize=settings.semantic_cache_size
+)
+
+# Índice estructurado de productos (se reconstruye cuando cambia el catálogo)
+product_index = ProductIndex(min_score=settings.product_index_min_score)
+
+# Espejo en memoria de los embeddings (sólo se usa con RETRIEVAL_BACKEND=mirror)
+vector_mirror = VectorMirror(
+    snapshot_path=settings.vector_mirror_snapshot_path,
+    max_staleness_seconds=settings.vector_mirror_max_staleness_seconds
+)
+
+# Versión del catálogo (contador de knowledge_base_version) y cuándo se consultó
+_catalog_version: Optional[str] = None
+_catalog_version_checked_at = 0.0
+
+# Referencias a escrituras en segundo plano para que no las recolecte el GC
+_background_tasks: set = set()
 
 async def get_db_pool() -> AsyncConnectionPool:
-    global pool
-    if pool is None:
-        await init_pool()
-    return pool # type: ignore
+    """Pool compartido (ver src/database/pool.py)."""
+    return await pool_manager.get_pool()
+
+def get_embed_model():
+    """Cliente de embeddings de larga vida (singleton de EmbeddingsFactory)."""
+    return EmbeddingsFactory.get_eval_embed_model()
+
+async def _persist_embedding(key: str, query: str, embedding: list[float]):
+    try:
+        await embedding_cache.pg_put(pool_manager, key, settings.embeddings_model, query, embedding)
+    except Exception as e:
+        print(f"Error guardando embedding en cache persistente: {e}")
 
 async def embed_query_async(query: str) -> list[float]:
-    """Obtiene el embedding de la query usando el factory de forma asíncrona."""
-    embed_model = EmbeddingsFactory.get_eval_embed_model()
-    return await embed_model.aget_text_embedding(query)
+    """
+    Obtiene el embedding de la query usando el cliente compartido.
+    Consulta primero la cache en memoria y, si está habilitado, la cache en Postgres.
+    """
+    key = EmbeddingCache.make_key(query, settings.embeddings_model)
+
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if settings.embedding_cache_persistent:
+        try:
+            cached = await embedding_cache.pg_get(pool_manager, key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            print(f"Error leyendo cache persistente de embeddings: {e}")
+
+    with stage_timer("embedding"):
+        embedding = await get_embed_model().aget_text_embedding(query)
+    embedding_cache.put(key, embedding)
+
+    if settings.embedding_cache_persistent:
+        # Escritura fuera del camino de respuesta
+        task = asyncio.create_task(_persist_embedding(key, query, embedding))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    return embedding
+
+async def embed_queries_async(queries: list[str]) -> list[list[float]]:
+    """
+    Embeddings de varias consultas: las que no están en cache se piden en un solo request batch.
+    """
+    keys = [EmbeddingCache.make_key(q, settings.embeddings_model) for q in queries]
+    embeddings: list[Optional[list[float]]] = [embedding_cache.get(k) for k in keys]
+
+    if settings.embedding_cache_persistent:
+        for i, key in enumerate(keys):
+            if embeddings[i] is None:
+                try:
+                    embeddings[i] = await embedding_cache.pg_get(pool_manager, key)
+                except Exception as e:
+                    print(f"Error leyendo cache persistente de embeddings: {e}")
+
+    # Consultas repetidas dentro del lote se piden una sola vez
+    missing: dict[str, str] = {}
+    for i, key in enumerate(keys):
+        if embeddings[i] is None and key not in missing:
+            missing[key] = queries[i]
+
+    if missing:
+        with stage_timer("embedding_batch"):
+            fetched = await get_embed_model().aget_text_embedding_batch(list(missing.values()))
+        by_key = dict(zip(missing.keys(), fetched))
+        for key, text in missing.items():
+            embedding_cache.put(key, by_key[key])
+            if settings.embedding_cache_persistent:
+                task = asyncio.create_task(_persist_embedding(key, text, by_key[key]))
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+        embeddings = [e if e is not None else by_key[k] for e, k in zip(embeddings, keys)]
+
+    return embeddings  # type: ignore[return-value]
+
+VECTOR_SEARCH_SQL = """
+    SELECT
+        id,
+        content,
+        json_build_object('product_name', product_name, 'category', category) AS metadata_,
+        (embedding <#> %(embedding)b) * -1 AS similarity
+    FROM knowledge_base
+    {where}
+    ORDER BY embedding <#> %(embedding)b
+    LIMIT %(limit)s;
+"""
+
+def use_vector_mirror() -> bool:
+    return settings.retrieval_backend.lower() == "mirror"
 
-async def search_vectors_sql_async(query_embedding: list[float], limit: int = 3) -> list[Dict]:
+async def retrieve_async(query_embedding: list[float], limit: int = 3, query_text: Optional[str] = None, filters: Optional[SearchFilters] = None) -> list[Dict]:
+    """
+    Top-k desde el espejo en memoria si está al día; si no (o en modo híbrido), desde Postgres.
+    """
+    if use_vector_mirror() and settings.retrieval_mode.lower() != "hybrid" and vector_mirror.is_fresh():
+        with stage_timer("mirror_search"):
+            return vector_mirror.search(query_embedding, limit=limit, filters=filters)
+    return await search_vectors_sql_async(query_embedding, limit=limit, query_text=query_text, filters=filters)
+
+async def search_vectors_sql_async(query_embedding: list[float], limit: int = 3, query_text: Optional[str] = None, filters: Optional[SearchFilters] = None) -> list[Dict]:
     """Ejecuta pura consulta SQL (Operador Inner Product <#>) para latencia < 5ms."""
-    p = await get_db_pool()
-    async with p.connection() as conn:  # type: ignore
-        from pgvector.psycopg import register_vector_async # type: ignore
-        await register_vector_async(conn)
+    if query_text and settings.retrieval_mode.lower() == "hybrid":
+        try:
+            return await search_hybrid_sql_async(query_embedding, query_text, limit=limit, filters=filters)
+        except psycopg.Error as e:
+            # Columnas/índices híbridos ausentes: `python -m src.database.indexes hybrid`
+            print(f"Búsqueda híbrida no disponible, usando solo vectorial: {e}")
+
+    # Filtros de metadatos en el WHERE: se escanean sólo los vectores de la categoría/rango pedido
+    condition, filter_params = sql_filter_clause(filters)
+    statement = VECTOR_SEARCH_SQL.format(where=f"WHERE {condition}" if condition else "")
+
+    try:
+        async with pool_manager.connection() as conn:
+            with stage_timer("sql_search"):
+                async with conn.cursor() as cur:
+                    # Sentencia preparada; el vector viaja una sola vez y en binario (float32)
+                    await cur.execute(statement, {  # type: ignore[arg-type]
+                        "embedding": np.asarray(query_embedding, dtype=np.float32),
+                        "limit": limit,
+                        **filter_params,
+                    }, prepare=True)
+                    return await cur.fetchall()
+    except psycopg.errors.UndefinedColumn as e:
+        if not filters:
+            raise
+        # Falta price_value: `python -m src.database.indexes filters`
+        print(f"Filtros no disponibles, buscando sin filtrar: {e}")
+        return await search_vectors_sql_async(query_embedding, limit=limit)
+
+# Top-k de muchas consultas en una sola sentencia: cada vector del arreglo hace su propio
+# ORDER BY ... LIMIT (aprovecha el índice ANN) dentro del LATERAL.
+BATCH_VECTOR_SEARCH_SQL = """
+    SELECT
+        q.ord,
+        kb.id,
+        kb.content,
+        kb.metadata_,
+        kb.similarity
+    FROM unnest(%(embeddings)s::vector[], %(limits)s::int[]) WITH ORDINALITY AS q(embedding, lim, ord)
+    CROSS JOIN LATERAL (
+        SELECT
+            id,
+            content,
+            json_build_object('product_name', product_name, 'category', category) AS metadata_,
+            (embedding <#> q.embedding) * -1 AS similarity
+        FROM knowledge_base
+        {where}
+        ORDER BY embedding <#> q.embedding
+        LIMIT q.lim
+    ) kb
+    ORDER BY q.ord, kb.similarity DESC;
+"""
+
+async def search_vectors_many_sql_async(query_embeddings: list[list[float]], limits: list[int], filters: Optional[SearchFilters] = None) -> list[list[Dict]]:
+    """Búsqueda vectorial de un lote de consultas en un solo round trip (unnest + LATERAL), mismos filtros para todas."""
+    if not query_embeddings:
+        return []
+    condition, filter_params = sql_filter_clause(filters)
+    statement = BATCH_VECTOR_SEARCH_SQL.format(where=f"WHERE {condition}" if condition else "")
+
+    try:
+        async with pool_manager.connection() as conn:
+            with stage_timer("sql_search_batch"):
+                async with conn.cursor() as cur:
+                    await cur.execute(statement, {  # type: ignore[arg-type]
+                        "embeddings": [np.asarray(e, dtype=np.float32) for e in query_embeddings],
+                        "limits": limits,
+                        **filter_params,
+                    })
+                    rows = await cur.fetchall()
+    except psycopg.errors.UndefinedColumn as e:
+        if not filters:
+            raise
+        # Falta price_value: `python -m src.database.indexes filters`
+        print(f"Filtros no disponibles, buscando sin filtrar: {e}")
+        return await search_vectors_many_sql_async(query_embeddings, limits)
+
+    grouped: list[list[Dict]] = [[] for _ in query_embeddings]
+    for row in rows:
+        grouped[row.pop("ord") - 1].append(row)
+    return grouped
+
+# Fusión por rango recíproco (RRF) de la búsqueda vectorial y la léxica en una sola sentencia.
+# La consulta léxica usa OR entre términos para no exigir que aparezcan todas las palabras.
+HYBRID_SEARCH_SQL = """
+    WITH vec AS (
+        SELECT id, RANK() OVER (ORDER BY embedding <#> %(embedding)b) AS rnk
+        FROM knowledge_base
+        {vec_where}
+        ORDER BY embedding <#> %(embedding)b
+        LIMIT %(candidates)s
+    ),
+    q AS (
+        SELECT to_tsquery('spanish', replace(plainto_tsquery('spanish', %(text)s)::text, '&', '|')) AS tsq
+    ),
+    lex AS (
+        SELECT kb.id,
+               RANK() OVER (
+                   ORDER BY ts_rank_cd(kb.search_tsv, q.tsq) + similarity(kb.product_name, %(text)s) DESC
+               ) AS rnk
+        FROM knowledge_base kb, q
+        WHERE (kb.search_tsv @@ q.tsq OR kb.product_name %% %(text)s) {lex_filter}
+        ORDER BY rnk
+        LIMIT %(candidates)s
+    )
+    SELECT
+        kb.id,
+        kb.content,
+        json_build_object('product_name', kb.product_name, 'category', kb.category) AS metadata_,
+        (kb.embedding <#> %(embedding)b) * -1 AS similarity,
+        coalesce(1.0 / (%(rrf_k)s + vec.rnk), 0) + coalesce(1.0 / (%(rrf_k)s + lex.rnk), 0) AS rrf_score
+    FROM vec
+    FULL OUTER JOIN lex ON lex.id = vec.id
+    JOIN knowledge_base kb ON kb.id = coalesce(vec.id, lex.id)
+    ORDER BY rrf_score DESC
+    LIMIT %(limit)s;
+"""
+
+async def search_hybrid_sql_async(query_embedding: list[float], query_text: str, limit: int = 3, filters: Optional[SearchFilters] = None) -> list[Dict]:
+    """Búsqueda híbrida: tsvector en español + trigramas sobre product_name + pgvector, fusionadas con RRF."""
+    condition, filter_params = sql_filter_clause(filters)
+    lex_condition, _ = sql_filter_clause(filters, alias="kb")
+    statement = HYBRID_SEARCH_SQL.format(
+        vec_where=f"WHERE {condition}" if condition else "",
+        lex_filter=f"AND {lex_condition}" if lex_condition else "",
+    )
+
+    async with pool_manager.connection() as conn:
+        with stage_timer("sql_hybrid_search"):
+            async with conn.cursor() as cur:
+                await cur.execute(statement, {  # type: ignore[arg-type]
+                    "embedding": np.asarray(query_embedding, dtype=np.float32),
+                    "text": query_text,
+                    "candidates": max(settings.hybrid_candidates, limit),
+                    "rrf_k": settings.hybrid_rrf_k,
+                    "limit": limit,
+                    **filter_params,
+                }, prepare=True)
+                return await cur.fetchall()
+
+async def get_catalog_version(force: bool = False) -> Optional[str]:
+    """
+    Devuelve la versión de knowledge_base (contador mantenido por trigger).
+    Se consulta como máximo cada `catalog_version_ttl_seconds`. Sin el trigger instalado
+    cae al hash del contenido, que escanea toda la tabla.
+    """
+    global _catalog_version, _catalog_version_checked_at
+    now = time.monotonic()
+    if not force and _catalog_version is not None and now - _catalog_version_checked_at < settings.catalog_version_ttl_seconds:
+        return _catalog_version
+
+    async with pool_manager.connection() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT 
-                    id, 
-                    content, 
-                    json_build_object('product_name', product_name, 'category', category) AS metadata_, 
-                    (embedding <#> %s::vector) * -1 AS similarity
-                FROM knowledge_base
-                ORDER BY embedding <#> %s::vector
-                LIMIT %s;
-            """, (query_embedding, query_embedding, limit))
-            res = await cur.fetchall()
-            return res
-
-async def rag_search(query: str, current_product: Optional[str] = None) -> dict:
+            version = await fetch_catalog_version(cur)
+
+    _catalog_version = version
+    _catalog_version_checked_at = now
+    return _catalog_version
+
+def _load_product_index_from_file(path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        raw_text = f.read()
+    product_index.build_from_text(raw_text, version=f"file:{os.path.getmtime(path)}")
+
+async def refresh_product_index(force: bool = False) -> None:
+    """
+    Construye/actualiza el índice de productos desde knowledge_base (o desde el archivo
+    del catálogo). Sólo reconstruye si cambió la versión del catálogo.
+    """
+    if settings.product_index_source.lower() == "file":
+        path = settings.product_index_path
+        if force or product_index.version != f"file:{os.path.getmtime(path)}":
+            _load_product_index_from_file(path)
+        return
+
+    try:
+        version = await get_catalog_version(force=force)
+        if not force and version == product_index.version:
+            return
+
+        async with pool_manager.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT product_name, category, content FROM knowledge_base;")
+                rows = await cur.fetchall()
+
+        records = []
+        for row in rows:
+            record = parse_product_block(row["content"] or "")
+            if record is None and row["product_name"]:
+                record = {"name": row["product_name"], "content": row["content"] or ""}
+            if record is not None:
+                if row["category"] and not record.get("category"):
+                    record["category"] = row["category"]
+                records.append(record)
+        product_index.build(records, version=version)
+    except Exception as e:
+        print(f"Error construyendo índice de productos desde knowledge_base: {e}")
+        if not product_index.products and os.path.exists(settings.product_index_path):
+            _load_product_index_from_file(settings.product_index_path)
+
+async def _sync_semantic_cache_version() -> None:
+    try:
+        version = await get_catalog_version()
+        if version:
+            semantic_cache.set_version(version)
+    except Exception as e:
+        print(f"Error obteniendo versión del catálogo: {e}")
+
+async def rag_search(query: str, current_product: Optional[str] = None, filters: Optional[SearchFilters] = None, intents: Optional[set[str]] = None) -> dict:
+    """
+    Busca en el catálogo. `filters` (categoría / rango de precio) se aplica en el WHERE
+    de la búsqueda; la ruta rápida del índice de productos no depende de él.
+    `intents` son las del router del grafo: una pregunta abierta ("¿qué me recomiendas más
+    barato que...?") no se responde con el atributo suelto del índice.
+    """
     try:
-        search_term = query
-        if re.search(r"\b(precio|cu[aá]nto cuesta|valor|costo)\b", query.lower()) and current_product:
-            search_term = current_product
+        # Ruta rápida: precio/talla/color de un producto reconocido, sin OpenAI ni Postgres
+        if settings.product_index_enabled and "open_ended" not in (intents or ()):
+            try:
+                await refresh_product_index()
+            except Exception as e:
+                print(f"Error actualizando índice de productos: {e}")
+            direct = product_index.answer(query, current_product)
+            if direct is not None:
+                annotate(retrieval_source="product_index")
+                return direct
+
+        search_term = _resolve_search_term(query, current_product)
 
         # Generación de embedding asíncrono
         query_embedding = await embed_query_async(search_term)
-        
-        limit = 5 if search_term == current_product else 3
-        
-        # Búsqueda SQL directa asíncrona
-        results = await search_vectors_sql_async(query_embedding, limit=limit)
-        
-        # Intentar extraer precio rápido si era la intención
-        if search_term == current_product and current_product and results:
-            for row in results:
-                text = row['content']
-                if current_product.lower() in text.lower():
-                    price_match = re.search(r"(?:PRECIO|VALOR|COSTO):\s*([^\n,]+)", text, re.IGNORECASE)
-                    if price_match:
-                        return {
-                            "answer": f"El precio de {current_product} es {price_match.group(1).strip()}.",
-                            "context": {"product_name": current_product, "price": price_match.group(1).strip()}
-                        }
-
-        if not results:
-            return {
-                "answer": "No encontré información exacta en el catálogo de Civetta. Por favor avísale al usuario que consulte con un agente.",
-                "context": {}
-            }
-
-        textos_catalogo = "\n\n".join([row['content'] for row in results])
-        
-        final_answer = textos_catalogo
 
-        context = {}
-        best_metadata = results[0]['metadata_'] if results else {}
-        
-        # psycopg puede devolver el JSON como string o dict dependiendo del tipeo, aseguramos dict.
-        import json
-        if isinstance(best_metadata, str):
-            best_metadata = json.loads(best_metadata)
-            
-        context["product_name"] = best_metadata.get("product_name", "")
-        context["category"] = best_metadata.get("category", "")
+        # Cache semántica: consultas parecidas con el mismo producto anclado, el mismo producto
+        # nombrado (y filtros) reutilizan la respuesta
+        scope = _cache_scope(current_product, filters, query)
+        if settings.semantic_cache_enabled:
+            await _sync_semantic_cache_version()
+            cached = semantic_cache.lookup(query_embedding, scope=scope)
+            if cached is not None:
+                annotate(retrieval_source="semantic_cache")
+                return cached
+
+        result = await _search_and_answer(search_term, query_embedding, current_product, filters)
 
-        best_text = results[0]['content'] if results else ""
-        price_match = re.search(r"(?:PRECIO|VALOR|COSTO):\s*([^\n,]+)", best_text, re.IGNORECASE)
-        if price_match:
-            context["price"] = price_match.group(1).strip()
+        if settings.semantic_cache_enabled and result.get("context"):
+            semantic_cache.store(query_embedding, result, scope=scope)
 
-        return {"answer": final_answer, "context": context}
+        return result
 
     except Exception as e:
         import traceback
@@ -113,4 +406,155 @@ async def rag_search(query: str, current_product: Optional[str] = None) -> dict:
         return {
             "answer": "Hubo un problema técnico interno verificando la disponibilidad.",
             "context": {}
-        }
\ No newline at end of file
+        }
+
+def _resolve_search_term(query: str, current_product: Optional[str]) -> str:
+    if re.search(r"\b(precio|cu[aá]nto cuesta|valor|costo)\b", query.lower()) and current_product:
+        return current_product
+    return query
+
+def _cache_scope(current_product: Optional[str], filters: Optional[SearchFilters] = None, query: Optional[str] = None) -> str:
+    # "bata aurora" y "bata perla" quedan sobre el umbral de similitud: el producto nombrado
+    # en la consulta separa sus entradas para no devolver el contexto de otro producto
+    named = product_index.match(query) if query else None
+    named_key = named["name"].strip().lower() if named else ""
+    return f"{(current_product or '').strip().lower()}#{named_key}#{filters_scope(filters)}"
+
+def _search_limit(search_term: str, current_product: Optional[str]) -> int:
+    return 5 if search_term == current_product else 3
+
+async def _search_and_answer(search_term: str, query_embedding: list[float], current_product: Optional[str], filters: Optional[SearchFilters] = None) -> dict:
+    """Búsqueda vectorial + armado de la respuesta a partir de las filas recuperadas."""
+    limit = _search_limit(search_term, current_product)
+    
+    # Búsqueda SQL directa asíncrona
+    results = await retrieve_async(query_embedding, limit=limit, query_text=search_term, filters=filters)
+    annotate(retrieval_source="search", row_ids=[row.get("id") for row in results])
+    return _answer_from_results(results, search_term, current_product)
+
+def _answer_from_results(results: list[Dict], search_term: str, current_product: Optional[str]) -> dict:
+    """Arma {"answer", "context"} a partir de las filas recuperadas."""
+    # Intentar extraer precio rápido si era la intención
+    if search_term == current_product and current_product and results:
+        for row in results:
+            text = row['content']
+            if current_product.lower() in text.lower():
+                price_match = re.search(r"(?:PRECIO|VALOR|COSTO):\s*([^\n,]+)", text, re.IGNORECASE)
+                if price_match:
+                    return {
+                        "answer": f"El precio de {current_product} es {price_match.group(1).strip()}.",
+                        "context": {"product_name": current_product, "price": price_match.group(1).strip()},
+                        "direct": True
+                    }
+
+    if not results:
+        return {
+            "answer": "No encontré información exacta en el catálogo de Civetta. Por favor avísale al usuario que consulte con un agente.",
+            "context": {}
+        }
+
+    textos_catalogo = "\n\n".join([row['content'] for row in results])
+    
+    final_answer = textos_catalogo
+
+    context = {}
+    best_metadata = results[0]['metadata_'] if results else {}
+    
+    # psycopg puede devolver el JSON como string o dict dependiendo del tipeo, aseguramos dict.
+    import json
+    if isinstance(best_metadata, str):
+        best_metadata = json.loads(best_metadata)
+        
+    context["product_name"] = best_metadata.get("product_name", "")
+    context["category"] = best_metadata.get("category", "")
+
+    best_text = results[0]['content'] if results else ""
+    price_match = re.search(r"(?:PRECIO|VALOR|COSTO):\s*([^\n,]+)", best_text, re.IGNORECASE)
+    if price_match:
+        context["price"] = price_match.group(1).strip()
+
+    return {"answer": final_answer, "context": context}
+
+async def rag_search_many(
+    queries: list[str],
+    current_products: Optional[list[Optional[str]]] = None,
+    filters: Optional[list[Optional[SearchFilters]]] = None,
+    intents: Optional[list[Optional[set[str]]]] = None,
+) -> list[dict]:
+    """
+    Versión por lotes de rag_search (evaluación offline, precalentado de caches, turnos con
+    varias preguntas). Mismo contrato {"answer", "context"} por consulta, y mismos `filters`
+    e `intents` (uno por consulta), pero con un solo request de embeddings y una sentencia SQL
+    por cada juego de filtros distinto. En modo híbrido cada consulta hace su búsqueda híbrida,
+    igual que rag_search, para no guardar en la cache semántica respuestas sólo vectoriales.
+    """
+    products: list[Optional[str]] = list(current_products) if current_products else [None] * len(queries)
+    query_filters: list[Optional[SearchFilters]] = list(filters) if filters else [None] * len(queries)
+    query_intents: list[set[str]] = [set(i or ()) for i in intents] if intents else [set() for _ in queries]
+    if not (len(products) == len(query_filters) == len(query_intents) == len(queries)):
+        raise ValueError("current_products, filters e intents deben tener el mismo largo que queries")
+
+    results: list[Optional[dict]] = [None] * len(queries)
+    try:
+        if settings.product_index_enabled:
+            try:
+                await refresh_product_index()
+            except Exception as e:
+                print(f"Error actualizando índice de productos: {e}")
+            for i, (query, product) in enumerate(zip(queries, products)):
+                if "open_ended" not in query_intents[i]:
+                    results[i] = product_index.answer(query, product)
+
+        pending = [i for i, r in enumerate(results) if r is None]
+        if not pending:
+            return results  # type: ignore[return-value]
+
+        search_terms = {i: _resolve_search_term(queries[i], products[i]) for i in pending}
+        embeddings = dict(zip(pending, await embed_queries_async([search_terms[i] for i in pending])))
+        scopes = {i: _cache_scope(products[i], query_filters[i], queries[i]) for i in pending}
+
+        if settings.semantic_cache_enabled:
+            await _sync_semantic_cache_version()
+            for i in pending:
+                results[i] = semantic_cache.lookup(embeddings[i], scope=scopes[i])
+            pending = [i for i in pending if results[i] is None]
+
+        limits = {i: _search_limit(search_terms[i], products[i]) for i in pending}
+        found: dict[int, list[Dict]] = {}
+        if settings.retrieval_mode.lower() == "hybrid":
+            # La búsqueda híbrida lleva el texto de cada consulta: no se agrupa en una sentencia
+            rows = await asyncio.gather(*(
+                search_vectors_sql_async(embeddings[i], limit=limits[i], query_text=search_terms[i], filters=query_filters[i])
+                for i in pending
+            ))
+            found = dict(zip(pending, rows))
+        elif use_vector_mirror() and vector_mirror.is_fresh():
+            with stage_timer("mirror_search"):
+                found = {i: vector_mirror.search(embeddings[i], limit=limits[i], filters=query_filters[i]) for i in pending}
+        else:
+            # Una sentencia por juego de filtros (normalmente uno solo para todo el lote)
+            groups: dict[str, list[int]] = {}
+            for i in pending:
+                groups.setdefault(filters_scope(query_filters[i]), []).append(i)
+            for group in groups.values():
+                rows = await search_vectors_many_sql_async(
+                    [embeddings[i] for i in group], [limits[i] for i in group], filters=query_filters[group[0]]
+                )
+                found.update(zip(group, rows))
+
+        for i in pending:
+            result = _answer_from_results(found[i], search_terms[i], products[i])
+            if settings.semantic_cache_enabled and result.get("context"):
+                semantic_cache.store(embeddings[i], result, scope=scopes[i])
+            results[i] = result
+
+        return results  # type: ignore[return-value]
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        error = {
+            "answer": "Hubo un problema técnico interno verificando la disponibilidad.",
+            "context": {}
+        }
+        return [r if r is not None else dict(error) for r in results]
@@ -0,0 +1,137 @@
+import copy
+from collections import OrderedDict
+from typing import Optional
+import time
+import numpy as np
+import psycopg
+from src.config.settings import settings
+
+# Versión del catálogo: contador que incrementa un trigger en cada insert/update/delete de
+# knowledge_base (python -m src.database.indexes version). Es una lectura de una fila.
+CATALOG_VERSION_SQL = """
+    SELECT version::text AS version FROM knowledge_base_version WHERE id = 1;
+"""
+
+# Respaldo mientras no exista el trigger: huella del contenido (escanea toda la tabla)
+CATALOG_HASH_SQL = """
+    SELECT md5(coalesce(string_agg(md5(content), '' ORDER BY id), '')) AS version
+    FROM knowledge_base;
+"""
+
+
+# Estado del respaldo: se avisa una sola vez y el hash se recalcula como máximo cada
+# `catalog_hash_ttl_seconds` (la lectura del contador sí se hace en cada consulta)
+_hash_warned = False
+_hash_version: Optional[str] = None
+_hash_checked_at = 0.0
+
+
+async def fetch_catalog_version(cur: psycopg.AsyncCursor) -> Optional[str]:
+    """Versión vigente del catálogo (`cur` con dict_row, conexión en autocommit)."""
+    global _hash_warned, _hash_version, _hash_checked_at
+    try:
+        await cur.execute(CATALOG_VERSION_SQL)
+    except psycopg.errors.UndefinedTable:
+        if not _hash_warned:
+            _hash_warned = True
+            print("⚠️ knowledge_base_version no existe; usando hash del catálogo (python -m src.database.indexes version)")
+        now = time.monotonic()
+        if _hash_version is not None and now - _hash_checked_at < settings.catalog_hash_ttl_seconds:
+            return _hash_version
+        await cur.execute(CATALOG_HASH_SQL)
+        row = await cur.fetchone()
+        _hash_version = row["version"] if row else None
+        _hash_checked_at = now
+        return _hash_version
+    row = await cur.fetchone()
+    return row["version"] if row else None
+
+
+class SemanticCache:
+    """
+    Cache semántica de respuestas de rag_search.
+    Devuelve la respuesta guardada cuando el embedding de una nueva consulta está
+    a una similitud coseno >= threshold de una consulta ya respondida.
+    Las entradas se agrupan por `scope` (producto anclado) porque la respuesta depende de él.
+    Todas las entradas se invalidan cuando cambia la versión del catálogo.
+    """
+
+    def __init__(self, threshold: float = 0.92, maxsize: int = 512):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.version: Optional[str] = None
+        self._scopes: "dict[str, OrderedDict[int, tuple[np.ndarray, dict]]]" = {}
+        self._next_id = 0
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _scope_key(scope: Optional[str]) -> str:
+        return (scope or "").strip().lower()
+
+    @staticmethod
+    def _unit(embedding: list[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def set_version(self, version: str) -> None:
+        """Registra la versión vigente del catálogo; si cambió, vacía la cache."""
+        if self.version is not None and version != self.version:
+            self.clear()
+            self.invalidations += 1
+        self.version = version
+
+    def lookup(self, embedding: list[float], scope: Optional[str] = None) -> Optional[dict]:
+        entries = self._scopes.get(self._scope_key(scope))
+        if not entries:
+            self.misses += 1
+            return None
+
+        ids = list(entries.keys())
+        matrix = np.stack([entries[i][0] for i in ids])
+        scores = matrix @ self._unit(embedding)
+        best = int(np.argmax(scores))
+
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = ids[best]
+        entries.move_to_end(entry_id)
+        self.hits += 1
+        return copy.deepcopy(entries[entry_id][1])
+
+    def store(self, embedding: list[float], result: dict, scope: Optional[str] = None) -> None:
+        entries = self._scopes.setdefault(self._scope_key(scope), OrderedDict())
+        entries[self._next_id] = (self._unit(embedding), copy.deepcopy(result))
+        self._next_id += 1
+        self._size += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        # Descarta la entrada menos usada del scope más grande hasta respetar el tamaño máximo
+        while self._size > self.maxsize:
+            scope_key = max(self._scopes, key=lambda k: len(self._scopes[k]))
+            self._scopes[scope_key].popitem(last=False)
+            if not self._scopes[scope_key]:
+                del self._scopes[scope_key]
+            self._size -= 1
+
+    def clear(self) -> None:
+        self._scopes.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "catalog_version": self.version,
+        }
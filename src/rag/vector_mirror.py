@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import asyncio
+from typing import Dict, Optional
+import numpy as np
+import psycopg
+from psycopg.rows import dict_row
+from src.config.settings import settings
+from src.database.pool import pool_manager
+from src.rag.semantic_cache import fetch_catalog_version
+from src.rag.filters import SearchFilters, price_from_content, row_matches
+
+# Canal usado por el trigger de knowledge_base (ver src/database/indexes.py, comando `notify`)
+NOTIFY_CHANNEL = "knowledge_base_changes"
+
+MIRROR_COLUMNS_SQL = "SELECT id, product_name, category, content, embedding FROM knowledge_base"
+
+
+class VectorMirror:
+    """
+    Copia en memoria de los embeddings de knowledge_base en una matriz float32 contigua.
+    El top-k es un único producto matriz-vector (equivale al operador <#> de pgvector).
+    Se mantiene al día con LISTEN/NOTIFY y se persiste como snapshot para arrancar rápido.
+    """
+
+    def __init__(self, snapshot_path: str, max_staleness_seconds: float = 30):
+        self.snapshot_path = snapshot_path
+        self.max_staleness_seconds = max_staleness_seconds
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.rows: list[dict] = []
+        self._positions: dict[str, int] = {}
+        self._size = 0
+        self.loaded_from_snapshot = False
+        self.version: Optional[str] = None  # versión del catálogo que refleja el contenido
+        self.synced = False  # True cuando el contenido fue verificado contra la base de datos
+        self.last_heartbeat = 0.0
+        self.applied_changes = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    # --- Estado ---
+    def is_fresh(self) -> bool:
+        """El espejo sólo responde si está sincronizado y el listener dio señales de vida hace poco."""
+        return self.synced and self._size > 0 and time.monotonic() - self.last_heartbeat < self.max_staleness_seconds
+
+    def stats(self) -> dict:
+        return {
+            "rows": self._size,
+            "fresh": self.is_fresh(),
+            "synced": self.synced,
+            "loaded_from_snapshot": self.loaded_from_snapshot,
+            "applied_changes": self.applied_changes,
+            "seconds_since_heartbeat": round(time.monotonic() - self.last_heartbeat, 1) if self.last_heartbeat else None,
+        }
+
+    # --- Construcción ---
+    def _build(self, rows: list[dict], embeddings: np.ndarray) -> None:
+        self.rows = rows
+        self.matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._size = len(rows)
+        self._positions = {str(row["id"]): i for i, row in enumerate(rows)}
+
+    @staticmethod
+    def _split_row(row: dict) -> tuple[dict, np.ndarray]:
+        value = row["embedding"]
+        if hasattr(value, "to_numpy"):  # pgvector.Vector (lectura en binario)
+            value = value.to_numpy()
+        elif isinstance(value, str):  # tipo vector sin registrar: '[0.1,0.2,...]'
+            value = json.loads(value)
+        embedding = np.asarray(value, dtype=np.float32)
+        meta = {
+            "id": row["id"] if isinstance(row["id"], (int, str)) else str(row["id"]),
+            "product_name": row["product_name"],
+            "category": row["category"],
+            "content": row["content"],
+            "price_value": price_from_content(row["content"]),
+        }
+        return meta, embedding
+
+    @staticmethod
+    async def fetch_version(conn: psycopg.AsyncConnection) -> Optional[str]:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            return await fetch_catalog_version(cur)
+
+    async def sync(self, conn: psycopg.AsyncConnection) -> None:
+        """Verifica el contenido contra la base; sólo recarga todo si la versión no coincide."""
+        version = await self.fetch_version(conn)
+        if self._size and version == self.version:
+            self.synced = True
+            return
+        await self.load_from_db(conn, version)
+
+    async def load_from_db(self, conn: psycopg.AsyncConnection, version: Optional[str] = None) -> None:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(MIRROR_COLUMNS_SQL + ";")
+            fetched = await cur.fetchall()
+
+        rows, vectors = [], []
+        for row in fetched:
+            if row["embedding"] is None:
+                continue
+            meta, embedding = self._split_row(row)
+            rows.append(meta)
+            vectors.append(embedding)
+
+        dim = len(vectors[0]) if vectors else 0
+        self._build(rows, np.vstack(vectors) if vectors else np.zeros((0, dim), dtype=np.float32))
+        self.version = version
+        self.synced = True
+        self.save_snapshot()
+
+    # --- Snapshot ---
+    def save_snapshot(self) -> None:
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            np.save(self.snapshot_path + ".tmp.npy", self.matrix[:self._size])
+            with open(self.snapshot_path + ".tmp.json", "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "rows": self.rows[:self._size]}, f, ensure_ascii=False)
+            os.replace(self.snapshot_path + ".tmp.npy", self.snapshot_path + ".npy")
+            os.replace(self.snapshot_path + ".tmp.json", self.snapshot_path + ".json")
+        except Exception as e:
+            print(f"No se pudo guardar el snapshot del espejo vectorial: {e}")
+
+    def load_snapshot(self) -> bool:
+        """Carga el último snapshot con memory-map (sin copiar a RAM hasta que se usa)."""
+        try:
+            matrix = np.load(self.snapshot_path + ".npy", mmap_mode="r")
+            with open(self.snapshot_path + ".json", "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            rows = snapshot["rows"]
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Snapshot del espejo vectorial inválido: {e}")
+            return False
+
+        if len(rows) != matrix.shape[0]:
+            return False
+        self.rows = rows
+        self.matrix = matrix
+        self._size = len(rows)
+        self._positions = {str(row["id"]): i for i, row in enumerate(rows)}
+        self.version = snapshot.get("version")
+        self.loaded_from_snapshot = True
+        return True
+
+    # --- Cambios incrementales ---
+    def _ensure_writable(self, extra: int = 0) -> None:
+        # El snapshot viene memory-mapped en solo lectura: se copia al primer cambio.
+        # La capacidad crece al doble para que los inserts sean O(1) amortizado.
+        needed = self._size + extra
+        capacity = self.matrix.shape[0]
+        if isinstance(self.matrix, np.memmap) or not self.matrix.flags.writeable or needed > capacity:
+            new_capacity = max(needed, capacity * 2 if needed > capacity else capacity, 16)
+            matrix = np.zeros((new_capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[:self._size] = self.matrix[:self._size]
+            self.matrix = matrix
+
+    def upsert(self, row: dict) -> None:
+        meta, embedding = self._split_row(row)
+        key = str(meta["id"])
+        if self.matrix.shape[1] == 0:
+            self.matrix = np.zeros((0, embedding.shape[0]), dtype=np.float32)
+
+        position = self._positions.get(key)
+        if position is None:
+            self._ensure_writable(extra=1)
+            position = self._size
+            self.rows.append(meta)
+            self._positions[key] = position
+            self._size += 1
+        else:
+            self._ensure_writable()
+            self.rows[position] = meta
+        self.matrix[position] = embedding
+
+    def delete(self, row_id) -> None:
+        key = str(row_id)
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        self._ensure_writable()
+        last = self._size - 1
+        if position != last:
+            # Mover la última fila al hueco para mantener la matriz contigua
+            self.matrix[position] = self.matrix[last]
+            self.rows[position] = self.rows[last]
+            self._positions[str(self.rows[position]["id"])] = position
+        self.rows.pop()
+        self._size -= 1
+
+    async def apply_notification(self, payload: str) -> None:
+        event = json.loads(payload)
+        op, row_id = event.get("op"), event.get("id")
+        if op == "DELETE":
+            self.delete(row_id)
+        else:
+            # La conexión del LISTEN queda ocupada por notifies(); la fila se lee por el pool
+            async with pool_manager.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(MIRROR_COLUMNS_SQL + " WHERE id = %s;", (row_id,))
+                row = await cur.fetchone()
+            if row is None or row["embedding"] is None:
+                self.delete(row_id)
+            else:
+                self.upsert(row)
+        # El contenido ya no corresponde a una versión conocida del catálogo
+        self.version = None
+        self.applied_changes += 1
+
+    # --- Búsqueda ---
+    def search(self, query_embedding: list[float], limit: int = 3, filters: Optional[SearchFilters] = None) -> list[Dict]:
+        """Top-k por producto interno; mismo formato de filas que search_vectors_sql_async."""
+        if self._size == 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.matrix[:self._size] @ query
+        if filters:
+            mask = np.fromiter((row_matches(row, filters) for row in self.rows[:self._size]), dtype=bool, count=self._size)
+            scores = np.where(mask, scores, -np.inf)
+            limit = min(limit, int(mask.sum()))
+            if limit == 0:
+                return []
+        k = min(limit, self._size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            row = self.rows[i]
+            results.append({
+                "id": row["id"],
+                "content": row["content"],
+                "metadata_": {"product_name": row["product_name"], "category": row["category"]},
+                "similarity": float(scores[i]),
+            })
+        return results
+
+    # --- Ciclo de vida ---
+    async def _listen_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(settings.db_connection_string, autocommit=True) as conn:
+                    from pgvector.psycopg import register_vector_async  # type: ignore
+                    await register_vector_async(conn)
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                    # Verificación en cada (re)conexión: pudimos perder notificaciones
+                    await self.sync(conn)
+                    self.last_heartbeat = time.monotonic()
+                    backoff = 1.0
+
+                    heartbeat = max(self.max_staleness_seconds / 3, 1.0)
+                    while True:
+                        async for notify in conn.notifies(timeout=heartbeat):
+                            await self.apply_notification(notify.payload)
+                            self.last_heartbeat = time.monotonic()
+                        # Sin eventos: confirmamos que la conexión sigue viva
+                        await conn.execute("SELECT 1;")
+                        self.last_heartbeat = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.synced = False
+                print(f"Listener del espejo vectorial desconectado, reintentando en {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self.load_snapshot()
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if not self.synced:
+            return
+        if self.version is None:
+            # Hubo cambios por NOTIFY desde la última carga: el contenido no corresponde a ninguna
+            # versión conocida. Se re-sincroniza (lee la versión antes que las filas) para que el
+            # snapshot nunca declare una versión con cambios que no tiene.
+            try:
+                async with await psycopg.AsyncConnection.connect(settings.db_connection_string, autocommit=True) as conn:
+                    from pgvector.psycopg import register_vector_async  # type: ignore
+                    await register_vector_async(conn)
+                    await self.sync(conn)  # load_from_db ya guarda el snapshot
+                return
+            except Exception as e:
+                print(f"No se pudo re-sincronizar el espejo vectorial al cerrar: {e}")
+        # Versión de la última carga completa; None si no se pudo re-sincronizar y hubo cambios,
+        # así el próximo arranque recarga todo en lugar de confiar en el snapshot
+        self.save_snapshot()
@@ -0,0 +1,20 @@
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Query
+from src.config.settings import settings
+from src.config.tracing import flight_recorder
+
+router = APIRouter(prefix="/admin")
+
+def _require_admin(token: Optional[str]) -> None:
+    # Sin ADMIN_TOKEN configurado los endpoints de administración no existen
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Token de administración inválido.")
+
+@router.get("/traces")
+async def slow_traces(limit: int = Query(20, ge=1, le=500), x_admin_token: Optional[str] = Header(None)):
+    """Turnos más lentos recientes (muestreados) con su árbol de spans, consulta, filas y tokens."""
+    _require_admin(x_admin_token)
+    return {"stats": flight_recorder.stats(), "traces": flight_recorder.slowest(limit)}
@@ -0,0 +1,85 @@
+import asyncio
+from contextlib import asynccontextmanager
+from src.agent.deadline import remaining_seconds
+
+
+class Overloaded(Exception):
+    """El endpoint está al límite: se responde 503 con Retry-After."""
+
+    def __init__(self, endpoint: str, retry_after: int):
+        super().__init__(f"{endpoint} saturado")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Límite de concurrencia de un endpoint con cola de espera acotada.
+    Hasta `max_concurrent` requests en curso; los siguientes esperan en cola (hasta `max_queue`,
+    como mucho `queue_timeout_seconds` o lo que le quede al plazo del request) y el resto se
+    rechaza de inmediato con Overloaded, en lugar de acumular conexiones y llamadas al LLM.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout_seconds: float, retry_after_seconds: int = 2):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def check(self) -> None:
+        """Rechazo inmediato si no hay lugar ni en curso ni en la cola."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after_seconds)
+
+    async def acquire(self) -> None:
+        """Toma un cupo (espera en la cola si hace falta) o lanza Overloaded; liberar con release()."""
+        self.check()
+        if self._semaphore.locked():
+            timeout = self.queue_timeout_seconds
+            remaining = remaining_seconds()
+            if remaining is not None:
+                timeout = max(min(timeout, remaining), 0.0)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(self.name, self.retry_after_seconds)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -1,8 +1,14 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from pydantic import BaseModel
+from typing import Awaitable, Callable, Optional
+import time
+import asyncio
 import logging
-import psycopg
 from src.config.settings import settings
+from src.config.http_client import get_async_http_client
+from src.config.llm_factory import LLMFactory
+from src.config.embeddings_factory import EmbeddingsFactory
+from src.database.pool import pool_manager
 
 router = APIRouter()
 
@@ -11,20 +17,132 @@ class HealthResponse(BaseModel):
     database: str
     version: str = "0.0.1"
 
+class LivenessResponse(BaseModel):
+    status: str
+    uptime_seconds: float
+
+class DependencyHealth(BaseModel):
+    status: str  # ok | error
+    latency_ms: float
+    detail: Optional[str] = None
+
+class ReadinessResponse(BaseModel):
+    status: str  # ready | not_ready
+    cached: bool
+    age_seconds: float
+    dependencies: dict[str, DependencyHealth]
+
 logger = logging.getLogger("voice_health")
 
-@router.get("/health", response_model=HealthResponse)
-async def health_check():
-    db_status = "unknown"
+STARTED_AT = time.monotonic()
+
+# Índice ANN del catálogo (ver schema.sql / python -m src.database.indexes ann)
+VECTOR_INDEX_SQL = """
+SELECT indexname FROM pg_indexes
+WHERE tablename = 'knowledge_base'
+  AND (indexdef ILIKE '%using hnsw%' OR indexdef ILIKE '%using ivfflat%');
+"""
+
+# Último resultado de readiness: (momento en que se calculó, dependencias)
+_readiness: Optional[tuple[float, dict[str, DependencyHealth]]] = None
+_readiness_lock = asyncio.Lock()
+
+async def _check_database() -> str:
+    async with pool_manager.connection() as conn:
+        await conn.execute("SELECT 1;")
+    return "SELECT 1"
+
+async def _check_vector_index() -> str:
+    async with pool_manager.connection() as conn:
+        cur = await conn.execute(VECTOR_INDEX_SQL)
+        rows = await cur.fetchall()
+    if not rows:
+        raise RuntimeError("knowledge_base no tiene índice ANN (hnsw / ivfflat)")
+    return ", ".join(row["indexname"] for row in rows)
 
+async def _ping_model(provider: str, model: str) -> str:
+    """GET /models/{model}: valida alcance, credenciales y acceso al modelo sin consumir tokens."""
+    if provider != "OPENAI" or not settings.health_ping_providers:
+        return f"cliente {provider} creado (sin ping)"
+    response = await get_async_http_client().get(
+        f"{settings.openai_api_base.rstrip('/')}/models/{model}",
+        headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+        timeout=settings.health_check_timeout_seconds
+    )
+    response.raise_for_status()
+    return model
+
+async def _check_llm() -> str:
+    llm = LLMFactory.get_llm()
+    return await _ping_model(settings.llm_provider.upper(), getattr(llm, "model", ""))
+
+async def _check_embeddings() -> str:
+    EmbeddingsFactory.get_eval_embed_model()
+    return await _ping_model(settings.embeddings_provider.upper(), settings.embeddings_model)
+
+CHECKS: dict[str, Callable[[], Awaitable[str]]] = {
+    "database": _check_database,
+    "vector_index": _check_vector_index,
+    "llm": _check_llm,
+    "embeddings": _check_embeddings,
+}
+
+async def _timed(name: str, check: Callable[[], Awaitable[str]]) -> DependencyHealth:
+    start = time.perf_counter()
     try:
-        # Intentamos conexión directa a Postgres
-        with psycopg.connect(settings.db_connection_string) as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1;")
-        db_status = "connected"
+        detail = await asyncio.wait_for(check(), timeout=settings.health_check_timeout_seconds)
+        status = "ok"
+    except asyncio.TimeoutError:
+        status, detail = "error", f"sin respuesta en {settings.health_check_timeout_seconds}s"
     except Exception as e:
-        logger.error(f"Database health check failed: {e}")
-        db_status = "disconnected"
+        status, detail = "error", str(e) or type(e).__name__
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    if status != "ok":
+        logger.error(f"Readiness: {name} falló en {latency_ms} ms: {detail}")
+    return DependencyHealth(status=status, latency_ms=latency_ms, detail=detail)
+
+def _fresh_readiness() -> Optional[tuple[float, dict[str, DependencyHealth]]]:
+    if _readiness is not None and time.monotonic() - _readiness[0] < settings.health_cache_ttl_seconds:
+        return _readiness
+    return None
 
+async def check_readiness() -> tuple[dict[str, DependencyHealth], bool, float]:
+    """
+    (dependencias, si vino de cache, antigüedad). Los chequeos corren en paralelo por el pool
+    async compartido y se cachean `health_cache_ttl_seconds`; probes concurrentes esperan la
+    misma corrida en lugar de lanzar otra.
+    """
+    global _readiness
+    cached = _fresh_readiness()
+    if cached is None:
+        async with _readiness_lock:
+            cached = _fresh_readiness()  # otro probe pudo recalcularla mientras esperábamos
+            if cached is None:
+                results = await asyncio.gather(*(_timed(name, check) for name, check in CHECKS.items()))
+                _readiness = (time.monotonic(), dict(zip(CHECKS, results)))
+                return _readiness[1], False, 0.0
+    return cached[1], True, time.monotonic() - cached[0]
+
+@router.get("/health/live", response_model=LivenessResponse)
+async def liveness():
+    # Sin I/O: sólo confirma que el event loop atiende
+    return LivenessResponse(status="ok", uptime_seconds=round(time.monotonic() - STARTED_AT, 1))
+
+@router.get("/health/ready", response_model=ReadinessResponse)
+async def readiness(response: Response):
+    dependencies, cached, age = await check_readiness()
+    ready = all(dep.status == "ok" for dep in dependencies.values())
+    if not ready:
+        response.status_code = 503
+    return ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        cached=cached,
+        age_seconds=round(age, 1),
+        dependencies=dependencies
+    )
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check():
+    dependencies, _, _ = await check_readiness()
+    db_status = "connected" if dependencies["database"].status == "ok" else "disconnected"
     return HealthResponse(status="ok", database=db_status)
@@ -0,0 +1,207 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, TypedDict
+import httpx
+from src.config.http_client import get_async_http_client
+from src.voice.interruption_handler import InterruptionHandler
+from src.voice.prompts import CIVETTA_BRIDE_PROMPT
+
+logger = logging.getLogger("realtime_sessions")
+
+REALTIME_MODEL = "gpt-4o-realtime-preview-2024-12-17"
+REALTIME_VOICE = "shimmer"  # shimmer is a warm feminine voice
+
+# Instrucciones estrictas para la voz de OpenAI
+VOICE_INSTRUCTIONS = (
+    CIVETTA_BRIDE_PROMPT +
+    "\n\nIMPORTANTE Y REGLAS ESTRICTAS DE VOZ:\n"
+    "- Tu voz debe sonar cálida, femenina y 100% como una hablante nativa de Español Latinoamericano.\n"
+    "- NUNCA suenes como una extranjera hablando español. Mantén una prosodia natural latina.\n"
+    "- Usa siempre español.\n"
+    "- Tienes acceso a la herramienta 'consultar_asesor_langgraph'. DEBES llamarla CADA VEZ que el usuario te haga una pregunta sobre productos, bodas, logística, etc. Devuelve datos del catálogo (producto, precio, tallas, color, descripción); responde con ellos de manera natural y conversacional, sin inventar nada que no esté ahí. Si trae 'message', síguelo."
+)
+
+REALTIME_TOOLS = [{
+    "type": "function",
+    "name": "consultar_asesor_langgraph",
+    "description": "Llama a esta herramienta cuando necesites buscar información de Civetta, conocer stock, precios, responder sobre bodas o vestidos, o cualquier pregunta del usuario. Nos pasará la respuesta oficial que debes decir.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "user_query": {"type": "string", "description": "La pregunta del usuario para consultar en la base de datos. Si se habla de un producto, incluye su nombre."}
+        },
+        "required": ["user_query"]
+    }
+}]
+
+
+class RealtimeSession(TypedDict):
+    client_secret: str
+    expires_at: float  # epoch en segundos
+
+
+def build_session_payload() -> dict:
+    return {
+        "model": REALTIME_MODEL,
+        "voice": REALTIME_VOICE,
+        "instructions": VOICE_INSTRUCTIONS,
+        # Barge-in de ~140ms con el Server VAD
+        "turn_detection": InterruptionHandler.get_realtime_vad_config(),
+        "tools": REALTIME_TOOLS,
+        "tool_choice": "auto"
+    }
+
+
+async def create_realtime_session(base_url: str, api_key: str, default_ttl_seconds: float = 60, timeout: float = 10.0) -> RealtimeSession:
+    """Crea una sesión efímera en /realtime/sessions con el cliente HTTP compartido."""
+    response = await get_async_http_client().post(
+        f"{base_url.rstrip('/')}/realtime/sessions",
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        json=build_session_payload(),
+        timeout=timeout
+    )
+    response.raise_for_status()
+    secret = response.json()["client_secret"]
+    return {
+        "client_secret": secret["value"],
+        "expires_at": float(secret.get("expires_at") or time.time() + default_ttl_seconds),
+    }
+
+
+class RealtimeSessionPool:
+    """
+    Pool de sesiones Realtime creadas de antemano para que /api/realtime-token responda al instante.
+    Un task de fondo mantiene `size` sesiones vigentes y descarta las que están por vencer
+    (las claves efímeras duran ~1 minuto). Si el pool está vacío se crea una en el momento.
+    Sin llamadas de voz durante `idle_seconds` el objetivo baja a `idle_size` (cada sesión creada
+    se paga aunque nadie la use); el próximo `acquire` lo vuelve a subir a `size`.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        size: int = 2,
+        refresh_margin_seconds: float = 15,
+        default_ttl_seconds: float = 60,
+        idle_seconds: float = 300,
+        idle_size: int = 0,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.size = size
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.default_ttl_seconds = default_ttl_seconds
+        self.idle_seconds = idle_seconds
+        self.idle_size = idle_size
+        self._sessions: deque[RealtimeSession] = deque()
+        self._refill = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_acquired = time.monotonic()
+        self.served_from_pool = 0
+        self.created_on_demand = 0
+        self.minted = 0
+        self.discarded = 0
+        self.errors = 0
+
+    def is_idle(self) -> bool:
+        return bool(self.idle_seconds) and time.monotonic() - self._last_acquired > self.idle_seconds
+
+    def target_size(self) -> int:
+        return min(self.idle_size, self.size) if self.is_idle() else self.size
+
+    def _usable(self, session: RealtimeSession) -> bool:
+        return session["expires_at"] - time.time() > self.refresh_margin_seconds
+
+    def _discard_expiring(self) -> None:
+        fresh = [s for s in self._sessions if self._usable(s)]
+        self.discarded += len(self._sessions) - len(fresh)
+        self._sessions = deque(fresh)
+
+    async def _mint(self) -> RealtimeSession:
+        return await create_realtime_session(self.base_url, self.api_key, self.default_ttl_seconds)
+
+    async def acquire(self) -> RealtimeSession:
+        """Entrega una sesión vigente del pool o, si no hay, la crea en el momento."""
+        self._discard_expiring()
+        self._last_acquired = time.monotonic()
+        self._refill.set()
+        if self._sessions:
+            self.served_from_pool += 1
+            # La más nueva: es la que más vida útil le queda al cliente
+            return self._sessions.pop()
+        self.created_on_demand += 1
+        return await self._mint()
+
+    async def fill(self) -> None:
+        self._discard_expiring()
+        missing = self.target_size() - len(self._sessions)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self._mint() for _ in range(missing)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                self.errors += 1
+                logger.warning(f"No se pudo crear una sesión Realtime de reserva: {result}")
+            else:
+                self.minted += 1
+                self._sessions.appendleft(result)
+        if any(isinstance(r, BaseException) for r in results):
+            raise RuntimeError("reposición incompleta del pool Realtime")
+
+    def _seconds_until_refresh(self) -> Optional[float]:
+        if len(self._sessions) < self.target_size():
+            return 0.0
+        if not self._sessions:
+            return None  # inactivo y vacío: se espera al próximo acquire
+        soonest = min(s["expires_at"] for s in self._sessions)
+        return max(soonest - self.refresh_margin_seconds - time.time(), 0.5)
+
+    async def _maintain_forever(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                await self.fill()
+                backoff = 1.0
+                wait = self._seconds_until_refresh()
+            except Exception:
+                wait = backoff
+                backoff = min(backoff * 2, 60.0)
+            self._refill.clear()
+            try:
+                await asyncio.wait_for(self._refill.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None and self.size > 0:
+            self._last_acquired = time.monotonic()  # arranca con el pool lleno durante `idle_seconds`
+            self._task = asyncio.create_task(self._maintain_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "available": len(self._sessions),
+            "size": self.size,
+            "target": self.target_size(),
+            "idle": self.is_idle(),
+            "served_from_pool": self.served_from_pool,
+            "created_on_demand": self.created_on_demand,
+            "minted": self.minted,
+            "discarded": self.discarded,
+            "errors": self.errors,
+        }
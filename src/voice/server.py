@@ -1,15 +1,34 @@
 import os
 import json
+import time
 import logging
 import asyncio
 import httpx
-from typing import List, Dict
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from contextlib import asynccontextmanager, aclosing, AsyncExitStack
+from typing import List, AsyncIterator, Any, Callable, Optional
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
-from src.agent.graph import graph
+from src.agent.graph import graph, compile_graph, generation_cache
+from src.rag.query_engine import refresh_product_index, use_vector_mirror, vector_mirror, embedding_cache, semantic_cache, product_index
+from src.config.settings import settings
+from src.database.pool import pool_manager
+from src.database.client import get_chat_checkpointer
+from src.database.write_behind import WriteBehindCheckpointer
+from src.config.http_client import get_async_http_client, warm_up_providers, close_http_clients
+from src.config.llm_factory import LLMFactory
+from src.agent.prompt_builder import warm_up_tokenizer, token_totals
+from src.config.metrics import stage_timer, register_stats, render_metrics, STAGE_SECONDS
+from src.config.tracing import start_trace, span, flight_recorder
+from src.agent.deadline import deadline_scope
 from src.voice.interruption_handler import InterruptionHandler
+from src.voice.session_store import SessionStore
+from src.voice.session_gate import SessionGate
+from src.voice.realtime_sessions import RealtimeSessionPool
+from src.voice.voice_tool import lookup_voice_facts, tool_sources
+from src.voice.admission import AdmissionController, Overloaded
 from src.voice.prompts import CIVETTA_BRIDE_PROMPT
 
 print("🔥 SERVER VOZ ULTRA-LOW LATENCY CARGADO 🔥")
@@ -17,7 +36,46 @@ print("🔥 SERVER VOZ ULTRA-LOW LATENCY CARGADO 🔥")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("voice_server")
 
-app = FastAPI()
+# Grafo de /chat: con el backend postgres se compila con el checkpointer (thread_id = session_id)
+chat_graph = graph
+chat_checkpointer: Optional[WriteBehindCheckpointer] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global chat_graph, chat_checkpointer
+    # Construimos el índice de productos antes de aceptar tráfico
+    try:
+        await refresh_product_index(force=True)
+    except Exception as e:
+        logger.error(f"No se pudo construir el índice de productos al iniciar: {e}")
+    if use_vector_mirror():
+        await vector_mirror.start()
+    # Clientes de LLM/embeddings y sus conexiones TLS listos antes del primer mensaje
+    await warm_up_providers()
+    try:
+        warm_up_tokenizer(LLMFactory.get_llm().model)
+    except Exception as e:
+        logger.error(f"No se pudo precargar el tokenizador: {e}")
+    # Sesiones Realtime listas para que la llamada de voz arranque sin esperar a OpenAI
+    if settings.openai_api_key:
+        realtime_pool.start()
+
+    async with AsyncExitStack() as stack:
+        if settings.chat_session_backend.lower() == "postgres":
+            try:
+                chat_checkpointer = await stack.enter_async_context(get_chat_checkpointer())
+                chat_graph = compile_graph(chat_checkpointer)
+            except Exception as e:
+                logger.error(f"Checkpointer de Postgres no disponible, /chat usa sesiones en memoria: {e}")
+        yield
+        # Al salir del stack se vacía la cola de checkpoints (antes de cerrar el pool)
+    chat_graph, chat_checkpointer = graph, None
+    await realtime_pool.stop()
+    await vector_mirror.stop()
+    await pool_manager.close()
+    await close_http_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,98 +86,347 @@ app.add_middleware(
 )
 
 from src.voice.health import router as health_router
+from src.voice.admin import router as admin_router
 app.include_router(health_router)
+app.include_router(admin_router)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    logger.warning(f"🚦 {exc.endpoint} al límite, se rechaza {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "El servicio está ocupado, intenta de nuevo en unos segundos."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 class ChatRequest(BaseModel):
     message: str
     session_id: str
 
-text_sessions: Dict[str, dict] = {}
+class VoiceToolRequest(BaseModel):
+    user_query: str
+    session_id: Optional[str] = None
+
+# Prompt de sistema de las sesiones de texto (compartido: el store no guarda una copia por sesión)
+TEXT_SESSION_PROMPT = CIVETTA_BRIDE_PROMPT + "\n\nIMPORTANTE: Responde SIEMPRE en español. Nunca uses inglés."
+
+text_sessions = SessionStore(
+    system_prompt=TEXT_SESSION_PROMPT,
+    max_sessions=settings.chat_session_max_sessions,
+    ttl_seconds=settings.chat_session_ttl_seconds,
+    max_bytes=settings.chat_session_max_bytes
+)
+
+class ClientConnection:
+    """
+    Conexión WebSocket con una cola de salida acotada que drena un task propio.
+    Si el cliente lee lento la cola se llena y el turno espera (backpressure sobre el stream
+    del LLM); si no drena en `send_timeout` segundos se lo desconecta.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, send_timeout: float):
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seen = time.monotonic()
+        self._sender = asyncio.create_task(self._send_forever())
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
+
+    async def send(self, payload: dict) -> None:
+        if self._sender.done():
+            raise WebSocketDisconnect(code=1006)
+        await asyncio.wait_for(self.outbox.put(payload), timeout=self.send_timeout)
+
+    async def _send_forever(self) -> None:
+        while True:
+            payload = await self.outbox.get()
+            await self.websocket.send_json(payload)
+
+    async def _heartbeat_forever(self, interval: float, idle_timeout: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_seen > idle_timeout:
+                await self.close(1001, "inactividad")
+                return
+            try:
+                self.outbox.put_nowait({"type": "ping"})
+            except asyncio.QueueFull:
+                pass  # la cola llena ya muestra que la conexión está en uso
+
+    def start_heartbeat(self, interval: float, idle_timeout: float) -> None:
+        if interval > 0:
+            self._heartbeat = asyncio.create_task(self._heartbeat_forever(interval, idle_timeout))
+
+    async def close(self, code: int, reason: str = "") -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass  # ya cerrada por el cliente
+
+    async def stop(self) -> None:
+        for task in (self._sender, self._heartbeat):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Conexiones WebSocket activas del worker, con un tope para no aceptar más de las que puede atender."""
+
+    def __init__(self, max_connections: int = 500):
+        self.active_connections: List[ClientConnection] = []
+        self.max_connections = max_connections
+        self.rejected = 0
+        self.slow_consumers = 0
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket) -> Optional[ClientConnection]:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        if len(self.active_connections) >= self.max_connections:
+            self.rejected += 1
+            # 1013 (Try Again Later): el cliente reintenta, idealmente contra otro worker
+            await websocket.close(code=1013, reason="servidor ocupado")
+            return None
+        connection = ClientConnection(websocket, settings.ws_send_queue_size, settings.ws_send_timeout_seconds)
+        connection.start_heartbeat(settings.ws_heartbeat_seconds, settings.ws_idle_timeout_seconds)
+        self.active_connections.append(connection)
+        return connection
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+    async def disconnect(self, connection: ClientConnection):
+        if connection in self.active_connections:
+            self.active_connections.remove(connection)
+        await connection.stop()
 
-manager = ConnectionManager()
+    def stats(self) -> dict:
+        return {
+            "active": len(self.active_connections),
+            "max_connections": self.max_connections,
+            "rejected": self.rejected,
+            "slow_consumers": self.slow_consumers,
+        }
+
+manager = ConnectionManager(max_connections=settings.ws_max_connections)
+session_gate = SessionGate()
+realtime_pool = RealtimeSessionPool(
+    base_url=settings.openai_api_base,
+    api_key=settings.openai_api_key or "",
+    size=settings.realtime_pool_size,
+    refresh_margin_seconds=settings.realtime_refresh_margin_seconds,
+    default_ttl_seconds=settings.realtime_session_ttl_seconds,
+    idle_seconds=settings.realtime_pool_idle_seconds,
+    idle_size=settings.realtime_pool_idle_size
+)
 interruption_handler = InterruptionHandler()
 
-async def process_user_message(agent_state: dict, user_text: str) -> (dict, str):
+# Control de admisión por endpoint (503 + Retry-After por encima del límite)
+chat_admission = AdmissionController(
+    "chat",
+    max_concurrent=settings.admission_chat_max_concurrent,
+    max_queue=settings.admission_chat_max_queue,
+    queue_timeout_seconds=settings.admission_chat_queue_timeout_seconds,
+    retry_after_seconds=settings.admission_retry_after_seconds
+)
+voice_tool_admission = AdmissionController(
+    "voice_tool",
+    max_concurrent=settings.admission_voice_tool_max_concurrent,
+    max_queue=settings.admission_voice_tool_max_queue,
+    queue_timeout_seconds=settings.admission_voice_tool_queue_timeout_seconds,
+    retry_after_seconds=settings.admission_retry_after_seconds
+)
+token_admission = AdmissionController(
+    "token",
+    max_concurrent=settings.admission_token_max_concurrent,
+    max_queue=settings.admission_token_max_queue,
+    queue_timeout_seconds=settings.admission_token_queue_timeout_seconds,
+    retry_after_seconds=settings.admission_retry_after_seconds
+)
+
+# Estado de caches, pool y sesiones en /metrics (se lee en cada scrape, sin costo por request)
+register_stats("db_pool", pool_manager.stats)
+register_stats("embedding_cache", embedding_cache.stats)
+register_stats("semantic_cache", semantic_cache.stats)
+register_stats("generation_cache", generation_cache.stats)
+register_stats("product_index", product_index.stats)
+register_stats("vector_mirror", vector_mirror.stats)
+register_stats("prompt_tokens", lambda: dict(token_totals))
+register_stats("text_sessions", text_sessions.stats)
+register_stats("chat_checkpointer", lambda: chat_checkpointer.stats() if chat_checkpointer is not None else {})
+register_stats("session_gate", session_gate.stats)
+register_stats("realtime_pool", realtime_pool.stats)
+register_stats("ws_connections", manager.stats)
+register_stats("voice_tool", lambda: dict(tool_sources))
+register_stats("flight_recorder", flight_recorder.stats)
+for _admission in (chat_admission, voice_tool_admission, token_admission):
+    register_stats(f"admission_{_admission.name}", _admission.stats)
+
+def _reply_from_state(final_state: dict) -> str:
+    all_messages = final_state.get("messages", [])
+    if all_messages and isinstance(all_messages[-1], AIMessage):
+        return all_messages[-1].content  # type: ignore[return-value]
+    return "Disculpa, dame un segundo para revisar eso."
+
+async def process_user_message(agent_state: dict, user_text: str, config: Optional[dict] = None) -> (dict, str):
     agent_state["messages"].append(HumanMessage(content=user_text))
     
     logger.info("🧠 Invoking LangGraph...")
-    # Idealmente en el futuro pasaremos esto a astream() para token-by-token.
-    final_state = await graph.ainvoke(agent_state)
+    with stage_timer("graph"):
+        final_state = await chat_graph.ainvoke(agent_state, config)
 
-    all_messages = final_state.get("messages", [])
-    if all_messages and isinstance(all_messages[-1], AIMessage):
-        ai_response_text = all_messages[-1].content
-    else:
-        ai_response_text = "Disculpa, dame un segundo para revisar eso."
+    return final_state, _reply_from_state(final_state)
+
+async def stream_user_message(agent_state: dict, user_text: str, config: Optional[dict] = None) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Igual que process_user_message pero token a token: emite ("token", str) a medida que
+    el LLM de consult_knowledge genera, y al final ("final", estado_final).
+    """
+    agent_state["messages"].append(HumanMessage(content=user_text))
+
+    logger.info("🧠 Streaming LangGraph...")
+    final_state = agent_state
+    started = time.perf_counter()
+    finished = started
+    consumer_seconds = 0.0  # tiempo suspendido en cada yield mientras quien consume procesa el token
+    with span("graph") as graph_span:
+        async for mode, chunk in chat_graph.astream(agent_state, config, stream_mode=["custom", "values"]):
+            if mode == "custom" and isinstance(chunk, dict) and "token" in chunk:
+                paused = time.perf_counter()
+                yield "token", chunk["token"]
+                consumer_seconds += time.perf_counter() - paused
+            elif mode == "values":
+                final_state = chunk
+                finished = time.perf_counter()
+        if graph_span is not None:
+            graph_span.set(consumer_ms=round(consumer_seconds * 1000, 2))
+    # Sólo el grafo: hasta el último chunk de valores, sin el tiempo que tarda el consumidor
+    STAGE_SECONDS.labels("graph").observe(max(finished - started - consumer_seconds, 0.0))
+
+    yield "final", final_state
+
+def _new_text_session() -> dict:
+    return {
+        "messages": [SystemMessage(content=TEXT_SESSION_PROMPT)],
+        "lopdp_consent": True,
+        "current_product_context": {}
+    }
+
+async def _load_session(session_id: str) -> tuple[dict, Optional[dict]]:
+    """
+    (estado de entrada, config) del turno. Con checkpointer sólo se envía lo nuevo:
+    el historial lo restaura LangGraph desde el checkpoint del hilo.
+    """
+    with stage_timer("session_load"):
+        if chat_checkpointer is not None:
+            config = {"configurable": {"thread_id": session_id}}
+            if await chat_checkpointer.aget_tuple(config) is None:
+                return _new_text_session(), config
+            return {"messages": []}, config
+        return text_sessions.get(session_id) or _new_text_session(), None
+
+def _save_session(session_id: str, final_state: dict) -> None:
+    # Con checkpointer el estado ya quedó guardado (cache local + escritura diferida)
+    if chat_checkpointer is None:
+        text_sessions.put(session_id, final_state)
+
+async def chat_turn(session_id: str, user_text: str) -> AsyncIterator[tuple[str, str]]:
+    """Turno de /chat sin streaming, con los mismos fragmentos que stream_chat_turn."""
+    with start_trace("chat", session_id=session_id, query=user_text[:200]), stage_timer("turn"):
+        agent_state, config = await _load_session(session_id)
+        final_state, reply = await process_user_message(agent_state, user_text, config)
+        _save_session(session_id, final_state)
+    yield "token", reply
+    yield "done", reply
+
+async def stream_chat_turn(session_id: str, user_text: str, endpoint: str = "chat_stream") -> AsyncIterator[tuple[str, str]]:
+    """
+    Turno de texto en streaming (/chat/stream y /ws/chat): ("token", fragmento)... y al final
+    ("done", respuesta completa).
+    """
+    streamed = False
+    started = time.perf_counter()
+    with start_trace(endpoint, session_id=session_id, query=user_text[:200]):
+        agent_state, config = await _load_session(session_id)
+        async for kind, payload in stream_user_message(agent_state, user_text, config):
+            if kind == "token":
+                streamed = True
+                yield "token", payload
+            else:
+                _save_session(session_id, payload)
+                reply = _reply_from_state(payload)
+                # Respuestas sin LLM (saludo, índice de productos): se envían en un solo fragmento
+                if not streamed:
+                    yield "token", reply
+                STAGE_SECONDS.labels("turn").observe(time.perf_counter() - started)
+                yield "done", reply
+
+async def open_chat_turn(session_id: str, user_text: str, make_turn: Callable[[], AsyncIterator[tuple[str, str]]]) -> AsyncIterator[tuple[str, str]]:
+    """
+    Abre el turno de texto de la sesión y devuelve sus fragmentos. Un turno a la vez por sesión;
+    el mismo mensaje repetido mientras está en vuelo (por /chat, /chat/stream o /ws/chat) sigue
+    el turno existente sin tomar cupo. Si no, el cupo de /chat se toma acá, antes de que el
+    endpoint responda (Overloaded -> 503), y lo libera el turno al terminar.
+    Llamar dentro del deadline_scope del request: el turno hereda el plazo.
+    """
+    if session_gate.is_inflight(session_id, user_text):
+        return session_gate.stream_once(session_id, user_text, make_turn)
+
+    await chat_admission.acquire()
+    opened = False
+
+    async def admitted_turn() -> AsyncIterator[tuple[str, str]]:
+        try:
+            async with aclosing(make_turn()) as turn:  # type: ignore[type-var]
+                async for item in turn:
+                    yield item
+        finally:
+            chat_admission.release()
+
+    def start() -> AsyncIterator[tuple[str, str]]:
+        nonlocal opened
+        opened = True
+        return admitted_turn()
+
+    fragments = session_gate.stream_once(session_id, user_text, start)
+    if not opened:
+        # Otro request idéntico abrió el turno mientras éste esperaba el cupo
+        chat_admission.release()
+    return fragments
 
-    return final_state, ai_response_text
+def _ws_message_text(raw: str) -> str:
+    """Texto del mensaje del cliente: {"message": "..."} o texto plano. Los pong quedan vacíos."""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return raw.strip()
+    if isinstance(data, dict):
+        return str(data.get("message") or "").strip()
+    return str(data).strip()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/metrics")
+async def metrics():
+    # Formato de exposición de Prometheus (histogramas por etapa, tokens, rutas y stats de componentes)
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 @app.get("/api/realtime-token")
 async def get_realtime_token():
-    openai_api_key = os.environ.get("OPENAI_API_KEY")
-    if not openai_api_key:
+    if not settings.openai_api_key:
         logger.error("OPENAI_API_KEY no encontrada en variables de entorno")
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY no configurada.")
 
-    # Instrucciones estrictas para la voz de OpenAI
-    voice_instructions = (
-        CIVETTA_BRIDE_PROMPT + 
-        "\n\nIMPORTANTE Y REGLAS ESTRICTAS DE VOZ:\n"
-        "- Tu voz debe sonar cálida, femenina y 100% como una hablante nativa de Español Latinoamericano.\n"
-        "- NUNCA suenes como una extranjera hablando español. Mantén una prosodia natural latina.\n"
-        "- Usa siempre español.\n"
-        "- Tienes acceso a la herramienta 'consultar_asesor_langgraph'. DEBES llamarla CADA VEZ que el usuario te haga una pregunta sobre productos, bodas, logística, etc. para obtener la respuesta oficial de la base de conocimientos, y luego debes repetir esa respuesta de manera natural conversacional."
-    )
-
-    async with httpx.AsyncClient() as client:
+    async with token_admission.admit():
         try:
-            response = await client.post(
-                "https://api.openai.com/v1/realtime/sessions",
-                headers={
-                    "Authorization": f"Bearer {openai_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o-realtime-preview-2024-12-17",
-                    "voice": "shimmer", # shimmer is a warm feminine voice
-                    "instructions": voice_instructions,
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,
-                        "prefix_padding_ms": 300,
-                        "silence_duration_ms": 140 # Barge-in threshold requested: 140ms
-                    },
-                    "tools": [{
-                        "type": "function",
-                        "name": "consultar_asesor_langgraph",
-                        "description": "Llama a esta herramienta cuando necesites buscar información de Civetta, conocer stock, precios, responder sobre bodas o vestidos, o cualquier pregunta del usuario. Nos pasará la respuesta oficial que debes decir.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "user_query": {"type": "string", "description": "La frase exacta o pregunta que hizo el usuario para consultar en la base de datos."}
-                            },
-                            "required": ["user_query"]
-                        }
-                    }],
-                    "tool_choice": "auto"
-                },
-                timeout=10.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            return {"client_secret": data["client_secret"]["value"]}
+            # Sesión creada de antemano por el pool (o en el momento si no quedan vigentes)
+            with stage_timer("realtime_token"):
+                session = await realtime_pool.acquire()
+            return {"client_secret": session["client_secret"]}
         except httpx.HTTPStatusError as e:
             logger.error(f"Error de API de OpenAI: {e.response.text}")
             raise HTTPException(status_code=e.response.status_code, detail=f"Error conectando con OpenAI: {e.response.text}")
@@ -127,23 +434,101 @@ async def get_realtime_token():
             logger.error(f"Error creando sesión realtime: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/voice/tool")
+async def voice_tool(req: VoiceToolRequest):
+    """
+    Resultado de `consultar_asesor_langgraph` durante la llamada: fichas compactas del catálogo
+    (producto, precio, tallas, color, descripción breve) sin pasar por el grafo ni por el LLM.
+    """
+    # El plazo cuenta desde que llega el request: la espera en la cola descuenta del presupuesto
+    with deadline_scope(settings.voice_tool_timeout_seconds):
+        async with voice_tool_admission.admit():
+            with start_trace("voice_tool", session_id=req.session_id, query=req.user_query[:200]), stage_timer("voice_tool"):
+                return await lookup_voice_facts(req.user_query, session_id=req.session_id)
+
 @app.post("/chat")
 async def chat_text(req: ChatRequest):
     session_id = req.session_id
     user_text = req.message
 
-    if session_id not in text_sessions:
-        text_sessions[session_id] = {
-            "messages": [SystemMessage(content=CIVETTA_BRIDE_PROMPT + "\n\nIMPORTANTE: Responde SIEMPRE en español. Nunca uses inglés.")],
-            "lopdp_consent": True,
-            "current_product_context": {}
-        }
-
-    agent_state = text_sessions[session_id]
-    final_state, ai_response_text = await process_user_message(agent_state, user_text)
-    text_sessions[session_id] = final_state
+    ai_response_text = ""
+    with deadline_scope(settings.chat_deadline_seconds):
+        fragments = await open_chat_turn(session_id, user_text, lambda: chat_turn(session_id, user_text))
+    async with aclosing(fragments) as turn:  # type: ignore[type-var]
+        async for kind, payload in turn:
+            if kind == "done":
+                ai_response_text = payload
 
     return {"reply": ai_response_text}
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Igual que /chat pero por Server-Sent Events:
+    `event: token` con cada fragmento de la respuesta y `event: done` con la respuesta completa.
+    El estado de la sesión se guarda cuando el stream termina.
+    """
+    session_id = req.session_id
+    # El cupo se toma antes de enviar los headers: sin lugar (ni en la cola) responde 503 con
+    # Retry-After; el turno lo libera al terminar
+    with deadline_scope(settings.chat_deadline_seconds):
+        fragments = await open_chat_turn(session_id, req.message, lambda: stream_chat_turn(session_id, req.message))
+
+    async def event_source():
+        try:
+            async with aclosing(fragments) as turn:  # type: ignore[type-var]
+                async for kind, payload in turn:
+                    yield _sse(kind, {"token": payload} if kind == "token" else {"reply": payload})
+        except Exception as e:
+            logger.error(f"Error en /chat/stream: {e}")
+            yield _sse("error", {"detail": "Disculpa, hubo un problema al generar la respuesta."})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/chat/{session_id}")
+async def chat_ws(websocket: WebSocket, session_id: str):
+    """
+    Chat de texto por una conexión persistente. El cliente envía {"message": "..."} (o texto plano)
+    y recibe {"type": "token", "token"} con cada fragmento y {"type": "done", "reply"} al terminar.
+    Cada `ws_heartbeat_seconds` el servidor envía {"type": "ping"}; cualquier mensaje del cliente
+    (p. ej. {"type": "pong"}) cuenta como actividad.
+    """
+    connection = await manager.connect(websocket)
+    if connection is None:
+        return
+
+    try:
+        while True:
+            user_text = _ws_message_text(await websocket.receive_text())
+            connection.touch()
+            if not user_text:
+                continue
+            try:
+                with deadline_scope(settings.chat_deadline_seconds):
+                    fragments = await open_chat_turn(session_id, user_text, lambda: stream_chat_turn(session_id, user_text, endpoint="ws_chat"))
+                async with aclosing(fragments) as turn:  # type: ignore[type-var]
+                    async for kind, payload in turn:
+                        connection.touch()
+                        await connection.send({"type": kind, "token": payload} if kind == "token" else {"type": kind, "reply": payload})
+            except (WebSocketDisconnect, asyncio.TimeoutError):
+                raise
+            except Overloaded as e:
+                await connection.send({"type": "error", "detail": "El servicio está ocupado, intenta de nuevo en unos segundos.", "retry_after": e.retry_after})
+            except Exception as e:
+                logger.error(f"Error en /ws/chat: {e}")
+                await connection.send({"type": "error", "detail": "Disculpa, hubo un problema al generar la respuesta."})
+    except asyncio.TimeoutError:
+        manager.slow_consumers += 1
+        logger.warning(f"Cliente de /ws/chat {session_id} no consume la respuesta, se cierra la conexión")
+        await connection.close(1008, "cliente lento")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.disconnect(connection)
+
 
 
@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import asynccontextmanager, aclosing
+from typing import Any, AsyncIterator, Callable, Optional
+
+
+class _SharedTurn:
+    """Turno en vuelo: lo emitido hasta ahora y si terminó. Cada request lo lee desde el principio."""
+
+    __slots__ = ("items", "done", "error", "changed", "task")
+
+    def __init__(self):
+        self.items: list[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def push(self, item: Any) -> None:
+        self.items.append(item)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done, self.error = True, error
+        self._notify()
+
+
+class SessionGate:
+    """
+    Serializa los turnos de una misma sesión y coalesce mensajes idénticos en vuelo.
+
+    - `lock(session_id)`: un turno a la vez por sesión (el estado se lee, se actualiza y se guarda
+      sin que otro request lo pise). Los locks se liberan cuando nadie los espera.
+    - `stream_once(session_id, message, turn)`: si el mismo mensaje de la misma sesión ya se está
+      procesando (doble click, reintento del cliente, /chat y /ws/chat a la vez), el request sigue
+      ese turno (desde el primer fragmento) en lugar de ejecutar el grafo y el LLM otra vez.
+      El turno corre en su propio task: si el request que lo originó se cancela o el cliente se
+      desconecta, los demás lo siguen recibiendo y el estado de la sesión se guarda igual.
+    """
+
+    def __init__(self):
+        # session_id -> [lock, cantidad de requests que lo usan o esperan]
+        self._locks: dict[str, list] = {}
+        self._inflight: dict[tuple[str, str], _SharedTurn] = {}
+        self.coalesced = 0
+        self.serialized = 0  # turnos que tuvieron que esperar a otro de la misma sesión
+
+    @staticmethod
+    def _message_key(message: str) -> str:
+        return " ".join(message.split()).lower()
+
+    def is_inflight(self, session_id: str, message: str) -> bool:
+        return (session_id, self._message_key(message)) in self._inflight
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        if entry[0].locked():
+            self.serialized += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(session_id, None)
+
+    def stream_once(self, session_id: str, message: str, turn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Fragmentos del turno `turn()` para este mensaje, compartido con los requests idénticos en vuelo."""
+        key = (session_id, self._message_key(message))
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = _SharedTurn()
+            self._inflight[key] = shared
+            # turn() se llama acá (sin ejecutar nada todavía): quien llama sabe si abrió el turno.
+            # create_task copia el contexto: el turno hereda plazo y traza del request que lo origina
+            shared.task = asyncio.create_task(self._produce(key, shared, turn()))
+        else:
+            self.coalesced += 1
+        return self._follow(shared)
+
+    async def _produce(self, key: tuple[str, str], shared: _SharedTurn, items: AsyncIterator[Any]) -> None:
+        error: Optional[BaseException] = None
+        try:
+            async with aclosing(items):  # type: ignore[type-var]
+                async with self.lock(key[0]):
+                    async for item in items:
+                        shared.push(item)
+        except asyncio.CancelledError:
+            # Apagado del servidor: los seguidores reciben un error propio, no la cancelación
+            # de otro task; la cancelación sigue su curso en este
+            error = RuntimeError("turno cancelado")
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+            shared.finish(error)
+
+    @staticmethod
+    async def _follow(shared: _SharedTurn) -> AsyncIterator[Any]:
+        # Cancelar a un seguidor sólo deja de leer; el task del turno sigue
+        index = 0
+        while True:
+            while index < len(shared.items):
+                yield shared.items[index]
+                index += 1
+            if shared.done:
+                if shared.error is not None:
+                    raise shared.error
+                return
+            await shared.changed.wait()
+
+    def stats(self) -> dict:
+        return {
+            "sessions_locked": len(self._locks),
+            "inflight": len(self._inflight),
+            "coalesced": self.coalesced,
+            "serialized": self.serialized,
+        }
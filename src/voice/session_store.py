@@ -0,0 +1,126 @@
+import sys
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+
+# Tipo de mensaje -> letra usada en la forma compacta
+_KINDS = {HumanMessage: "h", AIMessage: "a", SystemMessage: "s"}
+_CLASSES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+
+# Costo fijo aproximado por sesión (claves, tuplas, entrada del OrderedDict)
+SESSION_OVERHEAD_BYTES = 512
+
+
+class SessionStore:
+    """
+    Sesiones de /chat en memoria con desalojo LRU, TTL por inactividad y un tope aproximado en bytes.
+    Cada sesión se guarda compacta: los mensajes como tuplas (tipo, texto) y sin el prompt de sistema
+    de la sesión, que es igual para todas y se vuelve a agregar al leer.
+    """
+
+    def __init__(self, system_prompt: str, max_sessions: int = 10000, ttl_seconds: float = 3600, max_bytes: int = 64_000_000):
+        self.system_prompt = system_prompt
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # session_id -> (último acceso, bytes aproximados, estado compacto)
+        self._entries: "OrderedDict[str, tuple[float, int, tuple]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"lru": 0, "ttl": 0, "bytes": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    # --- Forma compacta ---
+    def _pack(self, state: dict) -> tuple[tuple, int]:
+        messages = []
+        size = SESSION_OVERHEAD_BYTES
+        for msg in state.get("messages", []):
+            content = msg.content if isinstance(msg.content, str) else json.dumps(msg.content, ensure_ascii=False)
+            if isinstance(msg, SystemMessage) and content == self.system_prompt:
+                content = None  # compartido: no se guarda una copia por sesión
+            messages.append((_KINDS.get(type(msg), "h"), content))
+            size += 64 + (sys.getsizeof(content) if content else 0)
+
+        extras = {k: v for k, v in state.items() if k != "messages"}
+        size += len(json.dumps(extras, ensure_ascii=False, default=str))
+        return (tuple(messages), extras), size
+
+    def _unpack(self, packed: tuple) -> dict:
+        messages, extras = packed
+        state = json.loads(json.dumps(extras, default=str))  # copia: el grafo muta el estado
+        state["messages"] = [
+            _CLASSES[kind](content=self.system_prompt if content is None else content)
+            for kind, content in messages
+        ]
+        return state
+
+    # --- API ---
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        last_access, size, packed = entry
+        if self.ttl_seconds and time.monotonic() - last_access > self.ttl_seconds:
+            self._remove(session_id, "ttl")
+            self.misses += 1
+            return None
+
+        self._entries[session_id] = (time.monotonic(), size, packed)
+        self._entries.move_to_end(session_id)
+        self.hits += 1
+        return self._unpack(packed)
+
+    def put(self, session_id: str, state: dict) -> None:
+        packed, size = self._pack(state)
+        previous = self._entries.pop(session_id, None)
+        if previous is not None:
+            self.bytes -= previous[1]
+        self._entries[session_id] = (time.monotonic(), size, packed)
+        self.bytes += size
+        self._evict()
+
+    def delete(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _remove(self, session_id: str, reason: str) -> None:
+        self.delete(session_id)
+        self.evictions[reason] += 1
+
+    def _evict(self) -> None:
+        # El orden LRU coincide con el de último acceso: las vencidas están al principio
+        now = time.monotonic()
+        while self._entries:
+            oldest_id, (last_access, _, _) = next(iter(self._entries.items()))
+            if self.ttl_seconds and now - last_access > self.ttl_seconds:
+                self._remove(oldest_id, "ttl")
+            elif len(self._entries) > self.max_sessions:
+                self._remove(oldest_id, "lru")
+            elif self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(oldest_id, "bytes")
+            else:
+                break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": dict(self.evictions),
+        }
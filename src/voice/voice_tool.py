@@ -0,0 +1,118 @@
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Optional, TypedDict
+from src.config.settings import settings
+from src.rag.product_index import ProductRecord, parse_product_block
+from src.rag.query_engine import product_index, refresh_product_index, embed_query_async, retrieve_async
+from src.agent.graph import extract_search_filters
+from src.agent.deadline import remaining_seconds
+from src.config.tracing import annotate
+
+logger = logging.getLogger("voice_tool")
+
+# Respuestas de la herramienta por origen: index, retrieval, empty, timeout, error
+tool_sources: Counter = Counter()
+
+FALLBACK_MESSAGE = (
+    "No pude confirmar ese dato en este momento. Dile a la clienta que lo verificas "
+    "y ofrécele continuar por WhatsApp con una asesora."
+)
+EMPTY_MESSAGE = "No hay información de eso en el catálogo de Civetta. Ofrece consultar con una asesora."
+
+
+class ProductFacts(TypedDict, total=False):
+    name: str
+    category: str
+    price: str
+    sizes: list[str]
+    color: str
+    fabric: str
+    description: str
+
+
+class VoiceToolResult(TypedDict, total=False):
+    success: bool
+    source: str
+    products: list[ProductFacts]
+    notes: list[str]  # fragmentos que no son fichas de producto (envíos, cambios, etc.)
+    message: str
+    elapsed_ms: float
+
+
+def _short(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def _facts(record: ProductRecord) -> ProductFacts:
+    """Ficha compacta para que el modelo de voz la diga con sus palabras."""
+    facts: ProductFacts = {"name": record["name"]}
+    for field in ("category", "price", "sizes", "color", "fabric"):
+        if record.get(field):
+            facts[field] = record[field]  # type: ignore[literal-required]
+    if record.get("description"):
+        facts["description"] = _short(record["description"], settings.voice_tool_description_chars)
+    return facts
+
+
+async def _lookup(query: str) -> VoiceToolResult:
+    # Producto nombrado en la consulta: ficha directa del índice, sin OpenAI ni Postgres
+    if settings.product_index_enabled:
+        try:
+            await refresh_product_index()
+        except Exception as e:
+            logger.warning(f"Error actualizando índice de productos: {e}")
+        record = product_index.match(query)
+        if record is not None:
+            return {"success": True, "source": "index", "products": [_facts(record)]}
+
+    filters = extract_search_filters(query)
+    embedding = await embed_query_async(query)
+    rows = await retrieve_async(embedding, limit=settings.voice_tool_max_products, query_text=query, filters=filters or None)
+
+    products: list[ProductFacts] = []
+    notes: list[str] = []
+    for row in rows:
+        record = parse_product_block(row["content"])
+        if record is not None:
+            products.append(_facts(record))
+        else:
+            notes.append(_short(row["content"], settings.voice_tool_note_chars))
+
+    if not products and not notes:
+        return {"success": True, "source": "empty", "products": [], "message": EMPTY_MESSAGE}
+    result: VoiceToolResult = {"success": True, "source": "retrieval", "products": products}
+    if notes:
+        result["notes"] = notes
+    return result
+
+
+async def lookup_voice_facts(query: str, session_id: Optional[str] = None) -> VoiceToolResult:
+    """
+    Datos del catálogo para la herramienta `consultar_asesor_langgraph` de la llamada de voz.
+    Sólo recuperación (sin nodo de consentimiento ni LLM de redacción: el modelo de voz ya
+    reformula) y con presupuesto de latencia estricto; si se pasa, responde el fallback.
+    """
+    started = time.perf_counter()
+    budget = settings.voice_tool_timeout_seconds
+    remaining = remaining_seconds()
+    if remaining is not None:
+        budget = max(min(budget, remaining), 0.0)
+    try:
+        result = await asyncio.wait_for(_lookup(query), timeout=budget)
+    except asyncio.TimeoutError:
+        logger.warning(f"Herramienta de voz superó {budget:.2f}s: {query!r}")
+        result = {"success": False, "source": "timeout", "products": [], "message": FALLBACK_MESSAGE}
+    except Exception as e:
+        logger.error(f"Error en la herramienta de voz: {e}")
+        result = {"success": False, "source": "error", "products": [], "message": FALLBACK_MESSAGE}
+
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    tool_sources[result["source"]] += 1
+    annotate(source=result["source"], products=[p["name"] for p in result.get("products", [])])
+    logger.info(f"🎙️ Herramienta de voz ({session_id or '-'}): {result['source']} en {result['elapsed_ms']} ms")
+    return result
@@ -0,0 +1,67 @@
+import asyncio
+
+from src.config.settings import settings
+from src.agent.graph import INTENT_RULES, IntentRouter, intent_router
+from src.rag import query_engine
+
+def status(ok, label):
+    print(f"STATUS: {'PASS' if ok else 'FAIL'} ({label})")
+
+def test_classification():
+    cases = [
+        ("Hola", {"greeting"}),
+        ("acepto", {"consent"}),
+        ("hola, acepto", {"greeting", "consent"}),
+        ("¿cuánto cuesta la bata aurora?", {"price"}),
+        ("y qué tallas tiene?", {"sizes"}),
+        ("vale, gracias", set()),
+        ("¿cuánto vale esa?", {"price", "reference"}),
+        ("quiero ver otra cosa", {"theme_change"}),
+        ("¿qué me recomiendas para la noche de bodas?", {"open_ended"}),
+        ("¿cuál es más barata?", {"open_ended"}),
+        ("¿cuál tiene mejor precio, la bata o el pijama?", {"open_ended", "price"}),
+    ]
+    for text, expected in cases:
+        intents = intent_router.route(text)
+        status(intents == expected, f"{text!r} -> {sorted(intents)}")
+
+    # Plantillas: sólo con una intención y un mensaje corto
+    status(intent_router.template_for(intent_router.route("Hola"), "Hola") is not None, "saludo corto usa plantilla")
+    long_greeting = "hola, busco una bata"
+    status(intent_router.template_for(intent_router.route(long_greeting), long_greeting) is None, "saludo con pedido va al flujo completo")
+    both = "hola, acepto"
+    status(intent_router.template_for(intent_router.route(both), both) is None, "dos intenciones no usan plantilla")
+
+    # register reemplaza la regla del mismo nombre sin tocar las demás
+    router = IntentRouter(INTENT_RULES)
+    router.register({"name": "greeting", "pattern": r"^\s*buenas\b", "template": "¡Buenas!"})
+    status(router.route("hola") == set() and router.route("buenas") == {"greeting"}, "register reemplaza la regla")
+    status(router.template_for({"greeting"}, "buenas") == ("greeting", "¡Buenas!"), "register reemplaza la plantilla")
+
+async def test_open_ended_bypass():
+    # Índice desde el archivo del catálogo; la búsqueda completa se reemplaza por una que registra la llamada
+    settings.product_index_source = "file"
+    settings.semantic_cache_enabled = False
+    searched = []
+
+    async def fake_embed(text):
+        return [0.0]
+
+    async def fake_search(search_term, query_embedding, current_product, filters=None):
+        searched.append(search_term)
+        return {"answer": "contexto recuperado", "context": {}}
+
+    query_engine.embed_query_async = fake_embed
+    query_engine._search_and_answer = fake_search
+
+    query = "¿cuánto cuesta la bata aurora?"
+    result = await query_engine.rag_search(query, intents=intent_router.route(query))
+    status(result.get("direct") is True and not searched, "consulta puntual responde desde el índice")
+
+    query = "¿cuál tiene mejor precio, la bata aurora o el pijama?"
+    intents = intent_router.route(query)
+    result = await query_engine.rag_search(query, intents=intents)
+    status("open_ended" in intents and not result.get("direct") and searched == [query], "pregunta abierta salta el índice")
+
+test_classification()
+asyncio.run(test_open_ended_bypass())
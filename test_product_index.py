@@ -0,0 +1,51 @@
+from src.rag.product_index import ProductIndex
+
+# Segunda bata con el mismo inicio de nombre: "la bata aurora" deja de ser un único producto
+EXTRA_PRODUCT = """
+---
+PRODUCTO: Bata Aurora Clásica
+CATEGORÍA: Bata
+TELA: Algodón
+COLOR: Rosa palo
+PRECIO: $29.99
+TALLAS: S, M
+"""
+
+def status(ok, label):
+    print(f"STATUS: {'PASS' if ok else 'FAIL'} ({label})")
+
+def test_product_index():
+    with open("data/catalogo.txt", "r", encoding="utf-8") as f:
+        catalog = f.read()
+
+    index = ProductIndex()
+    index.build_from_text(catalog, version="test")
+    print(f"Índice: {index.stats()}")
+
+    # 1. Coincidencia única: el nombre aunque venga sin tildes ni completo
+    product = index.match("cuánto cuesta la bata aurora?")
+    status(product is not None and product["name"] == "Bata Aurora Bridal", "coincidencia única")
+    result = index.answer("cuánto cuesta la bata aurora?")
+    print(f"Respuesta: {result and result['answer']}")
+    status(result is not None and "$39.99" in result["answer"], "precio del producto nombrado")
+
+    # 2. Ambigüedad: dos productos igual de probables -> None y el flujo completo decide
+    ambiguous = ProductIndex()
+    ambiguous.build_from_text(catalog + EXTRA_PRODUCT, version="test")
+    status(ambiguous.match("cuánto cuesta la bata aurora?") is None, "coincidencia ambigua devuelve None")
+    status(ambiguous.answer("cuánto cuesta la bata aurora?") is None, "consulta ambigua no se responde directo")
+    status(ambiguous.match("bata aurora clásica")["name"] == "Bata Aurora Clásica", "nombre exacto desambigua")
+
+    # 3. Seguimiento sobre el producto anclado en la conversación
+    result = index.answer("y qué tallas tiene?", current_product="Bata Aurora Bridal")
+    print(f"Respuesta: {result and result['answer']}")
+    status(result is not None and "M y L" in result["answer"], "tallas del producto anclado")
+    status(result is not None and result["context"]["product_name"] == "Bata Aurora Bridal", "contexto del producto anclado")
+
+    # 4. El anclado no responde por otro valor ni por preguntas sin atributo
+    status(index.answer("y la tienen en talla S?", current_product="Bata Aurora Bridal") is None, "talla que el anclado no tiene")
+    status(index.answer("tienen algo en blanco?", current_product="Bata Aurora Bridal") is None, "color de otro producto")
+    status(index.answer("qué me recomiendas?", current_product="Bata Aurora Bridal") is None, "consulta sin atributo")
+    print(f"Índice: {index.stats()}")
+
+test_product_index()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.voice.realtime_sessions import RealtimeSessionPool
+
+# Endpoint local que imita POST /realtime/sessions: claves efímeras de TTL segundos
+TTL = 3.0
+MARGIN = 1.0
+minted = []
+
+class FakeRealtimeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        secret = {"value": f"ek_test_{len(minted)}", "expires_at": time.time() + TTL}
+        minted.append(secret["value"])
+        body = json.dumps({"client_secret": secret}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def status(ok, label):
+    print(f"STATUS: {'PASS' if ok else 'FAIL'} ({label})")
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return condition()
+
+async def test_realtime_pool():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRealtimeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    print(f"Fake Realtime endpoint at {base_url}")
+
+    pool = RealtimeSessionPool(base_url, "sk-test", size=2, refresh_margin_seconds=MARGIN, idle_seconds=4, idle_size=0)
+    pool.start()
+    try:
+        # 1. Refill: el pool se llena solo al arrancar
+        filled = await wait_until(lambda: pool.stats()["available"] == 2)
+        print(f"Pool: {pool.stats()}")
+        status(filled, "pool lleno al arrancar")
+
+        # 2. Orden de acquire: se entrega la más nueva (la que más vida útil tiene)
+        await asyncio.sleep(0.2)
+        pool._sessions[0]["expires_at"] -= 0.1  # la más vieja vence antes
+        newest = max(pool._sessions, key=lambda s: s["expires_at"])
+        session = await pool.acquire()
+        status(session["client_secret"] == newest["client_secret"], "acquire entrega la sesión más nueva")
+        refilled = await wait_until(lambda: pool.stats()["available"] == 2)
+        status(refilled, "se repone tras acquire")
+
+        # 3. Vencimiento: las que entran al margen se descartan y se reemplazan
+        before = set(s["client_secret"] for s in pool._sessions)
+        replaced = await wait_until(lambda: pool.stats()["discarded"] >= 2 and len(pool._sessions) == 2 and not before & set(s["client_secret"] for s in pool._sessions), timeout=TTL + 2)
+        print(f"Pool: {pool.stats()}")
+        status(replaced, "sesiones por vencer descartadas y repuestas")
+        status(all(s["expires_at"] - time.time() > MARGIN for s in pool._sessions), "todas las disponibles fuera del margen")
+
+        # 4. Sin llamadas: el objetivo baja a idle_size y deja de crear sesiones
+        drained = await wait_until(lambda: pool.is_idle() and pool.stats()["available"] == 0, timeout=10)
+        count = len(minted)
+        await asyncio.sleep(TTL)
+        print(f"Pool: {pool.stats()}")
+        status(drained and len(minted) == count, "inactivo: no crea sesiones")
+
+        # 5. Una llamada despierta el pool: sesión en el momento y vuelve a `size`
+        session = await pool.acquire()
+        woke = await wait_until(lambda: pool.stats()["available"] == 2)
+        print(f"Pool: {pool.stats()}")
+        status(bool(session["client_secret"]) and woke and pool.stats()["created_on_demand"] == 1, "acquire tras inactividad repone el pool")
+    finally:
+        await pool.stop()
+        server.shutdown()
+
+asyncio.run(test_realtime_pool())
@@ -0,0 +1,70 @@
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.voice.session_store import SessionStore
+
+SYSTEM_PROMPT = "Eres Sofía, asesora de Civetta."
+
+def status(ok, label):
+    print(f"STATUS: {'PASS' if ok else 'FAIL'} ({label})")
+
+def session_state(text: str) -> dict:
+    return {
+        "messages": [SystemMessage(content=SYSTEM_PROMPT), HumanMessage(content=text), AIMessage(content=f"Respuesta a {text}")],
+        "current_product_context": {"product_name": "Bata Aurora Bridal"},
+    }
+
+def test_session_store():
+    # 1. Ida y vuelta: el prompt compartido no se guarda por sesión pero vuelve al leer
+    store = SessionStore(SYSTEM_PROMPT, max_sessions=10)
+    store.put("s1", session_state("hola"))
+    state = store.get("s1")
+    status(state is not None and state["messages"][0].content == SYSTEM_PROMPT and state["messages"][1].content == "hola", "estado recuperado completo")
+    state["current_product_context"]["product_name"] = "otro"
+    status(store.get("s1")["current_product_context"]["product_name"] == "Bata Aurora Bridal", "get devuelve una copia")
+
+    # 2. LRU: al pasar max_sessions sale la sesión usada hace más tiempo
+    store = SessionStore(SYSTEM_PROMPT, max_sessions=2)
+    store.put("a", session_state("a"))
+    store.put("b", session_state("b"))
+    store.get("a")  # "a" pasa a ser la más reciente
+    store.put("c", session_state("c"))
+    print(f"Store: {store.stats()}")
+    status("b" not in store and "a" in store and "c" in store, "LRU desaloja la menos usada")
+    status(store.stats()["evictions"]["lru"] == 1, "desalojo LRU contado")
+
+    # 3. TTL: la sesión inactiva vence al leerla y al escribir otras
+    store = SessionStore(SYSTEM_PROMPT, ttl_seconds=0.2)
+    store.put("old", session_state("old"))
+    store.put("idle", session_state("idle"))
+    time.sleep(0.3)
+    status(store.get("old") is None, "sesión vencida no se devuelve")
+    store.put("new", session_state("new"))
+    print(f"Store: {store.stats()}")
+    status("idle" not in store and "new" in store and store.stats()["evictions"]["ttl"] == 2, "put desaloja las vencidas")
+
+    # 4. Tope de bytes: se desalojan las más viejas hasta quedar bajo el tope, nunca la última
+    one = SessionStore(SYSTEM_PROMPT)
+    one.put("x", session_state("x" * 1000))
+    size = one.bytes
+    store = SessionStore(SYSTEM_PROMPT, max_bytes=int(size * 2.5))
+    for sid in ("x", "y", "z"):
+        store.put(sid, session_state(sid * 1000))
+    print(f"Store: {store.stats()}")
+    status("x" not in store and "y" in store and "z" in store and store.bytes <= store.max_bytes, "tope de bytes desaloja la más vieja")
+    status(store.stats()["evictions"]["bytes"] == 1, "desalojo por bytes contado")
+    store = SessionStore(SYSTEM_PROMPT, max_bytes=1)
+    store.put("big", session_state("big" * 1000))
+    status("big" in store, "una sesión sola sobre el tope se conserva")
+
+    # 5. Reescribir una sesión reemplaza su tamaño en lugar de sumarlo
+    store = SessionStore(SYSTEM_PROMPT)
+    store.put("s", session_state("s" * 1000))
+    before = store.bytes
+    store.put("s", session_state("s" * 1000))
+    status(store.bytes == before and len(store) == 1, "put sobre la misma sesión no duplica bytes")
+    store.delete("s")
+    status(store.bytes == 0 and len(store) == 0, "delete libera los bytes")
+
+test_session_store()
@@ -0,0 +1,121 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from src.database.write_behind import WriteBehindCheckpointer
+
+THREAD = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+
+class FakePool:
+    """Imita pool_manager.connection(): LATEST_CHECKPOINT_SQL devuelve `latest`."""
+
+    def __init__(self):
+        self.latest = None
+        self.queries = 0
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = self
+
+        class Cursor:
+            async def fetchone(self):
+                return {"checkpoint_id": pool.latest} if pool.latest else None
+
+        class Connection:
+            async def execute(self, sql, params):
+                pool.queries += 1
+                return Cursor()
+
+        yield Connection()
+
+class FlakySaver(InMemorySaver):
+    """InMemorySaver cuyo aput falla las próximas `failures` veces (Postgres caído)."""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+        self.puts = 0
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("postgres no disponible")
+        self.puts += 1
+        return await super().aput(config, checkpoint, metadata, new_versions)
+
+def status(ok, label):
+    print(f"STATUS: {'PASS' if ok else 'FAIL'} ({label})")
+
+async def saved_checkpoints(saver):
+    return {c.checkpoint["id"]: c async for c in saver.alist({"configurable": {"thread_id": "t1"}})}
+
+def parent_id(checkpoint_tuple):
+    return checkpoint_tuple.parent_config["configurable"]["checkpoint_id"] if checkpoint_tuple.parent_config else None
+
+async def test_write_behind():
+    saver = FlakySaver()
+    pool = FakePool()
+    wb = WriteBehindCheckpointer(saver, pool=pool)
+    checkpoint = empty_checkpoint()
+
+    # 1. Primer turno escrito: es el padre de lo que venga después
+    checkpoint = create_checkpoint(checkpoint, None, 0)
+    config = await wb.aput(THREAD, checkpoint, {"step": 0}, {})
+    await wb.flush()
+    first_id = checkpoint["id"]
+
+    # 2. Dos aput antes del vaciado: una sola escritura, colgada del último padre escrito
+    puts_before = saver.puts
+    checkpoint = create_checkpoint(checkpoint, None, 1)
+    config = await wb.aput(config, checkpoint, {"step": 1}, {})
+    intermediate_id = checkpoint["id"]
+    checkpoint = create_checkpoint(checkpoint, None, 2)
+    config = await wb.aput(config, checkpoint, {"step": 2}, {})
+
+    # 3. aput_writes del checkpoint coalescido: viaja con él en el vaciado
+    await wb.aput_writes(config, [("messages", "hola")], task_id="task-1")
+    status(wb.stats()["pending"] == 1 and wb.stats()["coalesced"] == 1, "dos aput coalescidos en uno pendiente")
+
+    await wb.flush()
+    saved = await saved_checkpoints(saver)
+    latest = saved.get(checkpoint["id"])
+    print(f"Write-behind: {wb.stats()}")
+    status(saver.puts - puts_before == 1, "una sola escritura para los dos turnos")
+    status(intermediate_id not in saved, "el checkpoint intermedio no se escribe")
+    status(latest is not None and parent_id(latest) == first_id, "padre correcto (último escrito)")
+    status(latest is not None and ("task-1", "messages", "hola") in latest.pending_writes, "writes del checkpoint coalescido escritos")
+
+    # 4. Vaciado fallido: queda en la cola y se reintenta; un aput posterior conserva el padre
+    written_id = checkpoint["id"]
+    saver.failures = 1
+    checkpoint = create_checkpoint(checkpoint, None, 3)
+    config = await wb.aput(config, checkpoint, {"step": 3}, {})
+    written = await wb.flush()
+    status(written == 0 and wb.stats()["pending"] == 1 and wb.stats()["flush_errors"] == 1, "vaciado fallido queda pendiente")
+    checkpoint = create_checkpoint(checkpoint, None, 4)
+    config = await wb.aput(config, checkpoint, {"step": 4}, {})
+    written = await wb.flush()
+    saved = await saved_checkpoints(saver)
+    retried = saved.get(checkpoint["id"])
+    status(written == 1 and wb.stats()["pending"] == 0, "reintento en el próximo vaciado")
+    status(retried is not None and parent_id(retried) == written_id, "reintento colgado del último escrito")
+    status(all(parent_id(c) is None or parent_id(c) in saved for c in saved.values()), "sin padres colgantes")
+
+    # 5. Copia caliente: hit si Postgres tiene el mismo último id, recarga si otro worker escribió
+    pool.latest = checkpoint["id"]
+    hits = wb.hits
+    current = await wb.aget_tuple(THREAD)
+    status(current.checkpoint["id"] == checkpoint["id"] and wb.hits == hits + 1, "copia caliente vigente se sirve de memoria")
+
+    other = create_checkpoint(checkpoint, None, 5)
+    await saver.aput(config, other, {"step": 5}, {})  # otro worker, directo a Postgres
+    pool.latest = other["id"]
+    reloaded = await wb.aget_tuple(THREAD)
+    print(f"Write-behind: {wb.stats()}")
+    status(reloaded.checkpoint["id"] == other["id"] and wb.stats()["stale"] == 1, "copia caliente desactualizada se recarga")
+    again = await wb.aget_tuple(THREAD)
+    status(again.checkpoint["id"] == other["id"] and wb.hits == hits + 2, "la copia recargada vuelve a ser hit")
+
+asyncio.run(test_write_behind())